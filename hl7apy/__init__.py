@@ -22,6 +22,7 @@
 from __future__ import absolute_import
 
 import os
+from collections import namedtuple
 
 try:
     from collections.abc import MutableMapping
@@ -36,7 +37,7 @@ except ImportError:
     import pickle
 
 
-from hl7apy.exceptions import UnsupportedVersion, InvalidEncodingChars, UnknownValidationLevel
+from hl7apy.exceptions import UnsupportedVersion, InvalidEncodingChars, UnknownValidationLevel, ChildNotFound
 from hl7apy.consts import DEFAULT_ENCODING_CHARS, DEFAULT_ENCODING_CHARS_27, DEFAULT_VERSION, VALIDATION_LEVEL
 
 __author__ = 'Daniela Ghironi, Vittorio Meloni, Alessandro Sulis, Federico Caboni'
@@ -227,6 +228,81 @@ def set_default_encoding_chars(encoding_chars):
     _DEFAULT_ENCODING_CHARS = encoding_chars
 
 
+class VersionContext(namedtuple('VersionContext', ('version', 'library', 'elements', 'base_datatypes'))):
+    """
+    The library of an HL7 version, resolved once: it holds the library module, its element structures and its
+    base datatypes, so that looking up a reference doesn't go through the import machinery again.
+    Use :func:`get_version_context` to get the (shared) context of a version
+
+    >>> context = get_version_context('2.5')
+    >>> print(context.get('PID', 'Segment')[0])
+    sequence
+    >>> context.is_base_datatype('ST'), context.is_base_datatype('CE')
+    (True, False)
+    """
+    __slots__ = ()
+
+    def get(self, name, element_type):
+        """
+        Return the reference structure of the element of the given name and type (see :func:`load_reference`)
+
+        :raise: :class:`hl7apy.exceptions.ChildNotFound` if the element has not been found
+        """
+        try:
+            return self.elements[element_type][name]
+        except KeyError:
+            raise ChildNotFound(name)
+
+    def find(self, name, element_types):
+        """
+        Look for an element of the given name into the given types (see :func:`find_reference`)
+
+        :raise: :class:`hl7apy.exceptions.ChildNotFound` if the element has not been found
+        """
+        elements = self.elements
+        for cls in element_types:
+            try:
+                return {'ref': elements[cls.__name__][name], 'name': name, 'cls': cls}
+            except KeyError:
+                pass
+        raise ChildNotFound(name)
+
+    def is_base_datatype(self, datatype):
+        """
+        Check if the given datatype is a base datatype of the version
+        """
+        return datatype in self.base_datatypes
+
+
+def get_version_context(version=None):
+    """
+    Return the :class:`VersionContext` of the given version. The library is imported and checked only the
+    first time a version is requested
+
+    :type version: ``str``
+    :param version: the HL7 version (e.g. '2.6') or ``None`` to use the default
+        (see :func:`set_default_version`)
+    :rtype: :class:`VersionContext`
+    :raises: :class:`hl7apy.exceptions.UnsupportedVersion` if the given version is unsupported
+
+    >>> get_version_context('2.5') is get_version_context('2.5')
+    True
+    >>> get_version_context('2.0')  # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ...
+    UnsupportedVersion: The version 2.0 is not supported
+    """
+    if version is None:
+        version = _DEFAULT_VERSION
+    try:
+        return _VERSION_CONTEXTS[version]
+    except KeyError:
+        check_version(version)
+        lib = importlib.import_module(SUPPORTED_LIBRARIES[version])
+        context = _VERSION_CONTEXTS[version] = VersionContext(version, lib, lib.ELEMENTS, lib.get_base_datatypes())
+        return context
+
+
 def load_library(version):
     """
     Load the correct module according to the version
@@ -235,10 +311,7 @@ def load_library(version):
     :param version: the version of the library to be loaded (e.g. '2.6')
     :rtype: module object
     """
-    check_version(version)
-    module_name = SUPPORTED_LIBRARIES[version]
-    lib = importlib.import_module(module_name)
-    return lib
+    return get_version_context(version).library
 
 
 def load_reference(name, element_type, version):
@@ -281,9 +354,7 @@ def load_reference(name, element_type, version):
     >>> print(r[0])
     sequence
     """
-    lib = load_library(version)
-    ref = lib.get(name, element_type)
-    return ref
+    return get_version_context(version).get(name, element_type)
 
 
 def find_reference(name, element_types, version):
@@ -313,18 +384,75 @@ def find_reference(name, element_types, version):
     >>> print('%s %s' % (r['name'], r['cls']))
     ADT_A01 <class 'hl7apy.core.Message'>
     """
-    lib = load_library(version)
-    ref = lib.find(name, element_types)
-    return ref
+    return get_version_context(version).find(name, element_types)
+
+
+def lookup_table(version, table_id):
+    """
+    Return the values of the HL7 table with the given id as a ``frozenset``, for fast membership tests.
+    The sets are built the first time a table of a version is requested and then reused
+
+    :type version: ``str``
+    :param version: the version of the library where to search the table (e.g. '2.6')
+    :type table_id: ``str``
+    :param table_id: the id of the table (e.g. 'HL70001')
+    :rtype: ``frozenset``
+    :return: the values of the table
+    :raise: :class:`hl7apy.exceptions.ChildNotFound` if the table has not been found
+
+    >>> 'F' in lookup_table('2.5', 'HL70001')
+    True
+    >>> lookup_table('2.5', 'HL79999')  # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ...
+    ChildNotFound: No child named HL79999
+    """
+    try:
+        tables = _TABLES[version]
+    except KeyError:
+        check_version(version)
+        tables = _TABLES.setdefault(version, {})
+    try:
+        return tables[table_id]
+    except KeyError:
+        values = tables[table_id] = frozenset(load_reference(table_id, 'Table', version)[1])
+        return values
 
 
 def load_message_profile(path):
+    """
+    Load a message profile, either pickled or written as a snapshot with
+    :func:`write_message_profile_snapshot <hl7apy.snapshot.write_message_profile_snapshot>`
+
+    :type path: ``str``
+    :param path: the path of the message profile file
+    :return: a mapping from message structures to their references
+    """
+    from hl7apy.snapshot import MESSAGE_PROFILE_SECTION, is_snapshot, load_snapshot
+    if is_snapshot(path):
+        return load_snapshot(path)[MESSAGE_PROFILE_SECTION]
+
     with open(path, 'rb') as f:
         mp = pickle.load(f)
 
     return mp
 
 
+def use_library_snapshot(version, path):
+    """
+    Take the references of the given version from a snapshot written with
+    :func:`write_library_snapshot <hl7apy.snapshot.write_library_snapshot>`, instead of importing the modules
+    of the library. It should be called before the library is used
+
+    :type version: ``str``
+    :param version: the version of the library (e.g. '2.5')
+    :type path: ``str``
+    :param path: the path of the snapshot file
+    """
+    from hl7apy.snapshot import load_snapshot
+    load_library(version).ELEMENTS.use_snapshot(load_snapshot(path))
+
+
 def _discover_libraries():
     current_dir = os.path.dirname(__file__)
     return {o[1:].replace("_", "."): "hl7apy.{}".format(o)
@@ -333,6 +461,11 @@ def _discover_libraries():
 
 SUPPORTED_LIBRARIES = _discover_libraries()
 
+# version -> {table id: frozenset of the table values}
+_TABLES = {}
+# version -> VersionContext
+_VERSION_CONTEXTS = {}
+
 
 if __name__ == '__main__':
 
@@ -34,6 +34,7 @@
 
 from __future__ import absolute_import
 
+import binascii
 import numbers
 import re
 from datetime import datetime
@@ -91,6 +92,126 @@ class BaseDataType(object):
         return self.__class__.__name__
 
 
+#: the encoding chars escaped in the text values and the letter of their escape sequence
+_ESCAPED_CHARS = (('FIELD', 'F'), ('COMPONENT', 'S'), ('SUBCOMPONENT', 'T'), ('REPETITION', 'R'))
+
+_escape_codecs = {}
+
+
+class EscapeCodec(object):
+    """
+    Escape and unescape the text values for a set of encoding chars. The translations and the regular
+    expressions are built only once: use :func:`get_escape_codec` to get the codec for some encoding chars
+
+    :type encoding_chars: ``dict``
+    :param encoding_chars: the encoding chars (see
+        :func:`get_default_encoding_chars <hl7apy.get_default_encoding_chars>`)
+
+    :type truncation: ``bool``
+    :param truncation: if ``True`` the truncation char (introduced by HL7 v2.7) is escaped too
+
+    >>> from hl7apy import DEFAULT_ENCODING_CHARS
+    >>> codec = get_escape_codec(DEFAULT_ENCODING_CHARS)
+    >>> print(codec.escape('a|b^c\\\\d'))
+    a\\F\\b\\S\\c\\E\\d
+    >>> print(codec.unescape('a\\\\F\\\\b\\\\S\\\\c\\\\E\\\\d\\\\X41\\\\'))
+    a|b^c\\dA
+    """
+
+    def __init__(self, encoding_chars, truncation=False):
+        escaped_chars = _ESCAPED_CHARS + (('TRUNCATION', 'L'),) if truncation else _ESCAPED_CHARS
+        letters = 'HNFSTREL' if truncation else 'HNFSTRE'
+        escape_char = encoding_chars['ESCAPE']
+        esc = re.escape(escape_char)
+
+        self.escape_char = escape_char
+        self.translations = tuple((encoding_chars[k], '{0}{1}{0}'.format(escape_char, letter))
+                                  for k, letter in escaped_chars if k in encoding_chars)
+        self._escaped_escape_char = '{0}E{0}'.format(escape_char)
+        self._special_chars = re.compile('[{0}]'.format(
+            ''.join(re.escape(c) for c, _ in self.translations) + esc)).search
+        # the escape chars that are part of an escape sequence must not be escaped again
+        # (e.g. \H\ must not become \E\H\E\)
+        self._escape_char_regex = re.compile(r'(?<!%s[%s])%s(?![%s]%s)' % (esc, letters, esc, letters, esc))
+
+        self._unescaped_chars = dict((letter, encoding_chars[k]) for k, letter in escaped_chars
+                                     if k in encoding_chars)
+        self._unescaped_chars['E'] = escape_char
+        self._escape_sequence_regex = re.compile(r'%s(X[0-9A-Fa-f]*|[%s])%s' %
+                                                 (esc, ''.join(self._unescaped_chars), esc))
+
+    def escape(self, value):
+        """
+        Escape the encoding chars found in the given value
+
+        :type value: ``str``
+        :param value: the value to escape
+
+        :return: the escaped value
+        """
+        if self._special_chars(value) is None:
+            return value
+        has_escape_char = self.escape_char in value
+        for char, esc_seq in self.translations:
+            value = value.replace(char, esc_seq)
+        # The escape sequences inserted above are never matched by the regex, so it is needed only when the
+        # escape char was in the original value. We use lambda because otherwise the backslash sequence in the
+        # string is processed (look for re.sub in python doc) and we don't want this
+        if has_escape_char:
+            value = self._escape_char_regex.sub(lambda x: self._escaped_escape_char, value)
+        return value
+
+    def unescape(self, value, charset='latin-1'):
+        """
+        Replace the escape sequences of the encoding chars and the hexadecimal data (\\Xdddd...\\)
+        found in the given value. The other escape sequences (e.g. the highlights) are left untouched
+
+        :type value: ``str``
+        :param value: the value to unescape
+
+        :type charset: ``str``
+        :param charset: the charset used to decode the hexadecimal data
+
+        :return: the unescaped value
+        """
+        if self.escape_char not in value:
+            return value
+
+        def _unescape(match):
+            seq = match.group(1)
+            if seq[0] != 'X':
+                return self._unescaped_chars[seq]
+            try:
+                return binascii.unhexlify(seq[1:].encode('ascii')).decode(charset)
+            except (TypeError, ValueError, binascii.Error):
+                return match.group(0)
+
+        return self._escape_sequence_regex.sub(_unescape, value)
+
+
+def get_escape_codec(encoding_chars, truncation=False):
+    """
+    Return the :class:`EscapeCodec` for the given encoding chars. The codecs are created only once
+    for every set of encoding chars
+
+    :type encoding_chars: ``dict``
+    :param encoding_chars: the encoding chars
+
+    :type truncation: ``bool``
+    :param truncation: if ``True`` the truncation char (introduced by HL7 v2.7) is escaped too
+
+    :rtype: :class:`EscapeCodec`
+    """
+    key = (encoding_chars['ESCAPE'], encoding_chars['FIELD'], encoding_chars['COMPONENT'],
+           encoding_chars['SUBCOMPONENT'], encoding_chars['REPETITION'],
+           encoding_chars.get('TRUNCATION') if truncation else None, truncation)
+    try:
+        return _escape_codecs[key]
+    except KeyError:
+        codec = _escape_codecs[key] = EscapeCodec(encoding_chars, truncation)
+        return codec
+
+
 class TextualDataType(BaseDataType):
     """
     Base class for textual data types.
@@ -116,6 +237,9 @@ class TextualDataType(BaseDataType):
         greater than :attr:`max_length`
     """
 
+    #: if ``True`` the truncation char is escaped too (see :class:`EscapeCodec`)
+    escape_truncation = False
+
     def __init__(self, value, max_length=32, highlights=None,
                  validation_level=None):
         self.highlights = highlights
@@ -127,19 +251,9 @@ class TextualDataType(BaseDataType):
             encoding_chars = get_default_encoding_chars()
         return self._escape_value(self.value, encoding_chars)
 
-    def _get_translations(self, encoding_chars):
-        escape_char = encoding_chars['ESCAPE']
-        return ((encoding_chars['FIELD'], '{esc}F{esc}'.format(esc=escape_char)),
-                (encoding_chars['COMPONENT'], '{esc}S{esc}'.format(esc=escape_char)),
-                (encoding_chars['SUBCOMPONENT'], '{esc}T{esc}'.format(esc=escape_char)),
-                (encoding_chars['REPETITION'], '{esc}R{esc}'.format(esc=escape_char)),)
-
-    def _get_escape_char_regex(self, escape_char):
-        return r'(?<!%s[HNFSTRE])%s(?![HNFSTRE]%s)' % tuple(3 * [re.escape(escape_char)])
-
     def _escape_value(self, value, encoding_chars=None):
-        escape_char = encoding_chars['ESCAPE']
-        translations = self._get_translations(encoding_chars)
+        codec = get_escape_codec(encoding_chars, self.escape_truncation)
+        escape_char = codec.escape_char
 
         # Inserts the highlights escape sequences
         if self.highlights is not None:
@@ -168,19 +282,7 @@ class TextualDataType(BaseDataType):
                 offset += 2
             value = ''.join(words)
 
-        # Escapes encoding_chars
-        for char, esc_seq in translations:
-            value = value.replace(char, esc_seq)
-        # Escapes the escape_char. If it is found in other escape sequences it is not escaped.
-        # For example if the escape char is / and we find /H/ the escape chars are not re-escaped,
-        # otherwise it would become /E/H/E/ which is not the result wanted.
-        # Thus the regex search for escape chars not followed and not preceeded by one of the litteral
-        # composing an escape sequence. We use lambda because otherwise the backslash sequence in the string
-        # is processed (look for re.sub in python doc) and we don't want this
-        value = re.sub(self._get_escape_char_regex(escape_char),
-                       lambda x: '{esc}E{esc}'.format(esc=escape_char), value)
-
-        return value
+        return codec.escape(value)
 
 
 class NumericDataType(BaseDataType):
@@ -290,18 +392,16 @@ class TM(DateTimeDataType):
 
         self.microsec_precision = microsec_precision
 
-        if offset and len(offset) != 5:
-            raise InvalidDateOffset(offset)
-        try:
-            d = datetime.strptime(offset[1:], '%H%M')
-            if offset[0] == '+' and d.hour > 14 or offset[0] == '-' and d.hour > 12:
-                raise ValueError
-        except ValueError:
-            if offset:
+        if offset:
+            # the offset must be +HHMM (up to +1459) or -HHMM (up to -1259)
+            if len(offset) != 5 or offset[0] not in ('+', '-') or not offset[1:].isdigit():
+                raise InvalidDateOffset(offset)
+            try:
+                hour, minute = int(offset[1:3]), int(offset[3:])
+            except ValueError:
+                raise InvalidDateOffset(offset)
+            if hour > (14 if offset[0] == '+' else 12) or minute > 59:
                 raise InvalidDateOffset(offset)
-
-        if offset and offset[0] not in ('+', '-'):
-            raise InvalidDateOffset(offset)
 
         self.offset = offset
 
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Columnar export of the values of ER7-encoded messages.
+
+A :class:`ColumnarExporter` reads the values of some columns from a stream of messages, without parsing them
+(see :mod:`hl7apy.extract`), and stores them by column. The columns of the segments that repeat in a message
+(e.g. ``OBX``) go in a child table of the segment, with a row for every occurrence of the segment, while the
+other columns go in the ``MESSAGE`` table, with a row for every message. Every table has an
+:attr:`index <Table.index>` with the index of the message of each row.
+
+The strings are dictionary-encoded: the columns hold the codes of their values in a :class:`StringPool`
+shared by the tables (``-1`` for the missing values), as ``array('i')`` instances or as NumPy arrays if
+NumPy is installed.
+
+>>> from hl7apy.columnar import ColumnarExporter
+>>> msg = 'MSH|^~\\\\&|LAB||||20110708162817||ORU^R01^ORU_R01|{0}|P|2.5\\r' \\
+... 'PID|1||{0}^^^GHH^MR\\r' \\
+... 'OBX|1|NM|GLU^GLUCOSE||182|mg/dl\\r' \\
+... 'OBX|2|NM|BUN^UREA||10|mg/dl'
+>>> exporter = ColumnarExporter(['MSH_10', 'PID_3_1', 'OBX_3_1', 'OBX_5', 'OBX_6'], repeating=['OBX'],
+...                             use_numpy=False)
+>>> tables = exporter.export([msg.format('M1'), msg.format('M2')])
+>>> print(tables['MESSAGE'].values('PID_3_1'))
+['M1', 'M2']
+>>> obx = tables['OBX']
+>>> print(list(obx.index))
+[0, 0, 1, 1]
+>>> print(obx.values('OBX_3_1'))
+['GLU', 'BUN', 'GLU', 'BUN']
+>>> print(list(obx.columns['OBX_6']))
+[3, 3, 3, 3]
+>>> print(obx.pool.values)
+['M1', 'GLU', '182', 'mg/dl', 'BUN', '10', 'M2']
+"""
+
+from __future__ import absolute_import
+import collections
+import re
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from hl7apy.base_datatypes import get_escape_codec
+from hl7apy.exceptions import InvalidPath
+from hl7apy.extract import compile_path, get_value
+from hl7apy.parser import decode_message
+from hl7apy.tokenizer import ER7Index
+
+#: the name of the table with a row for every message
+MESSAGE_TABLE = 'MESSAGE'
+
+_ELEMENT_NAME_REGEX = re.compile(r'^([A-Z][A-Z0-9]{2})_(\d+)(?:_(\d+))?(?:_(\d+))?$', re.IGNORECASE)
+
+
+class StringPool(object):
+    """
+    The distinct strings of the tables of an export. The columns hold the code of their values, that is their
+    position in :attr:`values`
+    """
+
+    __slots__ = ('values', '_codes')
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        """
+        Return the code of the given string, adding it to the pool if needed, or ``-1`` if it is ``None``
+        """
+        if value is None:
+            return -1
+        try:
+            return self._codes[value]
+        except KeyError:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+            return code
+
+    def decode(self, code):
+        """
+        Return the string of the given code, ``None`` if it is ``-1``
+        """
+        if code < 0:
+            return None
+        return self.values[code]
+
+
+class Table(object):
+    """
+    The rows of a table of an export, stored by column
+
+    :type name: ``str``
+    :param name: the name of the table: ``MESSAGE`` or the name of the repeating segment
+
+    :type column_names: ``list``
+    :param column_names: the names of the columns
+
+    :type pool: :class:`StringPool`
+    :param pool: the pool of the strings of the columns
+    """
+
+    __slots__ = ('name', 'index', 'columns', 'pool')
+
+    def __init__(self, name, column_names, pool):
+        self.name = name
+        #: the index of the message of every row
+        self.index = array('I')
+        #: the columns by name, with the codes of their values in the pool
+        self.columns = collections.OrderedDict((c, array('i')) for c in column_names)
+        self.pool = pool
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return '<Table {0} ({1} rows)>'.format(self.name, len(self))
+
+    def values(self, column):
+        """
+        Return the strings of the given column, with ``None`` for the missing values
+
+        :type column: ``str``
+        :param column: the name of the column
+        """
+        values = self.pool.values
+        return [values[code] if code >= 0 else None for code in self.columns[column]]
+
+    def _to_numpy(self):
+        # the arrays share their buffer with the NumPy arrays
+        self.index = numpy.frombuffer(self.index, dtype=self.index.typecode)
+        for name, column in self.columns.items():
+            self.columns[name] = numpy.frombuffer(column, dtype=column.typecode)
+
+
+class ColumnarExporter(object):
+    """
+    Export the values of some columns from a stream of ER7-encoded messages into :class:`Table` instances
+    (see :mod:`hl7apy.columnar`). The columns are compiled once, and the values are read from the text of
+    the messages: no :class:`Element <hl7apy.core.Element>` is created.
+
+    The columns are named after the element that they read (e.g. ``PID_3``, ``OBX_5`` or ``PID_3_1`` for the
+    first component of PID-3), or they are paths as the ones of :func:`extract <hl7apy.extract.extract>`
+    (e.g. ``PID-3(2).1``), that can't select all the repetitions of a field. The first repetition of a field
+    is read when it isn't specified. A column of all the repetitions of a segment (e.g. ``OBX[*]-5``) makes the
+    segment repeating, while a column of a repeating segment can't select one of its repetitions
+    (e.g. ``OBX[2]-5``).
+
+    :type columns: ``list``
+    :param columns: the columns to export
+
+    :type repeating: ``list``
+    :param repeating: the names of the repeating segments, whose columns go in the table of the segment
+
+    :type unescape: ``bool``
+    :param unescape: if ``False`` the escape sequences of the values are not replaced
+
+    :type use_numpy: ``bool``
+    :param use_numpy: if ``True`` the columns are NumPy arrays, if ``False`` they are ``array`` instances.
+        If it is ``None`` NumPy is used when it is installed
+
+    :raise: :exc:`InvalidPath <hl7apy.exceptions.InvalidPath>` if a column is not valid
+    """
+
+    def __init__(self, columns, repeating=(), unescape=True, use_numpy=None):
+        self.columns = tuple(columns)
+        self.unescape = unescape
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        elif use_numpy and numpy is None:
+            raise ImportError('NumPy is not installed')
+        self.use_numpy = use_numpy
+
+        paths = [_compile_column(c) for c in self.columns]
+        repeating = [s.upper() for s in repeating]
+        for path in paths:
+            if path.segment_rep is None and path.segment not in repeating:
+                repeating.append(path.segment)
+        for column, path in zip(self.columns, paths):
+            if path.segment in repeating and path.segment_rep is not None and path.explicit_segment_rep:
+                # every occurrence of a repeating segment is a row of its table
+                raise InvalidPath(column)
+        self.repeating = tuple(repeating)
+        self._message_columns = [(c, p) for c, p in zip(self.columns, paths) if p.segment not in repeating]
+        self._segment_columns = [(s, [(c, p) for c, p in zip(self.columns, paths) if p.segment == s])
+                                 for s in self.repeating]
+
+    def export(self, messages):
+        """
+        Export the values of the given messages
+
+        :type messages: iterable
+        :param messages: the ER7-encoded messages, as ``str`` or as ``bytes``, which are decoded
+            according to their MSH-18 field (see :func:`decode_message <hl7apy.parser.decode_message>`)
+
+        :return: an ``OrderedDict`` with the :class:`Table` instances by name: the ``MESSAGE`` table and the
+            tables of the repeating segments
+
+        :raise: :exc:`ParserError <hl7apy.exceptions.ParserError>` if a message doesn't start with
+            a valid MSH segment
+        """
+        pool = StringPool()
+        encode = pool.encode
+        message_table = Table(MESSAGE_TABLE, [c for c, _ in self._message_columns], pool)
+        message_columns = [(message_table.columns[c], p) for c, p in self._message_columns]
+        segment_tables = []
+        for segment, columns in self._segment_columns:
+            table = Table(segment, [c for c, _ in columns], pool)
+            segment_tables.append((table, [(table.columns[c], p) for c, p in columns]))
+
+        for message_index, message in enumerate(messages):
+            if not isinstance(message, (str, type(u''))):
+                message = decode_message(message)
+            index = ER7Index(message)
+            if self.unescape:
+                encoding_chars = index.encoding_chars
+                codec = get_escape_codec(encoding_chars, 'TRUNCATION' in encoding_chars)
+            else:
+                codec = None
+
+            message_table.index.append(message_index)
+            for column, path in message_columns:
+                segments = index.find_segments(path.segment)
+                if path.segment_rep < len(segments):
+                    column.append(encode(get_value(path, index, segments[path.segment_rep], codec)))
+                else:
+                    column.append(-1)
+
+            for table, columns in segment_tables:
+                for segment in index.find_segments(table.name):
+                    table.index.append(message_index)
+                    for column, path in columns:
+                        column.append(encode(get_value(path, index, segment, codec)))
+
+        tables = collections.OrderedDict([(MESSAGE_TABLE, message_table)])
+        tables.update((t.name, t) for t, _ in segment_tables)
+        if self.use_numpy:
+            for table in tables.values():
+                table._to_numpy()
+        return tables
+
+
+def _compile_column(column):
+    m = _ELEMENT_NAME_REGEX.match(column.strip())
+    if m is None:
+        path = compile_path(column)
+    else:
+        parts = [p for p in m.groups() if p is not None]
+        path = compile_path('{0}-{1}'.format(parts[0], '.'.join(parts[1:])))
+    if path.field_rep is None:
+        # a column has a single value for every row
+        raise InvalidPath(column)
+    return path
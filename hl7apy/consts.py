@@ -54,6 +54,28 @@ DEFAULT_ENCODING_CHARS_27 = {
 #: default hl7 version
 DEFAULT_VERSION = "2.5"
 
+#: Dictionary with the character sets of the HL7 table 0211 (used in MSH-18) and the Python codecs that decode them
+CHARSETS = {
+    'ASCII': 'ascii',
+    'ISO IR6': 'ascii',
+    '8859/1': 'latin_1',
+    '8859/2': 'iso8859_2',
+    '8859/3': 'iso8859_3',
+    '8859/4': 'iso8859_4',
+    '8859/5': 'iso8859_5',
+    '8859/6': 'iso8859_6',
+    '8859/7': 'iso8859_7',
+    '8859/8': 'iso8859_8',
+    '8859/9': 'iso8859_9',
+    '8859/15': 'iso8859_15',
+    'UNICODE UTF-8': 'utf_8',
+    'ISO IR87': 'iso2022_jp',
+    'ISO IR159': 'iso2022_jp_2',
+    'GB 18030-2000': 'gb18030',
+    'KS X 1001': 'euc_kr',
+    'BIG-5': 'big5'
+}
+
 
 class MLLP_ENCODING_CHARS(object):
     """
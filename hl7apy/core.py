@@ -34,13 +34,14 @@ except ImportError:
 import datetime
 from itertools import takewhile
 import importlib
+import threading
 import traceback
 
 from hl7apy import get_default_version, get_default_encoding_chars, \
     get_default_validation_level, check_validation_level, \
-    check_encoding_chars, check_version, load_library, \
+    check_encoding_chars, check_version, get_version_context, \
     find_reference, load_reference
-from hl7apy.validation import Validator
+from hl7apy.validation import Validator, _clear_validation_caches
 from hl7apy.exceptions import ChildNotFound, ChildNotValid, \
     MaxChildLimitReached, OperationNotAllowed, \
     InvalidName, MessageProfileNotFound, LegacyMessageProfile
@@ -77,10 +78,15 @@ def is_base_datatype(datatype, version=None):
     >>> is_base_datatype('CE')
     False
     """
-    if version is None:
-        version = get_default_version()
-    lib = load_library(version)
-    return lib.is_base_datatype(datatype)
+    return datatype in get_version_context(version).base_datatypes
+
+
+#: names of the elements whose value defines the encoding chars of a message
+_ENCODING_CHARS_ELEMENTS = frozenset(('MSH', 'MSH_1', 'MSH_2'))
+_ENCODING_CHARS_FIELDS = frozenset(('MSH_1', 'MSH_2'))
+
+#: marks an element whose children are being parsed from its original ER7 text
+_PARSING_ER7 = object()
 
 
 def _remove_trailing(children):
@@ -155,6 +161,8 @@ class ElementProxy(Sequence):
             return super(ElementProxy, self).__iter__()
 
     def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
         try:
             element = self.list[0]
         except IndexError:  # first child not found, create the element
@@ -202,14 +210,40 @@ class ElementList(MutableSequence):
     It stores the children inside a list and indexes them using a dictionary (e.g. self.indexes['SPM'] will
     return all child named 'SPM' found in the :class:` Message <hl7apy.core.Message>` instance)
 
+    The indexes are shared empty dictionaries until the first child is added to them, since most of the
+    elements of a message (e.g. the subcomponents) have no children at all
     """
 
+    __slots__ = ('element', 'list', 'indexes', 'traversal_indexes', 'proxies')
+
     def __init__(self, element):
         self.element = element
         self.list = []
-        self.indexes = {}
-        self.traversal_indexes = {}
-        self.proxies = {}
+        self.indexes = _EMPTY_INDEX
+        self.traversal_indexes = _EMPTY_INDEX
+        self.proxies = _EMPTY_INDEX
+
+    def __getstate__(self):
+        # the proxies are just a cache of the traversal results: they are created again when needed
+        return {'element': self.element, 'list': self.list,
+                'indexes': self.indexes or None, 'traversal_indexes': self.traversal_indexes or None}
+
+    def __setstate__(self, state):
+        self.element = state['element']
+        self.list = state['list']
+        self.indexes = state['indexes'] or _EMPTY_INDEX
+        self.traversal_indexes = state['traversal_indexes'] or _EMPTY_INDEX
+        self.proxies = _EMPTY_INDEX
+
+    def _get_index(self, name):
+        """
+        Return the index with the given name, replacing the shared empty one with a new ``dict``
+        """
+        index = getattr(self, name)
+        if index is _EMPTY_INDEX:
+            index = {}
+            setattr(self, name, index)
+        return index
 
     def get_ordered_children(self):
         """
@@ -246,8 +280,10 @@ class ElementList(MutableSequence):
                 else:
                     self.indexes[child.name].insert(by_name_index, child)
             except KeyError:
-                self.indexes[child.name] = [child]
+                self._get_index('indexes')[child.name] = [child]
             self.list.insert(index, child)
+            self._check_encoding_chars_change(child)
+            self.element._invalidate_er7()
 
     def append(self, child):
         """
@@ -263,12 +299,14 @@ class ElementList(MutableSequence):
                 try:
                     self.indexes[child.name].append(child)
                 except KeyError:
-                    self.indexes[child.name] = [child]
+                    self._get_index('indexes')[child.name] = [child]
+                self._check_encoding_chars_change(child)
+                self.element._invalidate_er7()
             elif self.element == child.traversal_parent:
                 try:
                     self.traversal_indexes[child.name].append(child)
                 except KeyError:
-                    self.traversal_indexes[child.name] = [child]
+                    self._get_index('traversal_indexes')[child.name] = [child]
 
     def pop(self, index=0):
         child = super(ElementList, self).pop(index)
@@ -345,6 +383,8 @@ class ElementList(MutableSequence):
             else:
                 self._remove_from_index(child)
                 self.list.remove(child)
+                self._check_encoding_chars_change(child)
+                self.element._invalidate_er7()
         except:
             raise
 
@@ -464,16 +504,16 @@ class ElementList(MutableSequence):
             try:
                 return self.proxies[name]
             except KeyError:
-                self.proxies[name] = ElementProxy(self, name)
-                return self.proxies[name]
+                proxy = self._get_index('proxies')[name] = ElementProxy(self, name)
+                return proxy
         else:  # child not found in the indexes dictionary (e.g. msh_9.message_code, msh_9.msh_9_1)
             child_name = self._find_name(name)
             if child_name is not None:
                 try:
                     return self.proxies[child_name]
                 except KeyError:
-                    self.proxies[child_name] = ElementProxy(self, child_name)
-                    return self.proxies[child_name]
+                    proxy = self._get_index('proxies')[child_name] = ElementProxy(self, child_name)
+                    return proxy
 
     def _can_add_child(self, child):
         if self.element._is_valid_child(child):
@@ -494,6 +534,13 @@ class ElementList(MutableSequence):
             raise ChildNotValid(child, self.element)
         return False
 
+    def _check_encoding_chars_change(self, child):
+        # the encoding chars of the message are cached: changes to MSH_1 and MSH_2 must invalidate them
+        if child.name in _ENCODING_CHARS_ELEMENTS:
+            self.element._invalidate_encoding_chars()
+        else:
+            self.element._check_encoding_chars_change()
+
     def _remove_from_index(self, child):
         try:
             self.indexes[child.name].remove(child)
@@ -518,6 +565,8 @@ class ElementList(MutableSequence):
         child = self.list[index]
         self._remove_from_index(child)
         del self.list[index]
+        self._check_encoding_chars_change(child)
+        self.element._invalidate_er7()
 
     def __setitem__(self, index, value):
         child_name = self.list[index].name
@@ -530,7 +579,47 @@ class ElementList(MutableSequence):
         return repr(self.list)
 
 
+class _ReadOnlyDict(dict):
+    """
+    A ``dict`` that cannot be modified after its creation. It is used for the structures that
+    :class:`ElementFinder` shares among all the :class:`Element <hl7apy.core.Element>` instances
+    having the same reference
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("'{0}' object does not support item assignment".format(self.__class__.__name__))
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+
+#: the empty index shared by all the :class:`ElementList` instances until a child is added to them
+_EMPTY_INDEX = _ReadOnlyDict()
+
+
+StructureCacheInfo = collections.namedtuple('StructureCacheInfo', ('hits', 'misses', 'maxsize', 'currsize'))
+
+
 class ElementFinder(object):
+    """
+    Build the structure of the :class:`Elements <hl7apy.core.Element>` from their reference.
+
+    The structures of ``sequence`` and ``choice`` references are computed only once for every
+    (version, reference, element class) and shared among all the elements: they must be considered read-only.
+    The cache can be inspected with :meth:`cache_info` and emptied with :meth:`cache_clear`
+    (e.g. when message profiles are reloaded)
+    """
+
+    #: maximum number of structures kept in the cache
+    cache_maxsize = 4096
+
+    _cache = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+    _hits = 0
+    _misses = 0
 
     @staticmethod
     def get_structure(element, reference=None):
@@ -552,7 +641,60 @@ class ElementFinder(object):
                 raise InvalidName(element.classname, element.name)
         if not isinstance(reference, Sequence):
             raise Exception
-        return ElementFinder._parse_structure(element, reference)
+        if reference[0] not in ('sequence', 'choice'):
+            return ElementFinder._parse_structure(element, reference)
+
+        key = (element.version, id(reference), element.__class__)
+        try:
+            cached_reference, structure = ElementFinder._cache[key]
+        except KeyError:
+            pass
+        else:
+            # the reference is kept alive by the cache so its id cannot be reused while the entry exists:
+            # the identity check just protects from concurrent evictions
+            if cached_reference is reference:
+                ElementFinder._hits += 1
+                return structure
+
+        structure = _ReadOnlyDict(ElementFinder._parse_structure(element, reference))
+        with ElementFinder._cache_lock:
+            ElementFinder._misses += 1
+            while len(ElementFinder._cache) >= ElementFinder.cache_maxsize > 0:
+                ElementFinder._cache.popitem(last=False)
+            if ElementFinder.cache_maxsize > 0:
+                ElementFinder._cache[key] = (reference, structure)
+        return structure
+
+    @staticmethod
+    def cache_info():
+        """
+        Return the statistics of the structures cache
+
+        :return: a :class:`StructureCacheInfo` namedtuple with ``hits``, ``misses``, ``maxsize``
+            and ``currsize`` fields
+
+        >>> ElementFinder.cache_clear()
+        >>> s = Segment('PID')
+        >>> s = Segment('PID')
+        >>> print(ElementFinder.cache_info().hits >= 1)
+        True
+        """
+        return StructureCacheInfo(ElementFinder._hits, ElementFinder._misses,
+                                  ElementFinder.cache_maxsize, len(ElementFinder._cache))
+
+    @staticmethod
+    def cache_clear():
+        """
+        Remove all the structures from the cache and reset its statistics. The other caches computed from the
+        references (e.g. the positions of the segments used by the parser and the validation plans) are emptied too
+        """
+        from hl7apy.parser import _clear_segment_paths
+        with ElementFinder._cache_lock:
+            ElementFinder._cache.clear()
+            ElementFinder._hits = 0
+            ElementFinder._misses = 0
+        _clear_segment_paths()
+        _clear_validation_caches()
 
     @staticmethod
     def _parse_structure(element, reference):
@@ -583,7 +725,7 @@ class ElementFinder(object):
                 child_name, child_ref, cardinality, cls = c
                 k = child_name if child_name not in structure \
                     else '{0}_{1}'.format(child_name, counters[child_name])
-                structure[k] = {"ref": child_ref, "name": k, "cls": element.child_classes[cls]}
+                structure[k] = _ReadOnlyDict(ref=child_ref, name=k, cls=element.child_classes[cls])
                 try:
                     structure_by_longname[child_ref[3]] = structure[k]
                 except IndexError:
@@ -591,10 +733,10 @@ class ElementFinder(object):
                 counters[child_name] += 1
                 repetitions[k] = cardinality
                 ordered_children.append(k)
-            data['repetitions'] = repetitions
-            data['ordered_children'] = ordered_children
-            data['structure_by_name'] = structure
-            data['structure_by_longname'] = structure_by_longname
+            data['repetitions'] = _ReadOnlyDict(repetitions)
+            data['ordered_children'] = tuple(ordered_children)
+            data['structure_by_name'] = _ReadOnlyDict(structure)
+            data['structure_by_longname'] = _ReadOnlyDict(structure_by_longname)
 
         if len(reference) > 5:
             datatype, long_name, table, max_length = reference[2:]
@@ -612,7 +754,15 @@ class Element(object):
     cls_attrs = ['name', 'validation_level', 'version', 'children', 'ordered_children',
                  'table', 'long_name', 'value', '_value', 'parent', '_parent', '_traversal_parent',
                  'traversal_parent', 'child_classes', 'encoding_chars', 'structure_by_name',
-                 'structure_by_longname', 'repetitions', 'reference', '_truncation_char']
+                 'structure_by_longname', 'repetitions', 'reference', '_truncation_char',
+                 '_children', '_lazy_er7', '_er7']
+
+    # the attributes of the elements are stored in slots, since a message can contain thousands of them.
+    # The subclasses of the leaves of the tree (Field, Component and SubComponent) declare empty __slots__,
+    # while Segment, Group and Message keep a __dict__ for their own attributes
+    __slots__ = ('name', 'validation_level', 'version', 'table', 'long_name', 'children', '_children',
+                 '_lazy_er7', '_er7', 'structure_by_name', 'structure_by_longname', 'ordered_children',
+                 'repetitions', 'reference', '_parent', '_traversal_parent', '_datatype', '_value')
 
     def __init__(self, name=None, parent=None, reference=None, version=None,
                  validation_level=None, traversal_parent=None):
@@ -634,11 +784,13 @@ class Element(object):
         self.version = version
         self.table = None
         self.long_name = None
+        # written directly into the slot, since it's done for every element of every parsed message
+        object.__setattr__(self, '_er7', None)
         self.children = ElementList(self)
         self.structure_by_name = None
         self.structure_by_longname = None
         self.ordered_children = None
-        self.repetitions = {}
+        self.repetitions = _EMPTY_INDEX
         self._find_structure(reference)
         self.parent = parent
         if parent is None:
@@ -811,10 +963,45 @@ class Element(object):
             'ESCAPE' : '\\'}
 
         """
-        if self.parent is not None:
-            return self.parent.encoding_chars
+        root = self._get_root()
+        if root is not self:
+            return root.encoding_chars
         return get_default_encoding_chars(self.version)
 
+    def _get_root(self):
+        root = self
+        while root._parent is not None:
+            root = root._parent
+        return root
+
+    def _invalidate_encoding_chars(self):
+        root = self._get_root()
+        if root is not self:
+            root._invalidate_encoding_chars()
+
+    def _check_encoding_chars_change(self):
+        # the element has been changed: if it is MSH_1 or MSH_2 or one of their components, the encoding
+        # chars cached by the message are not valid anymore
+        element = self
+        while isinstance(element, (Field, Component, SubComponent)):
+            if element.name in _ENCODING_CHARS_FIELDS:
+                element._invalidate_encoding_chars()
+                return
+            element = element._parent
+
+    def _invalidate_er7(self):
+        # the element has been changed, so the original ER7 text kept by the element and by its
+        # ancestors (see :meth:`SupportLazyParsing.set_original_er7`) is not valid anymore
+        element = self
+        while element is not None:
+            er7 = element._er7
+            if er7 is _PARSING_ER7:
+                # the children are being parsed from the text of the element itself
+                return
+            if er7 is not None:
+                element._er7 = None
+            element = element._parent
+
     def _find_structure(self, reference=None):
         if self.name is not None:
             structure = ElementFinder.get_structure(self, reference)
@@ -843,7 +1030,8 @@ class Element(object):
         raise NotImplementedError
 
     def __getattr__(self, name):
-        if hasattr(self, 'children') and name not in self.cls_attrs:
+        # special attributes (e.g., the ones looked up by pickle and copy) are never children
+        if not name.startswith('__') and hasattr(self, 'children') and name not in self.cls_attrs:
             return self.children.get(name)
         else:
             raise AttributeError(name)
@@ -855,6 +1043,7 @@ class Element(object):
                 if not isinstance(value, ElementList):
                     children = value
                     value = ElementList(self)
+                    self._invalidate_er7()
                 super(Element, self).__setattr__(name, value)
                 for c in children:
                     self.add(c)
@@ -869,16 +1058,94 @@ class Element(object):
         else:
             self.children.remove_by_name(name)
 
+    def __getstate__(self):
+        # the slots are read and written with their descriptors, to skip the children lookup of
+        # __setattr__ and the lazy parsing of the children property
+        state = dict(getattr(self, '__dict__', ()))
+        for name in Element.__slots__:
+            try:
+                state[name] = Element.__dict__[name].__get__(self, Element)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in iteritems(state):
+            if name in Element.__slots__:
+                Element.__dict__[name].__set__(self, value)
+            else:
+                self.__dict__[name] = value
+
+    def _clone(self, parent=None, copy_children=True):
+        """
+        Return a copy of the element, with the given parent, bypassing the lookup of its structure and the
+        checks done when the children are added. The structures are read-only, so they are shared with the copy
+
+        :param parent: the parent of the copy
+
+        :type copy_children: ``bool``
+        :param copy_children: if ``False``, the copy has no children
+        """
+        cls = self.__class__
+        clone = cls.__new__(cls)
+        object.__setattr__(clone, 'children', ElementList(clone))
+        for slot in _CLONED_SLOTS:
+            try:
+                slot.__set__(clone, slot.__get__(self, cls))
+            except AttributeError:  # the slot is not used by the element
+                pass
+        try:
+            clone.__dict__.update(object.__getattribute__(self, '__dict__'))
+        except AttributeError:
+            pass
+        _PARENT_SLOT.__set__(clone, parent)
+        _TRAVERSAL_PARENT_SLOT.__set__(clone, None)
+        try:
+            value = _VALUE_SLOT.__get__(self, cls)
+        except AttributeError:
+            pass
+        else:
+            if isinstance(value, BaseDataType):
+                # the datatypes can be changed in place, so they are not shared
+                copied_value = value.__class__.__new__(value.__class__)
+                copied_value.__dict__.update(value.__dict__)
+                value = copied_value
+            _VALUE_SLOT.__set__(clone, value)
+        if copy_children:
+            clone._copy_children(self)
+        return clone
+
+    def _copy_children(self, element):
+        # fill the children of the element, which must be empty, with copies of the children of the given one
+        source, target = element.children, self.children
+        clones = {}
+        for child in source.list:
+            clone = clones[id(child)] = child._clone(self)
+            target.list.append(clone)
+        if source.indexes:
+            target.indexes = dict((name, [clones[id(c)] for c in children])
+                                  for name, children in iteritems(source.indexes))
+
     def __repr__(self):
         return "<{0} {1}>".format(self.classname, self.name or '')
 
 
+#: the slots copied as they are by :meth:`Element._clone`
+_CLONED_SLOTS = tuple(Element.__dict__[name] for name in Element.__slots__
+                      if name not in ('children', '_children', '_parent', '_traversal_parent', '_value'))
+_PARENT_SLOT = Element.__dict__['_parent']
+_TRAVERSAL_PARENT_SLOT = Element.__dict__['_traversal_parent']
+_VALUE_SLOT = Element.__dict__['_value']
+
+
 class SupportComplexDataType(Element):
     """
     Mixin for classes that support complex datatypes
     """
     cls_attrs = Element.cls_attrs + ['_datatype', 'datatype', 'table', 'long_name', 'max_length']
 
+    __slots__ = ()
+
     def __init__(self):
 
         if self.__class__ == SupportComplexDataType:
@@ -1013,11 +1280,110 @@ class SupportComplexDataType(Element):
             return '<{0} of type {1}>'.format(self.classname, self.datatype)
 
 
+class SupportLazyParsing(Element):
+    """
+    Mixin for elements whose children can be parsed on demand.
+
+    When the parser runs in lazy mode (see :func:`parse_message <hl7apy.parser.parse_message>`) the element
+    keeps the ER7 text of its children and parses it only the first time they are accessed.
+    Until then, :meth:`to_er7` returns the original text.
+
+    When the parser is asked to keep the ER7 text (the ``keep_er7`` argument of
+    :func:`parse_message <hl7apy.parser.parse_message>`), the original text is returned by :meth:`to_er7`
+    also after the children have been parsed, until the element or one of its descendants is changed:
+    adding, removing or replacing a child, or setting a value, discards the text of the changed element
+    and of all its ancestors, while the untouched ones are encoded back to exactly the text they were
+    parsed from. Changes made directly to the datatype objects of the subcomponents
+    (e.g. ``subcomponent.value.value = ...``) are not tracked.
+    """
+
+    __slots__ = ()
+
+    def set_lazy_children(self, text, encoding_chars, **kwargs):
+        """
+        Store the ER7-encoded children of the element, to be parsed when they are first accessed
+
+        :type text: ``str``
+        :param text: the ER7-encoded text of the element
+
+        :type encoding_chars: ``dict``
+        :param encoding_chars: the encoding chars used in ``text``
+
+        :param kwargs: additional arguments for the children parser
+        """
+        self.children = []
+        self._lazy_er7 = (text, encoding_chars, kwargs)
+        self._er7 = (text, encoding_chars)
+
+    def set_original_er7(self, text, encoding_chars):
+        """
+        Store the ER7 text the element has been parsed from, to be returned by :meth:`to_er7` until
+        the element is changed
+
+        :type text: ``str``
+        :param text: the ER7-encoded text of the element
+
+        :type encoding_chars: ``dict``
+        :param encoding_chars: the encoding chars used in ``text``
+        """
+        self._er7 = (text, encoding_chars)
+
+    def has_original_er7(self):
+        """
+        Return ``True`` if the element keeps the ER7 text it has been parsed from, i.e. if it has not been
+        changed since then
+        """
+        return self._er7 is not None and self._er7 is not _PARSING_ER7
+
+    def is_lazy(self):
+        """
+        Return ``True`` if the children of the element have not been parsed yet
+        """
+        return self._lazy_er7 is not None
+
+    def _get_original_er7(self, encoding_chars, trailing_children):
+        """
+        Return the original ER7 text if it is still valid for the requested encoding, ``None`` otherwise
+        """
+        if trailing_children or self._er7 is _PARSING_ER7:
+            return None
+        text, original_encoding_chars = self._er7
+        if encoding_chars is None:
+            encoding_chars = self.encoding_chars
+        if encoding_chars is original_encoding_chars or encoding_chars == original_encoding_chars:
+            return text
+        return None
+
+    def _parse_lazy_children(self):
+        raise NotImplementedError
+
+    def _set_parsed_children(self, children, keep_er7=False):
+        # the children come from the original text, so adding them doesn't invalidate the text of the ancestors
+        er7, self._er7 = self._er7, _PARSING_ER7
+        try:
+            self.children = children
+        finally:
+            self._er7 = er7 if keep_er7 else None
+
+    def _get_children_list(self):
+        if self._lazy_er7 is not None:
+            self._parse_lazy_children()
+        return self._children
+
+    def _set_children_list(self, children):
+        self._lazy_er7 = None
+        self._children = children
+
+    children = property(_get_children_list, _set_children_list)
+
+
 class CanBeVaries(Element):
     """
     Mixin for Elements that can be of VARIES datatype
     """
 
+    __slots__ = ()
+
     def __init__(self, name=None, datatype=None, parent=None, reference=None,
                  version=None, validation_level=None, traversal_parent=None):
 
@@ -1110,6 +1476,8 @@ class SubComponent(CanBeVaries):
     child_classes = {"CMP": None}
     cls_attrs = Element.cls_attrs + ['datatype', '_datatype', 'table', 'long_name', 'max_length']
 
+    __slots__ = ()
+
     def __init__(self, name=None, datatype=None, value=None, parent=None,
                  reference=None, version=None, validation_level=None,
                  traversal_parent=None):
@@ -1168,6 +1536,8 @@ class SubComponent(CanBeVaries):
             else:
                 raise ValueError('Cannot assign {0}'.format(value.classname))
             self.set_parent_to_traversal()
+        self._check_encoding_chars_change()
+        self._invalidate_er7()
 
     def _get_value(self):
         return self._value
@@ -1229,6 +1599,8 @@ class Component(SupportComplexDataType, CanBeVaries):
     :param traversal_parent: the temporary parent used during traversal
     """
     child_classes = {"CMP": SubComponent}
+
+    __slots__ = ()
     child_parser = ('parse_subcomponent', 'parse_subcomponents')
 
     def __init__(self, name=None, datatype=None, parent=None, reference=None,
@@ -1308,7 +1680,7 @@ class Component(SupportComplexDataType, CanBeVaries):
         return super(Component, self).parse_children(text, **kwargs)
 
 
-class Field(SupportComplexDataType):
+class Field(SupportComplexDataType, SupportLazyParsing):
     """
     Class representing an HL7 field.
 
@@ -1335,6 +1707,8 @@ class Field(SupportComplexDataType):
     :param traversal_parent: the temporary parent used during traversal
     """
     child_classes = {"CMP": Component}
+
+    __slots__ = ()
     child_parser = ('parse_component', 'parse_components')
 
     def __init__(self, name=None, datatype=None, parent=None, reference=None,
@@ -1455,6 +1829,10 @@ class Field(SupportComplexDataType):
         >>> print(msh_9.to_er7())
         ADT^A01^ADT_A01
         """
+        if self._er7 is not None:
+            text = self._get_original_er7(encoding_chars, trailing_children)
+            if text is not None:
+                return text
         if encoding_chars is None:
             encoding_chars = self.encoding_chars
         if self.is_named('MSH_1'):
@@ -1472,6 +1850,14 @@ class Field(SupportComplexDataType):
     def is_z_element(self):
         return self.name is not None and _valid_z_field_name(self.name)
 
+    def _parse_lazy_children(self):
+        text, encoding_chars, kwargs = self._lazy_er7
+        self._lazy_er7 = None
+        module = importlib.import_module("hl7apy.parser")
+        self._set_parsed_children(module.parse_components(text, kwargs['datatype'], self.version, encoding_chars,
+                                                          self.validation_level, self.structure_by_name),
+                                  kwargs.get('keep_er7', False))
+
     def _set_value(self, value):
         if self.name in ('MSH_1', 'MSH_2'):
             c = Component(datatype='ST', version=self.version,
@@ -1565,7 +1951,7 @@ class Field(SupportComplexDataType):
         self._do_traversal('del', name)
 
 
-class Segment(Element):
+class Segment(SupportLazyParsing):
     """
     Class representing an HL7 segment.
 
@@ -1708,6 +2094,10 @@ class Segment(Element):
         >>> print(pid.to_er7())
         PID|1||||EVERYMAN^ADAM
         """
+        if self._er7 is not None:
+            text = self._get_original_er7(encoding_chars, trailing_children)
+            if text is not None:
+                return text
         if encoding_chars is None:
             encoding_chars = self.encoding_chars
 
@@ -1731,6 +2121,31 @@ class Segment(Element):
     def is_z_element(self):
         return _valid_z_segment_name(self.name)
 
+    def _copy_on_access(self):
+        """
+        Return a copy of the segment whose children are copied from this one only when they are first accessed.
+        The segment must not be changed afterwards (see :func:`set_segment_cache_size
+        <hl7apy.parser.set_segment_cache_size>`)
+        """
+        segment = self._clone(copy_children=False)
+        segment._lazy_er7 = (None, None, {'template': self})
+        return segment
+
+    def _parse_lazy_children(self):
+        text, encoding_chars, kwargs = self._lazy_er7
+        self._lazy_er7 = None
+        if 'template' in kwargs:
+            self._copy_children(kwargs['template'])
+            return
+        text = text[4:] if self.name != 'MSH' else text[3:]
+        module = importlib.import_module("hl7apy.parser")
+        keep_er7 = kwargs.get('keep_er7', False)
+        self._set_parsed_children(module.parse_fields(text, self.name, self.version, encoding_chars,
+                                                      self.validation_level, self.structure_by_name,
+                                                      self.allow_infinite_children, lazy=True,
+                                                      keep_er7=keep_er7),
+                                  keep_er7)
+
     def _is_valid_child(self, child):
         # cannot add an unknown child with strict validation
         if child.name is None and Validator.is_strict(self.validation_level):
@@ -1786,8 +2201,6 @@ class Group(Element):
     def __init__(self, name=None, parent=None, reference=None, version=None,
                  validation_level=None, traversal_parent=None):
 
-        # self.child_classes = (Segment, Group)
-        self.child_classes = {"SEG": Segment, "GRP": Group}
         super(Group, self).__init__(name, parent, reference, version, validation_level, traversal_parent)
         if self.name is None and Validator.is_strict(self.validation_level):
             raise OperationNotAllowed("Cannot instantiate an unknown Element with strict validation")
@@ -1889,6 +2302,10 @@ class Group(Element):
         return children
 
 
+# a group can contain itself, so its child classes are set once the class is defined
+Group.child_classes = {"SEG": Segment, "GRP": Group}
+
+
 class Message(Group):
     """
     Class representing an HL7 message
@@ -1904,9 +2321,12 @@ class Message(Group):
         (see :func:`get_default_encoding_chars <hl7apy.get_default_encoding_chars>`)
     """
 
+    cls_attrs = Group.cls_attrs + ['_encoding_chars']
+
     def __init__(self, name=None, reference=None, version=None, validation_level=None,
                  encoding_chars=None):
 
+        self._encoding_chars = None
         if reference is not None:
             try:
                 reference = reference[name]
@@ -1997,7 +2417,18 @@ class Message(Group):
     def is_z_element(self):
         return _valid_z_message_name(self.name)
 
+    def _invalidate_encoding_chars(self):
+        self._encoding_chars = None
+
     def _get_encoding_chars(self):
+        # the encoding chars are read from the MSH segment only the first time they are requested after
+        # a change of MSH_1 or MSH_2 (see :meth:`Element._check_encoding_chars_change`). A copy is returned,
+        # so that the cached dict can't be modified
+        if self._encoding_chars is None:
+            self._encoding_chars = self._read_encoding_chars()
+        return dict(self._encoding_chars)
+
+    def _read_encoding_chars(self):
         msh_2 = self.msh.msh_2.msh_2_1.children[0].value.value
         chars = {
             'FIELD': self.msh.msh_1.msh_1_1.children[0].value.value,
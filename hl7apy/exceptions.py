@@ -319,6 +319,23 @@ class InvalidEncodingChars(HL7apyException):
             return 'Invalid encoding chars'
 
 
+class InvalidPath(HL7apyException):
+    """
+    Raised when a path given to :mod:`hl7apy.extract` is not valid
+
+    >>> from hl7apy.extract import compile_path
+    >>> compile_path('PID.3')  # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ...
+    InvalidPath: Invalid path: PID.3
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return 'Invalid path: {0}'.format(self.path)
+
+
 class MessageProfileNotFound(HL7apyException):
     """
     Raised when the structure for a message is not found in the message profile specified
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Extract some values from ER7-encoded messages without parsing them.
+
+The values are addressed by paths in the form ``SEGMENT[repetition]-field(repetition).component.subcomponent``,
+where the repetitions, the component and the subcomponent are optional. Positions and repetitions start
+from 1 and the first repetition is used when it is not specified; ``*`` selects all the repetitions and the
+path returns the list of the values found.
+
+>>> from hl7apy.extract import extract
+>>> msg = 'MSH|^~\\\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|0123456789|P|2.5\\r' \\
+... 'PID|1||566-554-3423^^^GHH^MR~123^^^HOSP||EVERYMAN^ADAM^A\\r' \\
+... 'OBX|1|NM|GLUCOSE||182\\rOBX|2|NM|BUN||10\\\\S\\\\5'
+>>> values = extract(msg, ['MSH-10', 'PID-3(2).1', 'PID-5', 'OBX[*]-5', 'PID-20'])
+>>> print(values['MSH-10'])
+0123456789
+>>> print(values['PID-3(2).1'])
+123
+>>> print(values['PID-5'])
+EVERYMAN^ADAM^A
+>>> print(values['OBX[*]-5'] == ['182', '10^5'])
+True
+>>> print(values['PID-20'])
+None
+"""
+
+from __future__ import absolute_import
+import collections
+import re
+import threading
+
+from hl7apy.base_datatypes import get_escape_codec
+from hl7apy.exceptions import InvalidPath
+from hl7apy.tokenizer import ER7Index
+
+_PATH_REGEX = re.compile(r'^(?P<segment>[A-Z][A-Z0-9]{2})(\[(?P<segment_rep>\*|\d+)\])?-(?P<field>\d+)'
+                         r'(\((?P<field_rep>\*|\d+)\))?(\.(?P<component>\d+)(\.(?P<subcomponent>\d+))?)?$',
+                         re.IGNORECASE)
+
+_Path = collections.namedtuple('_Path', ('path', 'segment', 'segment_rep', 'explicit_segment_rep', 'field',
+                                         'field_rep', 'component', 'subcomponent', 'multiple', 'indexes'))
+
+
+def compile_path(path):
+    """
+    Check the given path and return its compiled form, used by :class:`PathExtractor` and :func:`get_value`.
+    Its ``explicit_segment_rep`` attribute is ``True`` when the segment repetition is written in the path
+    (e.g. ``OBX[1]-5`` but not ``OBX-5``)
+
+    :type path: ``str``
+    :param path: the path (e.g. ``PID-3(1).1``)
+
+    :raise: :exc:`InvalidPath <hl7apy.exceptions.InvalidPath>` if the path is not valid
+    """
+    m = _PATH_REGEX.match(path.strip())
+    if m is None:
+        raise InvalidPath(path)
+
+    def _index(name):
+        # the positions are converted to 0-based indexes, None means all the repetitions
+        value = m.group(name)
+        if value is None:
+            return 0
+        if value == '*':
+            return None
+        if int(value) < 1:
+            raise InvalidPath(path)
+        return int(value) - 1
+
+    segment_rep, field_rep = _index('segment_rep'), _index('field_rep')
+    field = int(m.group('field'))
+    component = _index('component') if m.group('component') is not None else None
+    subcomponent = _index('subcomponent') if m.group('subcomponent') is not None else None
+    if field < 1:
+        raise InvalidPath(path)
+    segment = m.group('segment').upper()
+    # the indexes of the value in a segment (see ER7Index.locate): the first field of MSH is its separator
+    indexes = (field - 1 if segment == 'MSH' else field, field_rep, component, subcomponent)
+    indexes = indexes[:indexes.index(None)] if None in indexes else indexes
+    return _Path(path, segment, segment_rep, m.group('segment_rep') is not None, field, field_rep, component,
+                 subcomponent, segment_rep is None or field_rep is None, indexes)
+
+
+class PathExtractor(object):
+    """
+    Extract the values of a list of paths from ER7-encoded messages. The paths are compiled once, and
+    the values are read from the text of the messages: no :class:`Element <hl7apy.core.Element>` is created.
+
+    The values are returned as they are found in the message when they contain components or subcomponents
+    (e.g. ``PID-5`` returns ``EVERYMAN^ADAM``) otherwise their escape sequences are replaced according to the
+    encoding chars of the message (see :meth:`EscapeCodec.unescape <hl7apy.base_datatypes.EscapeCodec.unescape>`).
+    Empty values are returned as ``''`` while the values that are not in the message are ``None``.
+
+    :type paths: ``list``
+    :param paths: the paths of the values (see :func:`compile_path`)
+
+    :type unescape: ``bool``
+    :param unescape: if ``False`` the escape sequences of the values are not replaced
+
+    :raise: :exc:`InvalidPath <hl7apy.exceptions.InvalidPath>` if a path is not valid
+    """
+
+    def __init__(self, paths, unescape=True):
+        self.paths = tuple(paths)
+        self.unescape = unescape
+        self._compiled_paths = [compile_path(p) for p in self.paths]
+
+    def extract(self, message):
+        """
+        Extract the values from the given message
+
+        :type message: ``str`` or :class:`ER7Index <hl7apy.tokenizer.ER7Index>`
+        :param message: the ER7-encoded message, or its index to share it with other extractors
+
+        :return: a ``dict`` with the values by path. The paths with a ``*`` have a list of values
+
+        :raise: :exc:`ParserError <hl7apy.exceptions.ParserError>` if the message doesn't start with
+            a valid MSH segment
+        """
+        if isinstance(message, ER7Index):
+            index = message
+        else:
+            index = ER7Index(message)
+        encoding_chars = index.encoding_chars
+        if self.unescape:
+            codec = get_escape_codec(encoding_chars, 'TRUNCATION' in encoding_chars)
+        else:
+            codec = None
+
+        values = {}
+        for path in self._compiled_paths:
+            found = []
+            for segment in _select(index.find_segments(path.segment), path.segment_rep):
+                _get_field_values(path, index, segment, codec, found)
+            if path.multiple:
+                values[path.path] = found
+            else:
+                values[path.path] = found[0] if found else None
+        return values
+
+
+def _select(items, index):
+    if index is None:
+        return items
+    if index < len(items):
+        return (items[index],)
+    return ()
+
+
+def _get_field_values(path, index, segment, codec, found):
+    if path.field_rep is not None or (path.segment == 'MSH' and path.field <= 2):
+        value = get_value(path, index, segment, codec)
+        if value is not None:
+            found.append(value)
+        return
+
+    field, message, encoding_chars = path.indexes[0], index.message, index.encoding_chars
+    for repetition in range(index.repetitions(segment, field)):
+        bounds = index.value_bounds(segment, field, repetition, path.component, path.subcomponent)
+        if bounds is not None:
+            found.append(_unescape(message[bounds[0]:bounds[1]], encoding_chars, codec))
+
+
+def get_value(path, index, segment, codec=None):
+    """
+    Return the value of a compiled path in the given segment of an indexed message. The repetition of the
+    segment in the path is ignored, so the same path can be read from every occurrence of the segment.
+
+    :param path: the path from :func:`compile_path`. It must select a single repetition of the field
+
+    :type index: :class:`ER7Index <hl7apy.tokenizer.ER7Index>`
+    :param index: the index of the message
+
+    :type segment: ``int``
+    :param segment: the position of the segment in the message (see
+        :meth:`ER7Index.find_segments <hl7apy.tokenizer.ER7Index.find_segments>`)
+
+    :type codec: :class:`EscapeCodec <hl7apy.base_datatypes.EscapeCodec>`
+    :param codec: the codec used to replace the escape sequences of the values without components or
+        subcomponents (see :func:`get_escape_codec <hl7apy.base_datatypes.get_escape_codec>`), or ``None``
+        to return the values as they are found in the message
+
+    :return: the value, or ``None`` if it is not in the segment
+
+    :raise: :exc:`InvalidPath <hl7apy.exceptions.InvalidPath>` if the path selects all the repetitions of
+        the field
+
+    >>> from hl7apy.tokenizer import ER7Index
+    >>> index = ER7Index('MSH|^~\\\\&|||||||ADT^A01^ADT_A01|1|P|2.5\\rNK1|1|EVE\\rNK1|2|ABEL')
+    >>> path = compile_path('NK1-2')
+    >>> print(', '.join(get_value(path, index, s) for s in index.find_segments('NK1')))
+    EVE, ABEL
+    """
+    if path.field_rep is None:
+        raise InvalidPath(path.path)
+    if path.segment == 'MSH' and path.field <= 2:
+        # MSH-1 is the field separator that splits the segment, while MSH-2 contains the other separators
+        if path.field == 1:
+            return index.encoding_chars['FIELD']
+        return index.field(segment, 1)
+    bounds = index.locate(segment, path.indexes)
+    if bounds is None:
+        return None
+    return _unescape(index.message[bounds[0]:bounds[1]], index.encoding_chars, codec)
+
+
+def _unescape(value, encoding_chars, codec):
+    # the values with components or subcomponents are returned as they are
+    if codec is not None and encoding_chars['COMPONENT'] not in value and encoding_chars['SUBCOMPONENT'] not in value:
+        return codec.unescape(value)
+    return value
+
+
+_extractors = collections.OrderedDict()
+_extractors_lock = threading.Lock()
+_EXTRACTORS_CACHE_SIZE = 256
+
+
+def extract(message, paths, unescape=True):
+    """
+    Extract the values of the given paths from an ER7-encoded message (see :class:`PathExtractor`).
+    The paths are compiled only the first time they are used
+
+    :type message: ``str``
+    :param message: the ER7-encoded message
+
+    :type paths: ``list``
+    :param paths: the paths of the values (e.g. ``['MSH-10', 'PID-3(1).1', 'OBX[*]-5']``)
+
+    :type unescape: ``bool``
+    :param unescape: if ``False`` the escape sequences of the values are not replaced
+
+    :return: a ``dict`` with the values by path
+    """
+    key = (tuple(paths), unescape)
+    with _extractors_lock:
+        extractor = _extractors.get(key)
+    if extractor is None:
+        extractor = PathExtractor(key[0], unescape)
+        with _extractors_lock:
+            _extractors[key] = extractor
+            if len(_extractors) > _EXTRACTORS_CACHE_SIZE:
+                _extractors.popitem(last=False)
+    return extractor.extract(message)
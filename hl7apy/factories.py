@@ -26,9 +26,9 @@ The functions get the value of the data type as string and return the correct ob
 
 from __future__ import absolute_import
 from decimal import Decimal, InvalidOperation
-from types import FunctionType
+from functools import partial
 
-from hl7apy import load_library, get_default_validation_level, get_default_version
+from hl7apy import get_version_context, get_default_validation_level, get_default_version, instrumentation
 from hl7apy.exceptions import InvalidDataType
 from hl7apy.utils import get_date_info, get_datetime_info, get_timestamp_info
 
@@ -66,43 +66,76 @@ def datatype_factory(datatype, value, version=None, validation_level=None):
 
     """
 
-    from hl7apy.validation import Validator
-
     if validation_level is None:
         validation_level = get_default_validation_level()
 
     if version is None:
         version = get_default_version()
 
-    lib = load_library(version)
+    try:
+        factory = _get_dispatch_table(version, validation_level)[datatype]
+    except KeyError:
+        raise InvalidDataType(datatype)
+    sink = instrumentation._sink
+    if sink is None:
+        return factory(value)
+    start = instrumentation._timer()
+    instance = factory(value)
+    sink.record('datatype_factory', datatype, instrumentation._timer() - start)
+    return instance
+
 
-    base_datatypes = lib.get_base_datatypes()
+#: (version, validation_level) -> {datatype: function that creates the datatype from its value}
+_dispatch_tables = {}
 
-    factories = base_datatypes.copy()
+#: the base datatypes whose constructor can reject a value (with a :exc:`ValueError`)
+_CHECKED_DATATYPES = frozenset(('TN',))
 
-    if 'DT' in factories:
-        factories['DT'] = date_factory
-    if 'TM' in factories:
-        factories['TM'] = timestamp_factory
-    if 'DTM' in factories:
-        factories['DTM'] = datetime_factory
-    if 'NM' in factories:
-        factories['NM'] = numeric_factory
-    if 'SI' in factories:
-        factories['SI'] = sequence_id_factory
 
+def _get_dispatch_table(version, validation_level):
+    """
+    Return the functions that create the base datatypes of the given version using the given validation
+    level. They are computed only once for every version and validation level
+    """
+    key = (version, validation_level)
     try:
-        factory = factories[datatype]
-        if isinstance(factory, FunctionType):
-            return factory(value, base_datatypes[datatype], validation_level=validation_level)
-        return factory(value, validation_level=validation_level)
+        return _dispatch_tables[key]
     except KeyError:
-        raise InvalidDataType(datatype)
-    except ValueError as e:
-        if Validator.is_strict(validation_level):
-            raise e
-        # TODO: Do we really want this? In that case the parent's datatype must be changed accordingly
-        return factories['ST'](value)
+        pass
+
+    from hl7apy.validation import Validator
+
+    base_datatypes = get_version_context(version).base_datatypes
+    factories = {
+        'DT': date_factory,
+        'TM': timestamp_factory,
+        'DTM': datetime_factory,
+        'NM': numeric_factory,
+        'SI': sequence_id_factory
+    }
+    dispatch_table = {}
+    for datatype, datatype_cls in base_datatypes.items():
+        if datatype in factories:
+            factory = partial(factories[datatype], datatype_cls=datatype_cls, validation_level=validation_level)
+        else:
+            factory = partial(datatype_cls, validation_level=validation_level)
+        if (datatype in factories or datatype in _CHECKED_DATATYPES) and \
+                not Validator.is_strict(validation_level):
+            factory = _tolerant_factory(factory, base_datatypes['ST'])
+        # the other datatypes accept any value, so they are created without the fallback to ST
+        dispatch_table[datatype] = factory
+    _dispatch_tables[key] = dispatch_table
+    return dispatch_table
+
+
+def _tolerant_factory(factory, fallback_cls):
+    def _create(value):
+        try:
+            return factory(value)
+        except ValueError:
+            # TODO: Do we really want this? In that case the parent's datatype must be changed accordingly
+            return fallback_cls(value)
+    return _create
 
 
 def date_factory(value, datatype_cls, validation_level=None):
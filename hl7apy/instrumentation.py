@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Optional instrumentation of the parser and of the validator.
+
+When a sink is set (see :func:`set_sink`), the parser and the validator report to it the number of calls and
+the time spent in every stage, and the number of elements created for every parsed message. The stages, and
+the keys they are reported with, are:
+
+* ``parse_message``: the message structure (e.g. ``ADT_A01``)
+* ``parse_segments``: ``None``
+* ``parse_segment``: the segment name (e.g. ``PID``)
+* ``parse_fields``: the segment name
+* ``parse_components``: the field datatype (e.g. ``XPN``)
+* ``datatype_factory``: the base datatype (e.g. ``ST``)
+* ``validate``: the name of the validated element
+
+The times are cumulative: the time of a stage includes the time of the stages it calls (e.g. ``parse_message``
+includes ``parse_segments``). No sink is set by default, and then the instrumented functions only check
+that the sink is ``None``.
+
+>>> from hl7apy.instrumentation import instrumented
+>>> from hl7apy.parser import parse_message
+>>> msg = 'MSH|^~\\\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|0123456789|P|2.5\\r' \\
+... 'PID|1||566-554-3423^^^GHH^MR||EVERYMAN^ADAM^A'
+>>> with instrumented() as stats:
+...     m = parse_message(msg)
+>>> print([(s.stage, s.key, s.calls) for s in stats.stage_stats() if s.stage == 'parse_segment'])
+[('parse_segment', 'MSH', 1), ('parse_segment', 'PID', 1)]
+>>> print(stats.elements_stats()[0].structure)
+ADT_A01
+"""
+
+from __future__ import absolute_import
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    _timer = time.perf_counter
+except AttributeError:  # python 2
+    _timer = time.time
+
+# the sink the parser and the validator report to, None when the instrumentation is disabled
+_sink = None
+
+StageStats = namedtuple('StageStats', ('stage', 'key', 'calls', 'total_time'))
+ElementsStats = namedtuple('ElementsStats', ('structure', 'messages', 'elements'))
+
+
+def set_sink(sink):
+    """
+    Set the sink the parser and the validator report to
+
+    :type sink: :class:`Sink`
+    :param sink: the sink, or ``None`` to disable the instrumentation
+
+    :return: the sink previously set
+    """
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def get_sink():
+    """
+    Return the sink the parser and the validator report to, or ``None`` if the instrumentation is disabled
+    """
+    return _sink
+
+
+@contextmanager
+def instrumented(sink=None):
+    """
+    Context manager that sets the given sink (a new :class:`StatsSink` if it is ``None``) and restores the
+    previous one at its exit
+
+    :type sink: :class:`Sink`
+    :param sink: the sink
+
+    :return: the sink
+    """
+    if sink is None:
+        sink = StatsSink()
+    previous = set_sink(sink)
+    try:
+        yield sink
+    finally:
+        set_sink(previous)
+
+
+class Sink(object):
+    """
+    Base class of the sinks. The subclasses override the methods of the events they are interested in.
+    The methods are called by the thread that is parsing or validating, so they must be fast and thread-safe
+    """
+
+    def record(self, stage, key, elapsed):
+        """
+        Called when a stage ends
+
+        :type stage: ``str``
+        :param stage: the name of the stage (e.g. ``parse_fields``)
+
+        :param key: the key of the stage (e.g. the segment name for ``parse_fields``)
+
+        :type elapsed: ``float``
+        :param elapsed: the duration of the stage in seconds
+        """
+
+    def record_elements(self, structure, elements):
+        """
+        Called when a message has been parsed
+
+        :type structure: ``str``
+        :param structure: the message structure (e.g. ``ADT_A01``), or ``None`` if it is unknown
+
+        :type elements: ``int``
+        :param elements: the number of elements (groups, segments, fields, components and subcomponents)
+            created for the message. With lazy parsing, the ones not parsed yet are not counted
+        """
+
+
+class StatsSink(Sink):
+    """
+    Sink that keeps in memory the number of calls and the cumulative time of every stage and key, and the
+    number of messages and elements of every message structure
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._elements = {}
+
+    def record(self, stage, key, elapsed):
+        with self._lock:
+            try:
+                stats = self._stages[(stage, key)]
+            except KeyError:
+                self._stages[(stage, key)] = [1, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+
+    def record_elements(self, structure, elements):
+        with self._lock:
+            try:
+                stats = self._elements[structure]
+            except KeyError:
+                self._elements[structure] = [1, elements]
+            else:
+                stats[0] += 1
+                stats[1] += elements
+
+    def stage_stats(self):
+        """
+        Return the statistics of the stages
+
+        :return: a list of :class:`StageStats` namedtuples with ``stage``, ``key``, ``calls`` and ``total_time``
+            (in seconds) fields, sorted by stage and key
+        """
+        with self._lock:
+            stats = [StageStats(stage, key, calls, total_time)
+                     for (stage, key), (calls, total_time) in self._stages.items()]
+        return sorted(stats, key=lambda s: (s.stage, s.key or ''))
+
+    def elements_stats(self):
+        """
+        Return the number of elements created for every message structure
+
+        :return: a list of :class:`ElementsStats` namedtuples with ``structure``, ``messages`` and ``elements``
+            fields, sorted by structure
+        """
+        with self._lock:
+            stats = [ElementsStats(structure, messages, elements)
+                     for structure, (messages, elements) in self._elements.items()]
+        return sorted(stats, key=lambda s: s.structure or '')
+
+    def reset(self):
+        """
+        Remove all the statistics
+        """
+        with self._lock:
+            self._stages.clear()
+            self._elements.clear()
+
+
+class LoggingSink(Sink):
+    """
+    Sink that writes every event to a logger
+
+    :type logger: :class:`logging.Logger`
+    :param logger: the logger, or ``None`` to use the ``hl7apy.instrumentation`` one
+
+    :type level: ``int``
+    :param level: the level of the log records
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.level = level
+
+    def record(self, stage, key, elapsed):
+        self.logger.log(self.level, "%s %s: %.6f s", stage, key, elapsed)
+
+    def record_elements(self, structure, elements):
+        self.logger.log(self.level, "message %s: %d elements", structure, elements)
+
+
+class PrometheusSink(StatsSink):
+    """
+    :class:`StatsSink` that exports its statistics in the Prometheus text format
+
+    >>> sink = PrometheusSink()
+    >>> sink.record('parse_fields', 'PID', 0.5)
+    >>> print(sink.export())
+    # HELP hl7apy_stage_calls_total Number of calls of the parsing and validation stages
+    # TYPE hl7apy_stage_calls_total counter
+    hl7apy_stage_calls_total{stage="parse_fields",key="PID"} 1
+    # HELP hl7apy_stage_seconds_total Time spent in the parsing and validation stages
+    # TYPE hl7apy_stage_seconds_total counter
+    hl7apy_stage_seconds_total{stage="parse_fields",key="PID"} 0.5
+    # HELP hl7apy_messages_total Number of parsed messages
+    # TYPE hl7apy_messages_total counter
+    # HELP hl7apy_message_elements_total Number of elements created for the parsed messages
+    # TYPE hl7apy_message_elements_total counter
+    <BLANKLINE>
+    """
+
+    def export(self, prefix='hl7apy'):
+        """
+        Return the statistics in the Prometheus text exposition format
+
+        :type prefix: ``str``
+        :param prefix: the prefix of the metric names
+
+        :rtype: ``str``
+        """
+        stages = self.stage_stats()
+        elements = self.elements_stats()
+        lines = []
+
+        def _metric(name, description, samples):
+            lines.append('# HELP {0}_{1} {2}'.format(prefix, name, description))
+            lines.append('# TYPE {0}_{1} counter'.format(prefix, name))
+            for labels, value in samples:
+                labels = ','.join('{0}="{1}"'.format(label, _escape_label(label_value))
+                                  for label, label_value in labels)
+                lines.append('{0}_{1}{{{2}}} {3}'.format(prefix, name, labels, repr(value)))
+
+        _metric('stage_calls_total', 'Number of calls of the parsing and validation stages',
+                [((('stage', s.stage), ('key', s.key)), s.calls) for s in stages])
+        _metric('stage_seconds_total', 'Time spent in the parsing and validation stages',
+                [((('stage', s.stage), ('key', s.key)), s.total_time) for s in stages])
+        _metric('messages_total', 'Number of parsed messages',
+                [((('structure', e.structure),), e.messages) for e in elements])
+        _metric('message_elements_total', 'Number of elements created for the parsed messages',
+                [((('structure', e.structure),), e.elements) for e in elements])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value):
+    if value is None:
+        return ''
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -24,14 +24,30 @@ from __future__ import unicode_literals
 
 import re
 import socket
+import time
+import uuid
 try:
     from SocketServer import StreamRequestHandler, ThreadingTCPServer
 except ImportError:
     from socketserver import StreamRequestHandler, ThreadingTCPServer
 
-from hl7apy.parser import get_message_type
+from hl7apy.base_datatypes import get_escape_codec
+from hl7apy.consts import MLLP_ENCODING_CHARS
+from hl7apy.parser import get_message_type, decode_message, _split_msh, _BYTES_TYPES
 from hl7apy.exceptions import HL7apyException, ParserError
 
+ACK_CODES = ('AA', 'AE', 'AR', 'CA', 'CE', 'CR')
+
+# the sending and receiving application and facility are swapped
+_ACK_TEMPLATE = 'MSH{f}{seps}{f}{msh_5}{f}{msh_6}{f}{msh_3}{f}{msh_4}{f}{msh_7}{f}{f}{msh_9}{f}{msh_10}{f}{msh_11}' \
+                '{f}{msh_12}\rMSA{f}{code}{f}{control_id}'
+
+_VERSION_NUMBERS_REGEX = re.compile(r'\d+')
+# an ER7-encoded message: segments separated by carriage returns
+_MESSAGE_REGEX = re.compile(r"(([^\r]+\r)*([^\r]+\r?))$")
+# (second, MSH-7 value) of the last ACK created
+_ack_timestamp = (None, None)
+
 
 class UnsupportedMessageType(HL7apyException):
     """
@@ -52,85 +68,275 @@ class InvalidHL7Message(HL7apyException):
         return 'The string received is not a valid HL7 message'
 
 
+class MLLPFrameError(HL7apyException):
+    """
+    Error that occurs when the bytes received by the :class:`MLLPServer` are not correctly MLLP-framed or when
+    a frame exceeds the maximum size allowed
+    """
+
+
+class MLLPFrameReader(object):
+    """
+    Incremental decoder of an MLLP byte stream. It doesn't perform any I/O: the bytes read from the connection
+    are passed to :meth:`feed` which returns the payloads of all the frames completed so far.
+    The incoming bytes are accumulated in a single buffer and only the new data are scanned for the end block,
+    so that a frame is never copied more than once.
+
+    >>> reader = MLLPFrameReader()
+    >>> list(reader.feed(b'\\x0bMSH|1\\x1c'))
+    []
+    >>> list(reader.feed(b'\\x0d\\x0bMSH|2\\x1c\\x0d')) == [b'MSH|1', b'MSH|2']
+    True
+
+    :type max_frame_size: ``int``
+    :param max_frame_size: the maximum number of bytes allowed for a frame (delimiters included).
+        If it is ``None`` there is no limit
+    """
+    start_block = b'\x0b'
+    end_block = b'\x1c\x0d'
+
+    def __init__(self, max_frame_size=None):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._scan_from = 0
+
+    def feed(self, data):
+        """
+        Add the bytes in input to the buffer and return an iterator over the payloads of the frames completed.
+        A framing error is raised by the iterator only after all the frames preceding it have been returned.
+
+        :type data: ``bytes``
+        :param data: the bytes read from the connection
+        :return: an iterator of ``bytes`` with the content of the completed frames, without delimiters
+        :raises: :exc:`MLLPFrameError` if a frame doesn't start with the start block or if it exceeds
+            :attr:`max_frame_size`
+        """
+        self._buffer += data
+        return self._get_frames()
+
+    def _get_frames(self):
+        buf = self._buffer
+        while buf:
+            if buf[0:1] != self.start_block:
+                raise MLLPFrameError('Invalid MLLP start block')
+            end = buf.find(self.end_block, self._scan_from)
+            if end == -1:
+                # the last byte could be the first of the end block
+                self._scan_from = max(len(buf) - 1, 1)
+                if self.max_frame_size is not None and len(buf) > self.max_frame_size:
+                    raise MLLPFrameError('MLLP frame exceeds the maximum size ({})'.format(self.max_frame_size))
+                return
+            frame_end = end + len(self.end_block)
+            if self.max_frame_size is not None and frame_end > self.max_frame_size:
+                raise MLLPFrameError('MLLP frame exceeds the maximum size ({})'.format(self.max_frame_size))
+            frame = bytes(buf[1:end])
+            del buf[:frame_end]
+            self._scan_from = 1
+            yield frame
+
+    def has_partial_frame(self):
+        """
+        Return ``True`` if the buffer contains the beginning of a frame not completed yet
+        """
+        return len(self._buffer) > 0
+
+
+def build_ack(message, code='AA', text=None, errors=(), control_id=None, mllp=True):
+    """
+    Create the ER7-encoded acknowledgment of a message, reading the fields needed (MSH-3 to MSH-6 and MSH-9
+    to MSH-12) from its MSH segment: the message is not parsed and no :class:`Element <hl7apy.core.Element>`
+    is created. The acknowledgment uses the encoding chars of the message.
+
+    >>> msg = 'MSH|^~\\\\&|SENDER|SFAC|RECEIVER|RFAC|20110708162817||ADT^A01^ADT_A01|MSG00001|P|2.5\\r' \\
+    ...       'PID|1||566-554-3423^^^GHH^MR'
+    >>> ack = build_ack(msg, 'AE', 'Unknown patient', [('', '', '204^Unknown key identifier^HL70357', 'E')],
+    ...                 control_id='ACK00001', mllp=False)
+    >>> msh, msa, err = ack.split('\\r')
+    >>> print(msh.replace(msh.split('|')[6], 'YYYYMMDDHHMMSS'))  # MSH-7 is the current date/time
+    MSH|^~\\&|RECEIVER|RFAC|SENDER|SFAC|YYYYMMDDHHMMSS||ACK^A01^ACK|ACK00001|P|2.5
+    >>> print(msa)
+    MSA|AE|MSG00001|Unknown patient
+    >>> print(err)
+    ERR|||204^Unknown key identifier^HL70357|E
+
+    :type message: ``str``
+    :param message: the ER7-encoded message to acknowledge. ``bytes`` are decoded according to the MSH-18
+        field (see :func:`decode_message <hl7apy.parser.decode_message>`)
+
+    :type code: ``str``
+    :param code: the acknowledgment code (MSA-1): one of :attr:`ACK_CODES`
+
+    :type text: ``str``
+    :param text: the text message (MSA-3). It is escaped, line breaks included
+
+    :type errors: ``list``
+    :param errors: the ERR segments to add, each as a sequence of ER7-encoded field values starting from ERR-1
+
+    :type control_id: ``str``
+    :param control_id: the message control id (MSH-10) of the acknowledgment. It is escaped. If it is ``None``
+        a random one is created
+
+    :type mllp: ``bool``
+    :param mllp: if ``True`` the acknowledgment is wrapped with the MLLP encoding chars
+
+    :return: the ER7-encoded acknowledgment
+
+    :raise: :exc:`ParserError <hl7apy.exceptions.ParserError>` if the message doesn't start with a valid
+        MSH segment, :exc:`ValueError` if the code is not valid or an error field contains the field
+        separator or a segment separator
+    """
+    global _ack_timestamp
+    if code not in ACK_CODES:
+        raise ValueError('Invalid acknowledgment code: {0}'.format(code))
+    if isinstance(message, _BYTES_TYPES):
+        message = decode_message(message)
+    fields, encoding_chars = _split_msh(message)
+    if len(fields) < 12:
+        fields.extend([''] * (12 - len(fields)))
+    field_sep, comp_sep = encoding_chars['FIELD'], encoding_chars['COMPONENT']
+
+    message_type = fields[8].split(comp_sep)
+    if len(message_type) > 1 and message_type[1]:
+        # the message structure (MSH-9.3) was introduced by HL7 v2.3.1
+        ack_type = comp_sep.join(('ACK', message_type[1], 'ACK')
+                                 if _version_tuple(fields[11].split(comp_sep, 1)[0]) >= (2, 3, 1) else
+                                 ('ACK', message_type[1]))
+    else:
+        ack_type = 'ACK'
+
+    second = int(time.time())
+    if _ack_timestamp[0] != second:
+        _ack_timestamp = (second, time.strftime('%Y%m%d%H%M%S', time.localtime(second)))
+
+    escape = _get_ack_escape(encoding_chars)
+    ack = _ACK_TEMPLATE.format(f=field_sep, seps=fields[1], msh_3=fields[2], msh_4=fields[3], msh_5=fields[4],
+                               msh_6=fields[5], msh_7=_ack_timestamp[1], msh_9=ack_type,
+                               msh_10=uuid.uuid4().hex[:20] if control_id is None else escape(control_id),
+                               msh_11=fields[10], msh_12=fields[11], code=code, control_id=fields[9])
+    if text:
+        ack = '{0}{1}{2}'.format(ack, field_sep, escape(text))
+    if errors:
+        segments = []
+        for error in errors:
+            for value in error:
+                # the values are already encoded, so they can contain components but not other fields or segments
+                if field_sep in value or '\r' in value or '\n' in value:
+                    raise ValueError('Invalid ERR field value: {0!r}'.format(value))
+            segments.append('\rERR{0}{1}'.format(field_sep, field_sep.join(error)))
+        ack += ''.join(segments)
+    if mllp:
+        return '{0}{1}{2}{3}{2}'.format(MLLP_ENCODING_CHARS.SB, ack, MLLP_ENCODING_CHARS.CR, MLLP_ENCODING_CHARS.EB)
+    return ack
+
+
+def _get_ack_escape(encoding_chars):
+    # the escape codec doesn't escape the line breaks, which would end the segment: they are hex-encoded
+    codec = get_escape_codec(encoding_chars, 'TRUNCATION' in encoding_chars)
+    esc = encoding_chars['ESCAPE']
+    cr, lf = '{0}X0D{0}'.format(esc), '{0}X0A{0}'.format(esc)
+
+    def escape(value):
+        return codec.escape(value).replace('\r', cr).replace('\n', lf)
+    return escape
+
+
+def _version_tuple(version):
+    # e.g. '2.3.1' -> (2, 3, 1), so that '2.10' follows '2.9'
+    return tuple(int(n) for n in _VERSION_NUMBERS_REGEX.findall(version))
+
+
+def _extract_hl7_message(validator, msg):
+    matched = validator.match(msg)
+    if matched is None:
+        return None
+    return matched.groups()[0]
+
+
+def _find_handler(handlers, msg):
+    """
+    Return the handler class of the message and the additional arguments of its constructor, as specified
+    in the ``handlers`` dictionary of the server (see :class:`MLLPServer`). It is shared by the servers of
+    :mod:`hl7apy.mllp` and :mod:`hl7apy.mllp_aio`
+    """
+    try:
+        msg_type = get_message_type(msg)
+    except ParserError:
+        raise InvalidHL7Message
+
+    try:
+        return handlers[msg_type][0], handlers[msg_type][1:]
+    except KeyError:
+        raise UnsupportedMessageType(msg_type)
+
+
+def _find_error_handler(handlers, exc):
+    """
+    Return the ``ERR`` handler class and the additional arguments of its constructor, or raise the exception
+    occurred if the server has no ``ERR`` handler
+    """
+    try:
+        return handlers['ERR'][0], handlers['ERR'][1:]
+    except KeyError:
+        raise exc
+
+
 class MLLPRequestHandler(StreamRequestHandler):
     encoding = 'utf-8'
+    recv_buffer_size = 64 * 1024
 
     def __init__(self, *args, **kwargs):
         StreamRequestHandler.__init__(self, *args, **kwargs)
 
     def setup(self):
-        self.sb = b"\x0b"
-        self.eb = b"\x1c"
-        self.cr = b"\x0d"
-        self.validator = re.compile(
-            ''.join([self.sb.decode('ascii'), r"(([^\r]+\r)*([^\r]+\r?))", self.eb.decode('ascii'), self.cr.decode('ascii')]))
+        self.validator = _MESSAGE_REGEX
         self.handlers = self.server.handlers
         self.timeout = self.server.timeout
+        self.reader = MLLPFrameReader(getattr(self.server, 'max_frame_size', None))
 
         StreamRequestHandler.setup(self)
 
     def handle(self):
-        end_seq = self.eb + self.cr
-        try:
-            line = self.request.recv(3)
-        except socket.timeout:
-            self.request.close()
-            return
-
-        if line[:1] != self.sb:  # First MLLP char
-            self.request.close()
-            return
-
-        while line[-2:] != end_seq:
+        # the connection is kept open until the client closes it, it stays idle longer than the timeout
+        # or it sends something that is not a valid MLLP frame
+        while True:
             try:
-                char = self.rfile.read(1)
-                if not char:
-                    break
-                line += char
+                data = self.request.recv(self.recv_buffer_size)
             except socket.timeout:
-                self.request.close()
-                return
+                break
+            except socket.error:
+                break
+            if not data:
+                break
 
-        message = self._extract_hl7_message(line.decode(self.encoding))
-        if message is not None:
             try:
-                response = self._route_message(message)
-            except Exception:
-                self.request.close()
-            else:
-                # encode the response
-                self.wfile.write(response.encode(self.encoding))
-        self.request.close()
+                for frame in self.reader.feed(data):
+                    if not self._handle_frame(frame):
+                        return
+            except MLLPFrameError:
+                break
+
+    def _handle_frame(self, frame):
+        message = self._extract_hl7_message(decode_message(frame, self.encoding))
+        if message is None:
+            return False
+        try:
+            response = self._route_message(message)
+        except Exception:
+            return False
+        # encode the response
+        self.wfile.write(response.encode(self.encoding))
+        return True
 
     def _extract_hl7_message(self, msg):
-        message = None
-        matched = self.validator.match(msg)
-        if matched is not None:
-            message = matched.groups()[0]
-        return message
+        return _extract_hl7_message(self.validator, msg)
 
     def _route_message(self, msg):
         try:
-            try:
-                msg_type = get_message_type(msg)
-            except ParserError:
-                raise InvalidHL7Message
-
-            try:
-                handler, args = self.handlers[msg_type][0], self.handlers[msg_type][1:]
-            except KeyError:
-                raise UnsupportedMessageType(msg_type)
-
-            h = self._create_handler(handler, msg, args)
-            return h.reply()
+            handler, args = _find_handler(self.handlers, msg)
+            return self._create_handler(handler, msg, args).reply()
         except Exception as e:
-            try:
-                err_handler, args = self.handlers['ERR'][0], self.handlers['ERR'][1:]
-            except KeyError:
-                raise e
-            else:
-                h = self._create_error_handler(err_handler, e, msg, args)
-                return h.reply()
+            err_handler, args = _find_error_handler(self.handlers, e)
+            return self._create_error_handler(err_handler, e, msg, args).reply()
 
     def _create_handler(self, handler_class, msg, args):
         return handler_class(msg, *args)
@@ -155,20 +361,32 @@ class MLLPServer(ThreadingTCPServer):
         which receives, in addition to other parameters, the raised exception as the first argument.
         If the special handler is not specified the server will just close the connection.
 
-        The class allows to specify the timeout to wait before closing the connection.
+        Connections are persistent: a client can send any number of MLLP frames on the same connection
+        and it receives the response of each message in the same order. The connection is closed when the
+        client closes it, when it stays idle for more than :attr:`timeout` seconds, when the bytes received
+        are not correctly framed or exceed :attr:`max_frame_size`, or when a message can't be handled
+        and there is no ``ERR`` handler.
+
+        The messages are decoded according to the character set in their MSH-18 field, or using the
+        ``encoding`` of the request handler (UTF-8) when it is empty
+        (see :func:`decode_message <hl7apy.parser.decode_message>`). The responses are encoded using ``encoding``.
 
         :param host: the address of the listener
         :param port: the port of the listener
         :param handlers: the dictionary that specifies the handler classes for every kind of supported message.
-        :param timeout: the timeout for the requests
+        :param timeout: the idle timeout of the connections
+        :param max_frame_size: the maximum size in bytes of an MLLP frame. If it is ``None`` there is no limit
     """
     allow_reuse_address = True
+    daemon_threads = True
 
-    def __init__(self, host, port, handlers, timeout=10, request_handler_class=MLLPRequestHandler):
+    def __init__(self, host, port, handlers, timeout=10, request_handler_class=MLLPRequestHandler,
+                 max_frame_size=None):
         self.host = host
         self.port = port
         self.handlers = handlers
         self.timeout = timeout
+        self.max_frame_size = max_frame_size
         ThreadingTCPServer.__init__(self, (host, port), request_handler_class)
 
 
@@ -189,6 +407,18 @@ class AbstractHandler(object):
         """
         raise NotImplementedError("The method reply() must be implemented in subclasses")
 
+    def ack(self, code='AA', text=None, errors=(), control_id=None):
+        """
+            Return the MLLP-encoded acknowledgment of the incoming message, without parsing it
+            (see :func:`build_ack`). It can be used as the response of :func:`reply() <AbstractHandler.reply>`
+
+            :param code: the acknowledgment code (MSA-1)
+            :param text: the text message (MSA-3)
+            :param errors: the ERR segments, each as a sequence of ER7-encoded field values
+            :param control_id: the message control id of the acknowledgment
+        """
+        return build_ack(self.incoming_message, code, text, errors, control_id)
+
 
 class AbstractErrorHandler(AbstractHandler):
     """
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+:mod:`asyncio` implementation of the MLLP server and of an MLLP client (Python 3.5+ only).
+
+The server uses the same ``handlers`` dictionary of :class:`MLLPServer <hl7apy.mllp.MLLPServer>` and the same
+:class:`AbstractHandler <hl7apy.mllp.AbstractHandler>` and
+:class:`AbstractErrorHandler <hl7apy.mllp.AbstractErrorHandler>` contract. The
+:func:`reply() <hl7apy.mllp.AbstractHandler.reply>` method of the handlers can be either a normal method or a
+coroutine.
+"""
+
+from __future__ import absolute_import
+
+import asyncio
+import collections
+import inspect
+
+from hl7apy.mllp import MLLPFrameError, MLLPFrameReader, _MESSAGE_REGEX, _extract_hl7_message, _find_handler, \
+    _find_error_handler
+from hl7apy.parser import decode_message, _split_msh, _BYTES_TYPES
+
+
+class AsyncMLLPServer(object):
+    """
+    An MLLP server based on :mod:`asyncio`: all the connections are served by a single thread.
+    Connections are persistent and the messages received on a connection are handled in order.
+
+    >>> import asyncio
+    >>> from hl7apy.mllp import AbstractHandler
+    >>> class ACKHandler(AbstractHandler):
+    ...     async def reply(self):
+    ...         return '\\x0bMSH|^~\\\\&|||||||ACK|1|P|2.5\\rMSA|AA|1\\x1c\\x0d'
+    >>> async def main():
+    ...     server = AsyncMLLPServer('localhost', 0, {'ADT^A01': (ACKHandler,)})
+    ...     await server.start()
+    ...     client = AsyncMLLPClient('localhost', server.port)
+    ...     await client.connect()
+    ...     res = await client.send_message('MSH|^~\\\\&|||||||ADT^A01|1|P|2.5')
+    ...     await client.close()
+    ...     server.close()
+    ...     await server.wait_closed()
+    ...     return res
+    >>> print(asyncio.run(main()).split('\\r')[1])
+    MSA|AA|1
+
+    The messages are decoded according to their MSH-18 field and the responses are encoded as
+    :class:`MLLPServer <hl7apy.mllp.MLLPServer>` does.
+
+    :param host: the address of the listener
+    :param port: the port of the listener
+    :param handlers: the dictionary that specifies the handler classes for every kind of supported message
+        (see :class:`MLLPServer <hl7apy.mllp.MLLPServer>`)
+    :param timeout: the idle timeout of the connections
+    :param max_frame_size: the maximum size in bytes of an MLLP frame. If it is ``None`` there is no limit
+    :param backlog: the maximum number of connections waiting to be accepted
+    """
+    encoding = 'utf-8'
+    recv_buffer_size = 64 * 1024
+
+    def __init__(self, host, port, handlers, timeout=10, max_frame_size=None, backlog=100):
+        self.host = host
+        self.port = port
+        self.handlers = handlers
+        self.timeout = timeout
+        self.max_frame_size = max_frame_size
+        self.backlog = backlog
+        self.validator = _MESSAGE_REGEX
+        self._server = None
+        self._writers = set()
+
+    async def start(self):
+        """
+        Start listening. If the server has been created with port ``0``, :attr:`port` is updated with the
+        port actually assigned
+        """
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  backlog=self.backlog)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """
+        Start the server, if needed, and serve the connections until the server is closed
+        """
+        if self._server is None:
+            await self.start()
+        await self._server.wait_closed()
+
+    def close(self):
+        """
+        Stop listening and close the connections established
+        """
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+
+    async def wait_closed(self):
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        frame_reader = MLLPFrameReader(self.max_frame_size)
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(reader.read(self.recv_buffer_size), self.timeout)
+                except (asyncio.TimeoutError, ConnectionError):
+                    break
+                if not data:
+                    break
+
+                try:
+                    for frame in frame_reader.feed(data):
+                        response = await self._handle_frame(frame)
+                        if response is None:
+                            return
+                        writer.write(response.encode(self.encoding))
+                        await writer.drain()
+                except MLLPFrameError:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle_frame(self, frame):
+        message = _extract_hl7_message(self.validator, decode_message(frame, self.encoding))
+        if message is None:
+            return None
+        try:
+            return await self._route_message(message)
+        except Exception:
+            return None
+
+    async def _route_message(self, msg):
+        # the same routing of MLLPRequestHandler, but the reply() of the handlers can be a coroutine
+        try:
+            handler, args = _find_handler(self.handlers, msg)
+            return await _reply(self._create_handler(handler, msg, args))
+        except Exception as e:
+            err_handler, args = _find_error_handler(self.handlers, e)
+            return await _reply(self._create_error_handler(err_handler, e, msg, args))
+
+    def _create_handler(self, handler_class, msg, args):
+        return handler_class(msg, *args)
+
+    def _create_error_handler(self, handler_class, exc, msg, args):
+        return handler_class(exc, msg, *args)
+
+
+class AsyncMLLPClient(object):
+    """
+    An :mod:`asyncio` MLLP client. Messages can be pipelined: :meth:`send_message` can be called again
+    before the response of the previous message is received. Responses are matched to the messages
+    using the MSA-2 field of the acknowledgment, which contains the MSH-10 of the message acknowledged.
+    Responses without an MSA segment, or with an unknown control id, are matched in order.
+
+    :param host: the address of the server
+    :param port: the port of the server
+    :param timeout: the maximum time in seconds to wait for a response. If it is ``None`` it waits forever
+    :param max_frame_size: the maximum size in bytes of a response frame. If it is ``None`` there is no limit
+    """
+    encoding = 'utf-8'
+    recv_buffer_size = 64 * 1024
+
+    def __init__(self, host, port, timeout=None, max_frame_size=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_frame_size = max_frame_size
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        # sequence number -> future of the response, in sending order
+        self._pending = collections.OrderedDict()
+        # control id -> sequence numbers of the messages waiting for the response
+        self._control_ids = {}
+        self._sequence = 0
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._reader_task = asyncio.ensure_future(self._read_responses())
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._writer = self._reader_task = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def send_message(self, message):
+        """
+        Send a message and wait for its response
+
+        :type message: ``str``, ``bytes`` or :class:`Message <hl7apy.core.Message>`
+        :param message: the message to send. If it is a ``str`` or ``bytes`` it must be ER7-encoded without
+            the MLLP delimiters. ``bytes`` are decoded using the :attr:`encoding` of the client
+        :rtype: ``str``
+        :return: the ER7-encoded response, without the MLLP delimiters
+        :raises: :exc:`ConnectionError` if the connection is closed before the response is received,
+            :exc:`asyncio.TimeoutError` if the response is not received within :attr:`timeout`
+        """
+        response = await self.send_nowait(message)
+        return await asyncio.wait_for(response, self.timeout)
+
+    async def send_message_batch(self, messages):
+        """
+        Pipeline all the messages in input over the connection and return their responses, in the same order
+
+        :param messages: an iterable of messages (see :meth:`send_message`)
+        :rtype: ``list``
+        """
+        futures = []
+        try:
+            for m in messages:
+                futures.append(await self.send_nowait(m))
+            return await asyncio.wait_for(asyncio.gather(*futures), self.timeout)
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+    async def send_nowait(self, message):
+        """
+        Send a message without waiting for the response
+
+        :param message: the message to send (see :meth:`send_message`)
+        :return: an :class:`asyncio.Future` that will be set to the response of the message
+        """
+        if self._writer is None or self._reader_task.done():
+            raise ConnectionError('The client is not connected')
+        if isinstance(message, _BYTES_TYPES):
+            message = decode_message(bytes(message), self.encoding)
+        elif not isinstance(message, str):
+            try:
+                message = message.to_er7()
+            except AttributeError:
+                raise TypeError('The message must be a str, a bytes-like object or a Message, '
+                                'not {}'.format(type(message).__name__))
+        fields, _ = _split_msh(message)
+        try:
+            control_id = fields[9]
+        except IndexError:
+            control_id = None
+
+        future = asyncio.get_event_loop().create_future()
+        self._sequence += 1
+        self._pending[self._sequence] = (control_id, future)
+        self._control_ids.setdefault(control_id, collections.deque()).append(self._sequence)
+        self._writer.write(b''.join((MLLPFrameReader.start_block, message.encode(self.encoding),
+                                     MLLPFrameReader.end_block)))
+        try:
+            await self._writer.drain()
+        except BaseException:
+            future.cancel()
+            raise
+        return future
+
+    async def _read_responses(self):
+        frame_reader = MLLPFrameReader(self.max_frame_size)
+        error = ConnectionError('Connection closed by the server')
+        try:
+            while True:
+                data = await self._reader.read(self.recv_buffer_size)
+                if not data:
+                    break
+                for frame in frame_reader.feed(data):
+                    self._dispatch_response(decode_message(frame, self.encoding))
+        except Exception as e:
+            error = e
+        finally:
+            pending, self._pending = self._pending, collections.OrderedDict()
+            self._control_ids = {}
+            for _, future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    def _dispatch_response(self, response):
+        if not self._pending:
+            return
+        control_id = _get_acknowledged_control_id(response)
+        try:
+            sequence = self._control_ids[control_id][0]
+        except KeyError:
+            # unknown control id: the server answers in order, so it is the response to the oldest message
+            sequence = next(iter(self._pending))
+        control_id, future = self._pending.pop(sequence)
+        sequences = self._control_ids[control_id]
+        sequences.remove(sequence)
+        if not sequences:
+            del self._control_ids[control_id]
+        if not future.done():
+            future.set_result(response)
+
+
+async def _reply(handler):
+    res = handler.reply()
+    if inspect.isawaitable(res):
+        res = await res
+    return res
+
+
+def _get_acknowledged_control_id(response):
+    try:
+        fields, _ = _split_msh(response)
+    except Exception:
+        return None
+    field_sep = response[3]
+    for segment in response.split('\r'):
+        if segment.startswith('MSA'):
+            msa = segment.split(field_sep)
+            try:
+                return msa[2]
+            except IndexError:
+                return None
+    return None
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Parse and validate streams of ER7-encoded messages using a pool of processes.
+
+>>> from hl7apy.parallel import parse_messages
+>>> msg = 'MSH|^~\\\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|{}|P|2.5\\rEVN||20080115153000\\r' \\
+... 'PID|1||566-554-3423^^^GHH^MR||EVERYMAN^ADAM^A\\rPV1|1|I'
+>>> for res in parse_messages((msg.format(i) for i in range(3)), processes=2, output='er7', validate=True):
+...     print(res.index, res.message.split('\\r')[0].split('|')[9], res.report.is_valid)
+0 0 True
+1 1 True
+2 2 True
+"""
+
+from __future__ import absolute_import
+import collections
+import io
+import itertools
+import multiprocessing
+import pickle
+import sys
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from hl7apy import load_library
+from hl7apy.exceptions import ParserError
+from hl7apy.parser import parse_message
+
+ParseResult = collections.namedtuple("ParseResult", ("index", "message", "report", "error"))
+ParseResult.__doc__ = """
+The result of the parsing of a message.
+
+:param index: the position of the message in the input stream
+:param message: the :class:`Message <hl7apy.core.Message>` instance or its ER7 encoding, according to
+    the ``output`` requested. It is ``None`` if the parsing failed
+:param report: the :class:`ErrorsAndWarnings <hl7apy.validation.ErrorsAndWarnings>` of the validation of
+    the message, or ``None`` if the validation was not requested
+:param error: the exception raised by the parsing or ``None``
+"""
+
+OUTPUTS = ('message', 'er7')
+
+
+class ParallelParser(object):
+    """
+    Parse (and optionally validate) ER7-encoded messages using a pool of processes.
+
+    The messages are sent to the worker processes in chunks of :attr:`chunksize` messages and at most
+    :attr:`max_pending_chunks` chunks are in progress at the same time, so the input can be a generator of
+    any length. Every result is a :class:`ParseResult`.
+
+    With ``output='message'`` the results contain the :class:`Message <hl7apy.core.Message>` instances
+    built by the workers. The references to the HL7 structures are not copied between the processes,
+    but the whole tree of elements is: the parsing with ``lazy=True`` makes the transfer much cheaper.
+    With ``output='er7'`` the results contain just the ER7 encoding of the messages, which is the most
+    compact output when only the validation report is needed.
+
+    :type processes: ``int``
+    :param processes: the number of worker processes. If it is ``None`` the number of CPUs is used
+
+    :type chunksize: ``int``
+    :param chunksize: the number of messages sent to a worker at a time
+
+    :type output: ``str``
+    :param output: ``'message'`` or ``'er7'``
+
+    :type validate: ``bool``
+    :param validate: if ``True`` every message is validated and the result contains the validation report
+
+    :type max_pending_chunks: ``int``
+    :param max_pending_chunks: the maximum number of chunks in progress. If it is ``None`` it is four times
+        the number of processes
+
+    The other parameters are the ones of :func:`parse_message <hl7apy.parser.parse_message>`
+    """
+
+    def __init__(self, processes=None, chunksize=32, output='message', validate=False, validation_level=None,
+                 find_groups=True, message_profile=None, lazy=False, max_pending_chunks=None):
+        if output not in OUTPUTS:
+            raise ValueError('Invalid output {0}: it must be one of {1}'.format(output, OUTPUTS))
+        if chunksize < 1:
+            raise ValueError('chunksize must be greater than 0')
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = chunksize
+        self.output = output
+        self.max_pending_chunks = max_pending_chunks or self.processes * 4
+        options = {'output': output, 'validate': validate, 'validation_level': validation_level,
+                   'find_groups': find_groups, 'message_profile': message_profile, 'lazy': lazy}
+        self._pool = multiprocessing.Pool(self.processes, _init_worker, (options,))
+
+    def parse(self, messages, ordered=True):
+        """
+        Parse the messages in input and return a generator of :class:`ParseResult`
+
+        :param messages: an iterable of ER7-encoded messages
+
+        :type ordered: ``bool``
+        :param ordered: if ``True`` the results are returned in the same order of the messages, otherwise
+            they are returned as soon as they are ready and their :attr:`index` must be used to identify them
+        """
+        chunks = _get_chunks(messages, self.chunksize)
+        if ordered:
+            return self._parse_ordered(chunks)
+        return self._parse_unordered(chunks)
+
+    def close(self):
+        """
+        Wait for the worker processes to complete the pending work and stop them
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        """
+        Stop the worker processes immediately
+        """
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def _parse_ordered(self, chunks):
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(self._pool.apply_async(_parse_chunk, (chunk,)))
+            if len(pending) >= self.max_pending_chunks:
+                for res in _load_results(pending.popleft().get()):
+                    yield res
+        while pending:
+            for res in _load_results(pending.popleft().get()):
+                yield res
+
+    def _parse_unordered(self, chunks):
+        done = Queue()
+        in_progress = 0
+        for chunk in chunks:
+            self._pool.apply_async(_parse_chunk, (chunk,), **_async_callbacks(done.put))
+            in_progress += 1
+            if in_progress >= self.max_pending_chunks:
+                in_progress -= 1
+                for res in _load_results(done.get()):
+                    yield res
+        while in_progress:
+            in_progress -= 1
+            for res in _load_results(done.get()):
+                yield res
+
+
+def parse_messages(messages, processes=None, ordered=True, **kwargs):
+    """
+    Parse the messages in input using a :class:`ParallelParser` and return a generator of :class:`ParseResult`.
+    The worker processes are stopped when all the results have been returned.
+
+    :param messages: an iterable of ER7-encoded messages
+    :param processes: the number of worker processes. If it is ``None`` the number of CPUs is used
+    :param ordered: if ``True`` the results are returned in the same order of the messages
+    :param kwargs: the other parameters of :class:`ParallelParser`
+    """
+    with ParallelParser(processes, **kwargs) as parser:
+        for res in parser.parse(messages, ordered):
+            yield res
+
+
+def _async_callbacks(callback):
+    # the errors must be sent to the callback too, otherwise the consumer of the results waits forever
+    # (Python 2 has no error_callback)
+    if sys.version_info[0] < 3:
+        return {'callback': callback}
+    return {'callback': callback, 'error_callback': callback}
+
+
+def _get_chunks(messages, chunksize):
+    messages = enumerate(messages)
+    while True:
+        chunk = list(itertools.islice(messages, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+_worker_options = {}
+
+
+def _init_worker(options):
+    _worker_options.update(options)
+
+
+def _parse_chunk(chunk):
+    options = _worker_options
+    results = []
+    for index, text in chunk:
+        # every step that can fail for a message (the encoding and the pickling of the result too) is done
+        # here, so that the error is reported in the result of that message and the others are not lost
+        try:
+            m = parse_message(text, validation_level=options['validation_level'],
+                              find_groups=options['find_groups'], message_profile=options['message_profile'],
+                              lazy=options['lazy'])
+            report = m.validate(return_errors=True) if options['validate'] else None
+            if options['output'] == 'er7':
+                results.append(ParseResult(index, m.to_er7(), report, None))
+            else:
+                _get_reference_ids(m.version)
+                f = io.BytesIO()
+                _ReferencePickler(f, pickle.HIGHEST_PROTOCOL).dump(ParseResult(index, m, report, None))
+                results.append(f.getvalue())
+        except Exception as e:
+            results.append(ParseResult(index, None, None, _get_picklable_error(e)))
+    return results
+
+
+def _load_results(results):
+    if isinstance(results, Exception):
+        # the chunk couldn't be sent to the workers or its results couldn't be sent back
+        raise results
+    return [_ReferenceUnpickler(io.BytesIO(r)).load() if isinstance(r, bytes) else r for r in results]
+
+
+def _get_picklable_error(exc):
+    try:
+        pickle.loads(pickle.dumps(exc))
+    except Exception:
+        return ParserError('{0}: {1}'.format(exc.__class__.__name__, exc))
+    return exc
+
+
+# id of the reference tuples of the HL7 libraries -> (version, element type, name)
+_reference_ids = {}
+# version -> {(element type, name): reference}
+_references = {}
+
+
+def _get_reference_ids(version):
+    """
+    Index the references of the library of the given version so that they are pickled by name and not by value
+    """
+    try:
+        return _references[version]
+    except KeyError:
+        pass
+    lib = load_library(version)
+    references = {}
+    for element_type, elements in lib.ELEMENTS.items():
+        for name, ref in elements.items():
+            if isinstance(ref, tuple):
+                _reference_ids.setdefault(id(ref), (version, element_type, name))
+                references[(element_type, name)] = ref
+    _references[version] = references
+    return references
+
+
+class _ReferencePickler(pickle.Pickler):
+
+    def persistent_id(self, obj):
+        if type(obj) is tuple:
+            return _reference_ids.get(id(obj))
+        return None
+
+
+class _ReferenceUnpickler(pickle.Unpickler):
+
+    def persistent_load(self, pid):
+        version, element_type, name = pid
+        return _get_reference_ids(version)[(element_type, name)]
@@ -20,13 +20,18 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from __future__ import absolute_import
+import codecs
 import re
+import threading
+from collections import namedtuple, OrderedDict
 
 from hl7apy import get_default_encoding_chars, get_default_version, \
-    get_default_validation_level, check_version, check_encoding_chars, check_validation_level
-from hl7apy.consts import N_SEPS, N_SEPS_27
-from hl7apy.core import is_base_datatype, Message, Group, Segment, Field, Component, SubComponent, ElementFinder
+    get_default_validation_level, check_version, check_encoding_chars, check_validation_level, instrumentation
+from hl7apy.consts import N_SEPS, N_SEPS_27, CHARSETS
+from hl7apy.core import is_base_datatype, Message, Group, Segment, Field, Component, SubComponent, ElementFinder, \
+    SupportLazyParsing
 from hl7apy.exceptions import InvalidName, ParserError, InvalidEncodingChars, MessageProfileNotFound
+from hl7apy.utils import iteritems
 from hl7apy.validation import Validator
 
 try:
@@ -36,12 +41,13 @@ except NameError:
 
 
 def parse_message(message, validation_level=None, find_groups=True, message_profile=None, report_file=None,
-                  force_validation=False):
+                  force_validation=False, lazy=False, keep_er7=False):
     """
     Parse the given ER7-encoded message and return an instance of :class:`Message <hl7apy.core.Message>`.
 
-    :type message: ``str``
-    :param message: the ER7-encoded message to be parsed
+    :type message: ``str``, ``bytes``, ``bytearray`` or ``memoryview``
+    :param message: the ER7-encoded message to be parsed. Bytes are decoded according to the character set
+        in MSH-18 (see :func:`decode_message`)
 
     :type validation_level: ``int``
     :param validation_level: the validation level. Possible values are those defined in
@@ -56,6 +62,17 @@ def parse_message(message, validation_level=None, find_groups=True, message_prof
     :type force_validation: ``bool``
     :type force_validation: if ``True``, automatically forces the message validation after the end of the parsing
 
+    :type lazy: ``bool``
+    :param lazy: if ``True``, the segments keep their ER7 text and their fields, components and subcomponents
+        are parsed only when they are first accessed. A segment or a field that has never been accessed is
+        encoded back to its original text
+
+    :type keep_er7: ``bool``
+    :param keep_er7: if ``True``, the segments and the fields keep their ER7 text, which is returned by
+        their ``to_er7()`` until they or one of their children are changed. So, when a message is encoded
+        again, only the changed segments and fields are serialized from their children, while the others are
+        encoded back to exactly their original text
+
     :return: an instance of :class:`Message <hl7apy.core.Message>`
 
     >>> message = "MSH|^~\\&|GHH_ADT||||20080115153000||OML^O33^OML_O33|0123456789|P|2.5||||AL\\rPID|1||" \
@@ -67,7 +84,23 @@ def parse_message(message, validation_level=None, find_groups=True, message_prof
     GHH_ADT
     >>> print(m.children)
     [<Segment MSH>, <Group OML_O33_PATIENT>]
+    >>> m = parse_message(message, lazy=True)
+    >>> print(m.oml_o33_patient.pid.is_lazy())
+    True
+    >>> print(m.oml_o33_patient.pid.pid_5.xpn_2.to_er7())
+    ADAM
+    >>> m = parse_message(message, keep_er7=True)
+    >>> m.msh.msh_5 = 'GHH_OUT'
+    >>> print(m.msh.to_er7())
+    MSH|^~\\&|GHH_ADT||GHH_OUT||20080115153000||OML^O33^OML_O33|0123456789|P|2.5||||AL
+    >>> print(m.oml_o33_patient.pid.has_original_er7())
+    True
     """
+    sink = instrumentation._sink
+    if sink is not None:
+        start = instrumentation._timer()
+    if isinstance(message, _BYTES_TYPES):
+        message = decode_message(message)
     message = message.lstrip()
     encoding_chars, message_structure, version = get_message_info(message)
     validation_level = _get_validation_level(validation_level)
@@ -85,9 +118,11 @@ def parse_message(message, validation_level=None, find_groups=True, message_prof
                     encoding_chars=encoding_chars)
 
     try:
-        children = parse_segments(message, m.version, encoding_chars, validation_level, m.reference, find_groups)
+        children = parse_segments(message, m.version, encoding_chars, validation_level, m.reference, find_groups,
+                                  lazy=lazy, keep_er7=keep_er7)
     except AttributeError:  # m.reference can raise i
-        children = parse_segments(message, m.version, encoding_chars, validation_level, find_groups=False)
+        children = parse_segments(message, m.version, encoding_chars, validation_level, find_groups=False,
+                                  lazy=lazy, keep_er7=keep_er7)
 
     m.children = children
 
@@ -97,10 +132,101 @@ def parse_message(message, validation_level=None, find_groups=True, message_prof
         else:
             Validator.validate(m, message_profile[message_structure], report_file=report_file)
 
+    if sink is not None:
+        sink.record('parse_message', m.name, instrumentation._timer() - start)
+        sink.record_elements(m.name, _count_elements(m))
     return m
 
 
-def parse_segments(text, version=None, encoding_chars=None, validation_level=None, references=None, find_groups=False):
+def parse_batch(source, validation_level=None, find_groups=True, message_profile=None, report_file=None,
+                force_validation=False, lazy=False, encoding='utf-8', chunk_size=64 * 1024, keep_er7=False):
+    """
+    Parse a stream of ER7-encoded messages, optionally wrapped in batch (``BHS``/``BTS``) and file
+    (``FHS``/``FTS``) envelopes, and yield an instance of :class:`Message <hl7apy.core.Message>` for every
+    message found. The source is read incrementally, so the memory used is bounded by the size of the
+    largest message and not by the size of the whole stream.
+
+    Segments can be separated by ``\\r``, ``\\n`` or ``\\r\\n``, and the blank ones are skipped. When a ``BTS`` or an
+    ``FTS`` segment is found, its message count (``BTS-1``) or batch count (``FTS-1``), if present, is checked
+    against the messages or batches actually read.
+
+    :param source: a file-like object with a ``read()`` method (e.g., a file opened in text or binary mode
+        or an :class:`mmap.mmap`) that returns ``str`` or bytes-like objects (``bytes``, ``bytearray`` or
+        ``memoryview``), or a ``str`` or bytes-like object with the whole content
+
+    :type encoding: ``str``
+    :param encoding: the encoding used to decode the source, when it returns ``bytes``
+
+    :type chunk_size: ``int``
+    :param chunk_size: the number of bytes or characters read from the source at a time
+
+    The other parameters are the ones of :func:`parse_message`, and they are used for every message.
+
+    :return: a generator of :class:`Message <hl7apy.core.Message>` instances
+    :raises: :exc:`ParserError <hl7apy.exceptions.ParserError>` if the envelope is not well formed or the
+        counts in the trailers don't match
+
+    >>> batch = "FHS|^~\\&|GHH\\rBHS|^~\\&|GHH\\r" \
+    "MSH|^~\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|1|P|2.5\\rPID|1||566-554-3423^^^GHH^MR\\r" \
+    "MSH|^~\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|2|P|2.5\\rPID|1||123-456-789^^^GHH^MR\\r" \
+    "BTS|2\\rFTS|1\\r"
+    >>> for m in parse_batch(batch):
+    ...     print(m.msh.msh_10.to_er7())
+    1
+    2
+    """
+    kwargs = {'validation_level': validation_level, 'find_groups': find_groups,
+              'message_profile': message_profile, 'report_file': report_file,
+              'force_validation': force_validation, 'lazy': lazy, 'keep_er7': keep_er7}
+
+    batches_count = None  # number of batches in the current file, None outside an FHS envelope
+    messages_count = None  # number of messages in the current batch, None outside a BHS envelope
+    message_segments = []
+    for segment in _iter_segments(source, encoding, chunk_size):
+        segment_name = segment[:3]
+        if segment_name == 'MSH':
+            if message_segments:
+                yield parse_message('\r'.join(message_segments), **kwargs)
+            message_segments = [segment]
+            if messages_count is not None:
+                messages_count += 1
+        elif segment_name in _BATCH_SEGMENTS:
+            if message_segments:
+                yield parse_message('\r'.join(message_segments), **kwargs)
+                message_segments = []
+            if segment_name == 'FHS':
+                if batches_count is not None:
+                    raise ParserError('Found FHS segment before the end of the previous file')
+                batches_count = 0
+            elif segment_name == 'BHS':
+                if messages_count is not None:
+                    raise ParserError('Found BHS segment before the end of the previous batch')
+                messages_count = 0
+                if batches_count is not None:
+                    batches_count += 1
+            elif segment_name == 'BTS':
+                if messages_count is None:
+                    raise ParserError('Found BTS segment without a BHS segment')
+                _check_batch_count(segment, messages_count, 'BTS-1')
+                messages_count = None
+            else:
+                if batches_count is None:
+                    raise ParserError('Found FTS segment without an FHS segment')
+                if messages_count is not None:
+                    raise ParserError('Found FTS segment before the end of the batch')
+                _check_batch_count(segment, batches_count, 'FTS-1')
+                batches_count = None
+        elif message_segments:
+            message_segments.append(segment)
+        else:
+            raise ParserError('Found segment {0} outside a message'.format(segment_name))
+
+    if message_segments:
+        yield parse_message('\r'.join(message_segments), **kwargs)
+
+
+def parse_segments(text, version=None, encoding_chars=None, validation_level=None, references=None, find_groups=False,
+                   lazy=False, keep_er7=False):
     """
     Parse the given ER7-encoded segments and return a list of :class:`hl7apy.core.Segment` instances.
 
@@ -128,6 +254,13 @@ def parse_segments(text, version=None, encoding_chars=None, validation_level=Non
         :class:`Groups <hl7apy.core.Group>` instances. If ``False``, the segments found are assigned as
         children of the :class:`Message <hl7apy.core.Message>` instance
 
+    :type lazy: ``bool``
+    :param lazy: if ``True``, the fields of the segments are parsed only when they are first accessed
+
+    :type keep_er7: ``bool``
+    :param keep_er7: if ``True``, the segments and their fields keep their ER7 text until they are changed
+        (see :func:`parse_message`)
+
     :return: a list of :class:`Segment <hl7apy.core.Segment>` instances
 
     >>> segments = "EVN||20080115153000||||20080114003000\\rPID|1||566-554-3423^^^GHH^MR||EVERYMAN^ADAM^A|||M|||" \
@@ -135,6 +268,9 @@ def parse_segments(text, version=None, encoding_chars=None, validation_level=Non
     >>> print(parse_segments(segments))
     [<Segment EVN>, <Segment PID>]
     """
+    sink = instrumentation._sink
+    if sink is not None:
+        start = instrumentation._timer()
     version = _get_version(version)
     encoding_chars = _get_encoding_chars(encoding_chars, version)
     validation_level = _get_validation_level(validation_level)
@@ -142,60 +278,67 @@ def parse_segments(text, version=None, encoding_chars=None, validation_level=Non
     segment_sep = encoding_chars['SEGMENT']
     segments = []
 
+    if not find_groups:
+        segments = [parse_segment(s.strip(), version, encoding_chars, validation_level, lazy=lazy, keep_er7=keep_er7)
+                    for s in text.split(segment_sep) if len(s) > 0]
+        if sink is not None:
+            sink.record('parse_segments', None, instrumentation._timer() - start)
+        return segments
+
+    # stack of the (name, reference) of the groups from the message down to the current group
     parents_refs = [(None, references)]
     current_parent = None
     for s in text.split(segment_sep):
         if len(s) > 0:
             segment_name = s[:3]
-            for x in xrange(len(parents_refs)):
-                if not find_groups:
-                    segment = parse_segment(s.strip(), version, encoding_chars, validation_level)
-                    segments.append(segment)
-                else:
-                    ref, parents_refs = _get_segment_reference(segment_name, parents_refs)
-                    if ref is None:
-                        # group not found at the current level, go back to the previous level
-                        if current_parent is not None:
-                            parents_refs.pop()
-                            current_parent = current_parent.parent
-                    else:
-                        if current_parent is None and parents_refs[-1][0] is not None or \
-                                current_parent is not None and parents_refs[-1][0] != current_parent.name:
-                            # create the parents group of the segment
-                            if current_parent is not None:
-                                cur_idx = parents_refs.index((current_parent.name, current_parent.reference))
-                            else:
-                                cur_idx = parents_refs.index((None, references))
-                            for p_ref in parents_refs[cur_idx + 1:]:
-                                group = Group(p_ref[0], version=version, reference=p_ref[1],
-                                              validation_level=validation_level)
-                                if current_parent is None:
-                                    segments.append(group)
-                                else:
-                                    current_parent.add(group)
-                                current_parent = group
-                        elif current_parent is not None and segment_name in [c.name for c in current_parent.children] \
-                                and current_parent.repetitions[segment_name][1] == 1:
-                            # The number of instances allowed is reached so we create another instance of the same
-                            group = Group(current_parent.name, version=version, reference=current_parent.reference,
-                                          validation_level=validation_level)
-
-                            if current_parent.parent is None:
-                                segments.append(group)
-                            else:
-                                current_parent.parent.add(group)
-                            current_parent = group
-
-                        segment = parse_segment(s.strip(), version, encoding_chars, validation_level, ref)
+            while True:
+                try:
+                    groups_path, ref = _get_segment_paths(parents_refs[-1][1])[segment_name]
+                except KeyError:
+                    if current_parent is None:
+                        # the segment is not allowed in the message structure
+                        break
+                    # group not found at the current level, go back to the previous level
+                    parents_refs.pop()
+                    current_parent = current_parent.parent
+                    continue
+
+                if groups_path:
+                    # create the parents group of the segment
+                    for p_ref in groups_path:
+                        group = Group(p_ref[0], version=version, reference=p_ref[1],
+                                      validation_level=validation_level)
                         if current_parent is None:
-                            segments.append(segment)
+                            segments.append(group)
                         else:
-                            current_parent.add(segment)
-                        break
+                            current_parent.add(group)
+                        current_parent = group
+                    parents_refs.extend(groups_path)
+                elif current_parent is not None and current_parent.children.indexes.get(segment_name) \
+                        and current_parent.repetitions[segment_name][1] == 1:
+                    # The number of instances allowed is reached so we create another instance of the same
+                    group = Group(current_parent.name, version=version, reference=current_parent.reference,
+                                  validation_level=validation_level)
+
+                    if current_parent.parent is None:
+                        segments.append(group)
+                    else:
+                        current_parent.parent.add(group)
+                    current_parent = group
+
+                segment = parse_segment(s.strip(), version, encoding_chars, validation_level, ref, lazy, keep_er7)
+                if current_parent is None:
+                    segments.append(segment)
+                else:
+                    current_parent.add(segment)
+                break
+    if sink is not None:
+        sink.record('parse_segments', None, instrumentation._timer() - start)
     return segments
 
 
-def parse_segment(text, version=None, encoding_chars=None, validation_level=None, reference=None):
+def parse_segment(text, version=None, encoding_chars=None, validation_level=None, reference=None, lazy=False,
+                  keep_er7=False):
     """
     Parse the given ER7-encoded segment and return an instance of :class:`Segment <hl7apy.core.Segment>`.
 
@@ -220,7 +363,16 @@ def parse_segment(text, version=None, encoding_chars=None, validation_level=None
         :func:`load_reference <hl7apy.load_reference>`, :func:`find_reference <hl7apy.find_reference>` or
         belonging to a message profile
 
-    :return: an instance of :class:`Segment <hl7apy.core.Segment>`
+    :type lazy: ``bool``
+    :param lazy: if ``True``, the fields of the segment are parsed only when they are first accessed
+
+    :type keep_er7: ``bool``
+    :param keep_er7: if ``True``, the segment and its fields keep their ER7 text until they are changed
+        (see :func:`parse_message`)
+
+    :return: an instance of :class:`Segment <hl7apy.core.Segment>`. If the segments cache is enabled
+        (see :func:`set_segment_cache_size`) and the same text has already been parsed, it is a copy of the
+        segment parsed before
 
     >>> segment = "EVN||20080115153000||||20080114003000"
     >>> s =  parse_segment(segment)
@@ -229,21 +381,158 @@ def parse_segment(text, version=None, encoding_chars=None, validation_level=None
     >>> print(s.to_er7())
     EVN||20080115153000||||20080114003000
     """
+    sink = instrumentation._sink
+    if sink is not None:
+        start = instrumentation._timer()
     version = _get_version(version)
     encoding_chars = _get_encoding_chars(encoding_chars, version)
     validation_level = _get_validation_level(validation_level)
 
+    if _segment_cache_maxsize > 0 and not lazy:
+        key = (version, validation_level, id(reference), tuple(sorted(iteritems(encoding_chars))), keep_er7, text)
+        segment = _get_cached_segment(key, reference)
+        if segment is None:
+            segment = _parse_segment(text, version, encoding_chars, validation_level, reference, lazy, keep_er7)
+            _cache_segment(key, reference, segment)
+        # the cached segment is never returned, so it can't be changed
+        segment = segment._copy_on_access()
+    else:
+        segment = _parse_segment(text, version, encoding_chars, validation_level, reference, lazy, keep_er7)
+    if sink is not None:
+        sink.record('parse_segment', segment.name, instrumentation._timer() - start)
+    return segment
+
+
+def _parse_segment(text, version, encoding_chars, validation_level, reference, lazy, keep_er7):
     segment_name = text[:3]
-    text = text[4:] if segment_name != 'MSH' else text[3:]
     segment = Segment(segment_name, version=version, validation_level=validation_level,
                       reference=reference)
-    segment.children = parse_fields(text, segment_name, version, encoding_chars, validation_level,
-                                    segment.structure_by_name, segment.allow_infinite_children)
+    if lazy:
+        segment.set_lazy_children(text, encoding_chars, keep_er7=keep_er7)
+    else:
+        fields_text = text[4:] if segment_name != 'MSH' else text[3:]
+        segment.children = parse_fields(fields_text, segment_name, version, encoding_chars, validation_level,
+                                        segment.structure_by_name, segment.allow_infinite_children,
+                                        keep_er7=keep_er7)
+        if keep_er7:
+            segment.set_original_er7(text, encoding_chars)
     return segment
 
 
+SegmentCacheInfo = namedtuple('SegmentCacheInfo',
+                              ('hits', 'misses', 'evictions', 'maxsize', 'currsize', 'elements'))
+
+# (version, validation level, id of the reference, encoding chars, keep_er7, text) -> (reference, segment, elements)
+_segment_cache = OrderedDict()
+_segment_cache_lock = threading.Lock()
+_segment_cache_maxsize = 0
+_segment_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'elements': 0}
+
+
+def set_segment_cache_size(maxsize):
+    """
+    Set the maximum number of parsed segments kept in cache by :func:`parse_segment` (and so by
+    :func:`parse_message`). The cache is disabled by default: it is useful for the feeds that repeat the same
+    segments over and over (e.g. the same ``EVN``, ``NTE`` or ``ORC`` segments).
+
+    When the cache is enabled, a segment whose text has already been parsed (with the same version, validation
+    level, reference and encoding chars) is not parsed again: the parser returns a copy of the cached segment,
+    whose fields are copied only when they are first accessed. The least recently used segments are removed
+    when the cache is full. Changing the size empties the cache and resets its statistics.
+
+    :type maxsize: ``int``
+    :param maxsize: the maximum number of segments kept in cache, ``0`` to disable the cache
+
+    >>> from hl7apy import DEFAULT_ENCODING_CHARS
+    >>> set_segment_cache_size(128)
+    >>> s1 = parse_segment('NTE|1||SPECIMEN RECEIVED', encoding_chars=DEFAULT_ENCODING_CHARS)
+    >>> s2 = parse_segment('NTE|1||SPECIMEN RECEIVED', encoding_chars=DEFAULT_ENCODING_CHARS)
+    >>> print(s1 is s2)
+    False
+    >>> print(segment_cache_info().hits)
+    1
+    >>> set_segment_cache_size(0)
+    """
+    global _segment_cache_maxsize
+    with _segment_cache_lock:
+        _segment_cache_maxsize = maxsize
+        _clear_segment_cache()
+
+
+def segment_cache_info():
+    """
+    Return the statistics of the segments cache (see :func:`set_segment_cache_size`)
+
+    :return: a :class:`SegmentCacheInfo` namedtuple with the ``hits``, ``misses`` and ``evictions`` of the
+        cache, its ``maxsize`` and ``currsize``, and the number of ``elements`` (segments, fields, components and
+        subcomponents) of the cached segments, that gives an estimate of the memory they use
+    """
+    with _segment_cache_lock:
+        return SegmentCacheInfo(_segment_cache_stats['hits'], _segment_cache_stats['misses'],
+                                _segment_cache_stats['evictions'], _segment_cache_maxsize, len(_segment_cache),
+                                _segment_cache_stats['elements'])
+
+
+def segment_cache_clear():
+    """
+    Remove all the segments from the cache and reset its statistics
+    """
+    with _segment_cache_lock:
+        _clear_segment_cache()
+
+
+def _clear_segment_cache():
+    _segment_cache.clear()
+    for stat in _segment_cache_stats:
+        _segment_cache_stats[stat] = 0
+
+
+def _get_cached_segment(key, reference):
+    with _segment_cache_lock:
+        try:
+            entry = _segment_cache[key]
+        except KeyError:
+            _segment_cache_stats['misses'] += 1
+            return None
+        # the entry keeps the reference alive, so its id can't be reused by another object
+        if entry[0] is not reference:
+            _segment_cache_stats['misses'] += 1
+            return None
+        # the segment is moved to the end of the cache, as the most recently used
+        _segment_cache[key] = _segment_cache.pop(key)
+        _segment_cache_stats['hits'] += 1
+        return entry[1]
+
+
+def _cache_segment(key, reference, segment):
+    elements = _count_elements(segment)
+    with _segment_cache_lock:
+        if _segment_cache_maxsize <= 0:
+            return
+        old_entry = _segment_cache.pop(key, None)
+        if old_entry is not None:
+            _segment_cache_stats['elements'] -= old_entry[2]
+        _segment_cache[key] = (reference, segment, elements)
+        _segment_cache_stats['elements'] += elements
+        while len(_segment_cache) > _segment_cache_maxsize:
+            _segment_cache_stats['elements'] -= _segment_cache.popitem(last=False)[1][2]
+            _segment_cache_stats['evictions'] += 1
+
+
+def _count_elements(element):
+    # only the elements already parsed are counted: accessing the children of a lazy element would parse them
+    # (or copy them, for the segments taken from the cache)
+    if isinstance(element, SupportLazyParsing):
+        if element._lazy_er7 is not None:
+            return 1
+        children = element._children
+    else:
+        children = element.children
+    return 1 + sum(_count_elements(c) for c in children.list)
+
+
 def parse_fields(text, name_prefix=None, version=None, encoding_chars=None, validation_level=None,
-                 references=None, force_varies=False):
+                 references=None, force_varies=False, lazy=False, keep_er7=False):
     """
     Parse the given ER7-encoded fields and return a list of :class:`hl7apy.core.Field`.
 
@@ -273,6 +562,13 @@ def parse_fields(text, name_prefix=None, version=None, encoding_chars=None, vali
     :param force_varies: flag that force the fields to use a varies structure when no reference is found.
         It is used when a segment ends with a field of type varies that thus support infinite children
 
+    :type lazy: ``bool``
+    :param lazy: if ``True``, the components of the fields are parsed only when they are first accessed
+
+    :type keep_er7: ``bool``
+    :param keep_er7: if ``True``, the fields keep their ER7 text until they are changed
+        (see :func:`parse_message`)
+
     :return: a list of :class:`Field <hl7apy.core.Field>` instances
 
     >>> fields = "1|NUCLEAR^NELDA^W|SPO|2222 HOME STREET^^ANN ARBOR^MI^^USA"
@@ -289,6 +585,9 @@ def parse_fields(text, name_prefix=None, version=None, encoding_chars=None, vali
     >>> print(s.to_er7())
     NK1||||||||||||||||||||||||||||||||||||||||1|NUCLEAR^NELDA^W|SPO|2222 HOME STREET^^ANN ARBOR^MI^^USA
     """
+    sink = instrumentation._sink
+    if sink is not None:
+        start = instrumentation._timer()
     version = _get_version(version)
     encoding_chars = _get_encoding_chars(encoding_chars, version)
     validation_level = _get_validation_level(validation_level)
@@ -308,19 +607,21 @@ def parse_fields(text, name_prefix=None, version=None, encoding_chars=None, vali
         if field.strip() or name is None:
             if name == 'MSH_2':
                 fields.append(parse_field(field, name, version, encoding_chars, validation_level,
-                                          reference))
+                                          reference, keep_er7=keep_er7))
             else:
                 for rep in field.split(repetition_sep):
                     fields.append(parse_field(rep, name, version, encoding_chars, validation_level,
-                                              reference, force_varies))
+                                              reference, force_varies, lazy, keep_er7))
         elif name == "MSH_1":
             fields.append(parse_field(field_sep, name, version, encoding_chars, validation_level,
-                                      reference))
+                                      reference, keep_er7=keep_er7))
+    if sink is not None:
+        sink.record('parse_fields', name_prefix, instrumentation._timer() - start)
     return fields
 
 
 def parse_field(text, name=None, version=None, encoding_chars=None, validation_level=None,
-                reference=None, force_varies=False):
+                reference=None, force_varies=False, lazy=False, keep_er7=False):
     """
     Parse the given ER7-encoded field and return an instance of :class:`Field <hl7apy.core.Field>`.
 
@@ -352,6 +653,12 @@ def parse_field(text, name=None, version=None, encoding_chars=None, validation_l
     :param force_varies: flag that force the fields to use a varies structure when no reference is found.
         It is used when a segment ends with a field of type varies that thus support infinite children
 
+    :type lazy: ``bool``
+    :param lazy: if ``True``, the components of the field are parsed only when they are first accessed
+
+    :type keep_er7: ``bool``
+    :param keep_er7: if ``True``, the field keeps its ER7 text until it is changed (see :func:`parse_message`)
+
     :return: an instance of :class:`Field <hl7apy.core.Field>`
 
     >>> field = "NUCLEAR^NELDA^W"
@@ -384,6 +691,13 @@ def parse_field(text, name=None, version=None, encoding_chars=None, validation_l
         c = Component(datatype='ST', validation_level=validation_level, version=version)
         c.add(s)
         field.add(c)
+    elif lazy:
+        datatype = field.datatype
+        # a base datatype field with more than one component becomes unknown (see below)
+        if Validator.is_tolerant(validation_level) and is_base_datatype(datatype, version) and \
+                encoding_chars['COMPONENT'] in text:
+            field.datatype = None
+        field.set_lazy_children(text, encoding_chars, datatype=datatype, keep_er7=keep_er7)
     else:
         children = parse_components(text, field.datatype, version, encoding_chars, validation_level,
                                     field.structure_by_name)
@@ -391,6 +705,8 @@ def parse_field(text, name=None, version=None, encoding_chars=None, validation_l
                 len(children) > 1:
             field.datatype = None
         field.children = children
+    if keep_er7 and not lazy:
+        field.set_original_er7(text, encoding_chars)
     return field
 
 
@@ -434,14 +750,18 @@ def parse_components(text, field_datatype='ST', version=None, encoding_chars=Non
     [<Component ST (None) of type ST>, <Component ST (None) of type ST>, <Component ST (None) of type ST>, \
 <Component ST (None) of type ST>, <Component ST (None) of type ST>]
     """
+    sink = instrumentation._sink
+    if sink is not None:
+        start = instrumentation._timer()
     version = _get_version(version)
     encoding_chars = _get_encoding_chars(encoding_chars, version)
     validation_level = _get_validation_level(validation_level)
 
     component_sep = encoding_chars['COMPONENT']
+    base_datatype = is_base_datatype(field_datatype, version)
     components = []
     for index, component in enumerate(text.split(component_sep)):
-        if is_base_datatype(field_datatype, version):
+        if base_datatype:
             component_datatype = field_datatype
             component_name = None
         elif field_datatype is None or field_datatype == 'varies':
@@ -460,6 +780,8 @@ def parse_components(text, field_datatype='ST', version=None, encoding_chars=Non
         if component.strip() or component_name is None or component_name.startswith("VARIES_"):
             components.append(parse_component(component, component_name, component_datatype,
                                               version, encoding_chars, validation_level, reference))
+    if sink is not None:
+        sink.record('parse_components', field_datatype, instrumentation._timer() - start)
     return components
 
 
@@ -578,9 +900,10 @@ def parse_subcomponents(text, component_datatype='ST', version=None, encoding_ch
     validation_level = _get_validation_level(validation_level)
 
     subcomp_sep = encoding_chars['SUBCOMPONENT']
+    base_datatype = component_datatype is None or is_base_datatype(component_datatype, version)
     subcomponents = []
     for index, subcomponent in enumerate(text.split(subcomp_sep)):
-        if is_base_datatype(component_datatype, version) or component_datatype is None:
+        if base_datatype:
             subcomponent_name = None
             subcomponent_datatype = component_datatype if component_datatype is not None else 'ST'
         else:
@@ -633,6 +956,59 @@ def parse_subcomponent(text, name=None, datatype='ST', version=None, validation_
                         validation_level=validation_level, reference=reference)
 
 
+def decode_message(message, encoding='utf-8'):
+    """
+    Decode an ER7-encoded message received as bytes, using the character set specified in its MSH-18 field
+    (see :attr:`CHARSETS <hl7apy.consts.CHARSETS>`). Only the MSH segment is read before decoding, and the
+    whole message is decoded once. The codecs are looked up only the first time a character set is found
+
+    :type message: ``bytes``, ``bytearray`` or ``memoryview``
+    :param message: the ER7-encoded message
+
+    :type encoding: ``str``
+    :param encoding: the encoding used when MSH-18 is empty or contains an unknown character set, or when the
+        message doesn't start with a MSH segment
+
+    :rtype: ``str``
+    :return: the decoded message
+
+    >>> msg = b'MSH|^~\\\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|1|P|2.5||||||8859/1\\rPID|1||||M\\xdcLLER'
+    >>> decode_message(msg).endswith(u'M\\xdcLLER')
+    True
+    >>> decode_message(msg.replace(b'8859/1', b'UNICODE UTF-8'), 'latin-1')  # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ...
+    UnicodeDecodeError: 'utf-8' codec can't decode byte 0xdc in position 72: invalid continuation byte
+    """
+    decode = None
+    m = _MSH_BYTES_REGEX.match(message)
+    if m is not None:
+        # the fields of the MSH segment, from MSH-2
+        fields = m.group(2).split(m.group(1))
+        if len(fields) > 16:
+            charset = fields[16]
+            rep_sep = fields[0][1:2]
+            if rep_sep:
+                # the first repetition is the character set of the message
+                charset = charset.split(rep_sep, 1)[0]
+            decode = _get_charset_decoder(charset)
+    if decode is None:
+        decode = codecs.lookup(encoding).decode
+    return decode(message)[0]
+
+
+def _get_charset_decoder(charset):
+    # the cache is keyed on the codec names of CHARSETS, so the MSH-18 values received can't make it grow
+    name = CHARSETS.get(charset.strip().decode('ascii', 'replace').upper())
+    if name is None:
+        return None
+    try:
+        return _charset_decoders[name]
+    except KeyError:
+        decoder = _charset_decoders[name] = codecs.lookup(name).decode
+        return decoder
+
+
 def _split_msh(content):
     m = re.match(r"^MSH(?P<field_sep>\S)", content)
     if m is not None:  # if the regular expression matches, it is an HL7 message
@@ -717,25 +1093,117 @@ def get_message_info(content):
     return encoding_chars, message_structure, version
 
 
-def _get_segment_reference(segment_name, parents_ref):
-    ref = None
+_BYTES_TYPES = (bytearray, memoryview) if bytes is str else (bytes, bytearray, memoryview)
+
+#: the field separator and the text of the MSH segment at the beginning of a message encoded as bytes
+_MSH_BYTES_REGEX = re.compile(br'\s*MSH((?!\r).)([^\r]*)', re.DOTALL)
+
+# codec name (see CHARSETS) -> decode function of the codec
+_charset_decoders = {}
+
+_BATCH_SEGMENTS = frozenset(('FHS', 'FTS', 'BHS', 'BTS'))
+
+_SEGMENT_SEPARATORS = re.compile(r'[\r\n]+')
+
+# the number at the beginning of the count field of a batch trailer, optionally followed by other components
+_BATCH_COUNT_REGEX = re.compile(r'\s*(\d+)\s*(?:\W|$)')
+
+
+def _iter_segments(source, encoding, chunk_size):
+    """
+    Yield the segments read from the source, stripped and skipping the blank ones like
+    :func:`parse_segments` does, decoding them if the source returns bytes-like objects
+    """
+    if isinstance(source, (str, type(u'')) + _BYTES_TYPES):
+        chunks = [source]
+    else:
+        chunks = iter(lambda: source.read(chunk_size), source.read(0))
+
+    decoder = None
+    # the chunks of the last segment, which are joined only when its end is found: a segment longer than
+    # the chunks is not copied again for every chunk
+    pending = []
+    for chunk in chunks:
+        if isinstance(chunk, _BYTES_TYPES):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(encoding)()
+            chunk = decoder.decode(chunk)
+        segments = _SEGMENT_SEPARATORS.split(chunk)
+        if len(segments) == 1:
+            pending.append(chunk)
+            continue
+        if pending:
+            pending.append(segments[0])
+            segments[0] = ''.join(pending)
+        pending = [segments.pop()]
+        for segment in segments:
+            segment = segment.strip()
+            if segment:
+                yield segment
+    if decoder is not None:
+        pending.append(decoder.decode(b'', True))
+    last = ''.join(pending).strip()
+    if last:
+        yield last
+
+
+def _check_batch_count(segment, count, field_name):
+    try:
+        value = segment.split(segment[3])[1]
+    except IndexError:
+        return
+    # the count is compared as a number (e.g. 05), and the values that are not numbers are ignored
+    m = _BATCH_COUNT_REGEX.match(value)
+    if m is not None and int(m.group(1)) != count:
+        raise ParserError('{0} is {1} but {2} were found'.format(field_name, value.strip(), count))
+
+
+# maximum number of group (or message) references whose segment paths are kept
+_SEGMENT_PATHS_MAXSIZE = 1024
+_SEGMENT_PATHS = OrderedDict()
+_segment_paths_lock = threading.Lock()
+
+
+def _get_segment_paths(group_ref):
+    """
+    Return a ``dict`` that maps the name of every segment that can be found inside the group (or message)
+    with the reference in input to a tuple ``(groups_path, segment_reference)``. ``groups_path`` is the
+    tuple of ``(name, reference)`` of the groups, nested in the one in input, to create to reach the segment.
+    When a segment can be found in more than one position, a direct child of the group wins over the
+    segments inside the children groups, which are searched in order and depth-first.
+    The result is computed only once for every reference and kept in a bounded cache, emptied by
+    :meth:`ElementFinder.cache_clear <hl7apy.core.ElementFinder.cache_clear>`.
+    """
+    try:
+        ref, paths = _SEGMENT_PATHS[id(group_ref)]
+    except KeyError:
+        pass
+    else:
+        if ref is group_ref:
+            return paths
+
+    paths = {}
     groups = []
-    p_ref = parents_ref[-1][1]
-    for c in p_ref[1]:
-        if c[3] == "SEG" and c[0] == segment_name:
-            ref = c[1]
-            break
+    for c in group_ref[1]:
+        if c[3] == "SEG":
+            paths.setdefault(c[0], ((), c[1]))
         elif c[3] == "GRP":
             groups.append(c)
-    else:
-        for g in groups:
-            parents_ref.append((g[0], g[1]))
-            ref, parents_ref = _get_segment_reference(segment_name, parents_ref)
-            if ref is not None:
-                break
-            else:
-                parents_ref.pop(-1)
-    return ref, parents_ref
+    for g in groups:
+        for segment_name, (groups_path, ref) in iteritems(_get_segment_paths(g[1])):
+            if segment_name not in paths:
+                paths[segment_name] = (((g[0], g[1]),) + groups_path, ref)
+    # the reference is kept in the cache so that its id can't be reused by another object
+    with _segment_paths_lock:
+        while len(_SEGMENT_PATHS) >= _SEGMENT_PATHS_MAXSIZE:
+            _SEGMENT_PATHS.popitem(last=False)
+        _SEGMENT_PATHS[id(group_ref)] = (group_ref, paths)
+    return paths
+
+
+def _clear_segment_paths():
+    with _segment_paths_lock:
+        _SEGMENT_PATHS.clear()
 
 
 def _get_version(version):
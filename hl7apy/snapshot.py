@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Compact binary snapshots of reference libraries and message profiles.
+
+A snapshot contains one or more named sections (e.g. ``Segment`` or ``Field``), each one mapping element
+names to their references. Strings are stored once and interned when decoded, and identical tuples are
+stored once and referred to by index, so the snapshot of a message profile is much smaller than its pickle.
+
+Snapshots are memory-mapped and the references are decoded only when they are requested: processes that
+load the same snapshot share its pages through the page cache.
+
+>>> import os, tempfile
+>>> from hl7apy import load_library
+>>> path = os.path.join(tempfile.mkdtemp(), 'v2_5.snapshot')
+>>> write_library_snapshot('2.5', path)
+>>> snapshot = load_snapshot(path)
+>>> print(snapshot['Segment']['PID'] == load_library('2.5').ELEMENTS['Segment']['PID'])
+True
+>>> snapshot.close()
+"""
+
+from __future__ import absolute_import
+import mmap
+import struct
+import sys
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from hl7apy import load_library
+from hl7apy.utils import iteritems
+
+try:
+    _intern = sys.intern
+    _string_types = (str,)
+except AttributeError:  # Python 2
+    _intern = intern  # noqa: F821
+    _string_types = (str, unicode)  # noqa: F821
+
+MAGIC = b'HL7APYSN'
+FORMAT_VERSION = 1
+#: name of the section of the snapshots of message profiles
+MESSAGE_PROFILE_SECTION = 'MessageProfile'
+
+# magic, format version, number of strings, offset of the strings offsets, offset of the strings data,
+# number of tuples, offset of the tuples offsets, offset of the tuples items, number of sections,
+# offset of the sections
+_HEADER = struct.Struct('<8s9I')
+# name, number of entries, offset of the entries
+_SECTION = struct.Struct('<3I')
+# name, value
+_ENTRY = struct.Struct('<Ii')
+
+# every value is a signed 32-bit word: the three lowest bits are the type of the value and the others are
+# the integer itself or the index of the string or of the items of the tuple (or list)
+_NONE, _INT, _STR, _TUPLE, _LIST = range(5)
+_TYPE_BITS = 3
+_TYPE_MASK = 2 ** _TYPE_BITS - 1
+_MAX_INT = 2 ** (31 - _TYPE_BITS)
+
+
+class SnapshotWriter(object):
+    """
+    Encode sections of references and write them as a snapshot
+
+    >>> import io
+    >>> writer = SnapshotWriter()
+    >>> writer.add_section('Table', {'HL70001': ('Administrative Sex', ('F', 'M'))})
+    >>> f = io.BytesIO()
+    >>> writer.write(f)
+    >>> print(f.getvalue()[:8].decode('ascii'))
+    HL7APYSN
+    """
+
+    def __init__(self):
+        self._strings = []
+        self._string_indexes = {}
+        self._tuples = []
+        self._tuple_indexes = {}
+        # id of the tuples and lists already encoded -> (object, word): the libraries share a lot of references
+        self._encoded = {}
+        self._sections = []
+
+    def add_section(self, name, elements):
+        """
+        Add a section to the snapshot
+
+        :type name: ``str``
+        :param name: the name of the section
+        :type elements: ``dict``
+        :param elements: the references of the section by element name. The references can contain only
+            tuples, lists, strings, integers and ``None``
+        """
+        entries = [(self._add_string(k), self._encode(v)) for k, v in iteritems(elements)]
+        self._sections.append((self._add_string(name), entries))
+
+    def write(self, f):
+        """
+        Write the snapshot to a file-like object opened in binary mode
+        """
+        string_data = [s.encode('utf-8') for s in self._strings]
+        string_offsets = [0]
+        for s in string_data:
+            string_offsets.append(string_offsets[-1] + len(s))
+        tuple_offsets = [0]
+        for t in self._tuples:
+            tuple_offsets.append(tuple_offsets[-1] + len(t))
+
+        offset = _HEADER.size
+        strings_offsets_offset = offset
+        offset += 4 * len(string_offsets)
+        tuples_offsets_offset = offset
+        offset += 4 * len(tuple_offsets)
+        items_offset = offset
+        offset += 4 * tuple_offsets[-1]
+        sections_offset = offset
+        offset += _SECTION.size * len(self._sections)
+        sections = []
+        for name, entries in self._sections:
+            sections.append(_SECTION.pack(name, len(entries), offset))
+            offset += _ENTRY.size * len(entries)
+        strings_offset = offset
+
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(self._strings), strings_offsets_offset, strings_offset,
+                             len(self._tuples), tuples_offsets_offset, items_offset, len(self._sections),
+                             sections_offset))
+        f.write(struct.pack('<{}I'.format(len(string_offsets)), *string_offsets))
+        f.write(struct.pack('<{}I'.format(len(tuple_offsets)), *tuple_offsets))
+        for t in self._tuples:
+            f.write(struct.pack('<{}i'.format(len(t)), *t))
+        f.write(b''.join(sections))
+        for _, entries in self._sections:
+            f.write(b''.join(_ENTRY.pack(*e) for e in entries))
+        f.write(b''.join(string_data))
+
+    def _add_string(self, value):
+        try:
+            return self._string_indexes[value]
+        except KeyError:
+            index = self._string_indexes[value] = len(self._strings)
+            self._strings.append(value)
+            return index
+
+    def _encode(self, value):
+        if value is None:
+            return _NONE
+        elif isinstance(value, (tuple, list)):
+            try:
+                return self._encoded[id(value)][1]
+            except KeyError:
+                pass
+            items = tuple(self._encode(v) for v in value)
+            try:
+                index = self._tuple_indexes[items]
+            except KeyError:
+                index = self._tuple_indexes[items] = len(self._tuples)
+                self._tuples.append(items)
+            word = index << _TYPE_BITS | (_TUPLE if isinstance(value, tuple) else _LIST)
+            self._encoded[id(value)] = (value, word)
+            return word
+        elif isinstance(value, bool):
+            raise ValueError('Unsupported value in a snapshot: {!r}'.format(value))
+        elif isinstance(value, int):
+            if not -_MAX_INT <= value < _MAX_INT:
+                raise ValueError('Integer out of the range of a snapshot: {}'.format(value))
+            return value << _TYPE_BITS | _INT
+        elif isinstance(value, _string_types):
+            return self._add_string(value) << _TYPE_BITS | _STR
+        raise ValueError('Unsupported value in a snapshot: {!r}'.format(value))
+
+
+class Snapshot(Mapping):
+    """
+    A snapshot loaded from a file: it is a read-only mapping from the name of the sections to
+    :class:`SnapshotSection` instances. The file is memory-mapped and the references are decoded when
+    they are accessed the first time. Decoded references are cached, so the same reference is always
+    the same object.
+
+    :type path: ``str``
+    :param path: the path of the snapshot file
+    :raise: ``ValueError`` if the file is not a valid snapshot
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header = _HEADER.unpack_from(self._data, 0)
+        except struct.error:
+            header = None
+        if header is None or header[0] != MAGIC:
+            self.close()
+            raise ValueError('{} is not an HL7apy snapshot'.format(path))
+        if header[1] != FORMAT_VERSION:
+            self.close()
+            raise ValueError('Unsupported snapshot format version {}'.format(header[1]))
+        (_, _, n_strings, self._strings_offsets_offset, self._strings_offset, n_tuples,
+         self._tuples_offsets_offset, self._items_offset, n_sections, sections_offset) = header
+
+        self._strings = [None] * n_strings
+        # word -> decoded tuple or list
+        self._tuples = {}
+        self._sections = {}
+        for i in range(n_sections):
+            name, n_entries, entries_offset = _SECTION.unpack_from(self._data, sections_offset + i * _SECTION.size)
+            self._sections[self._get_string(name)] = (n_entries, entries_offset)
+        self._section_objects = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._section_objects[name]
+        except KeyError:
+            n_entries, entries_offset = self._sections[name]
+        section = self._section_objects[name] = SnapshotSection(self, name, n_entries, entries_offset)
+        return section
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+    def __reduce__(self):
+        # the other processes map the same file instead of receiving a copy of the references
+        return Snapshot, (self.path,)
+
+    def close(self):
+        """
+        Unmap the file. The references already decoded are still valid
+        """
+        self._data.close()
+
+    def _get_string(self, index):
+        s = self._strings[index]
+        if s is None:
+            start, end = struct.unpack_from('<2I', self._data, self._strings_offsets_offset + 4 * index)
+            s = self._data[self._strings_offset + start:self._strings_offset + end].decode('utf-8')
+            if str is bytes:  # Python 2: the names in the libraries are native strings
+                try:
+                    s = s.encode('ascii')
+                except UnicodeEncodeError:
+                    pass
+            s = self._strings[index] = _intern(s) if isinstance(s, str) else s
+        return s
+
+    def _get_items(self, word):
+        try:
+            return self._tuples[word]
+        except KeyError:
+            pass
+        index = word >> _TYPE_BITS
+        start, end = struct.unpack_from('<2I', self._data, self._tuples_offsets_offset + 4 * index)
+        items = struct.unpack_from('<{}i'.format(end - start), self._data, self._items_offset + 4 * start)
+        items = (self._decode(w) for w in items)
+        t = self._tuples[word] = tuple(items) if word & _TYPE_MASK == _TUPLE else list(items)
+        return t
+
+    def _decode(self, word):
+        kind, value = word & _TYPE_MASK, word >> _TYPE_BITS
+        if kind == _TUPLE or kind == _LIST:
+            return self._get_items(word)
+        elif kind == _STR:
+            return self._get_string(value)
+        elif kind == _INT:
+            return value
+        return None
+
+
+class SnapshotSection(Mapping):
+    """
+    A section of a :class:`Snapshot`: a read-only mapping from element names to references
+    """
+
+    def __init__(self, snapshot, name, n_entries, entries_offset):
+        self.snapshot = snapshot
+        self.name = name
+        entries = struct.unpack_from('<{}i'.format(2 * n_entries), snapshot._data, entries_offset)
+        self._entries = {snapshot._get_string(entries[i]): entries[i + 1] for i in range(0, len(entries), 2)}
+
+    def __getitem__(self, name):
+        return self.snapshot._decode(self._entries[name])
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __reduce__(self):
+        return _get_section, (self.snapshot, self.name)
+
+
+def _get_section(snapshot, name):
+    return snapshot[name]
+
+
+def write_snapshot(path, sections):
+    """
+    Write a snapshot with the given sections
+
+    :type path: ``str``
+    :param path: the path of the snapshot file
+    :type sections: ``dict``
+    :param sections: section name -> dictionary of references by element name
+    """
+    writer = SnapshotWriter()
+    for name, elements in iteritems(sections):
+        writer.add_section(name, elements)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+def write_library_snapshot(version, path):
+    """
+    Write a snapshot of the references of the given version. It contains a section for every element type
+    (see :func:`use_library_snapshot <hl7apy.use_library_snapshot>`)
+
+    :type version: ``str``
+    :param version: the version of the library (e.g. ``'2.5'``)
+    :type path: ``str``
+    :param path: the path of the snapshot file
+    """
+    write_snapshot(path, dict(iteritems(load_library(version).ELEMENTS)))
+
+
+def write_message_profile_snapshot(message_profile, path):
+    """
+    Write a snapshot of a message profile. The snapshot can be loaded with
+    :func:`load_message_profile <hl7apy.load_message_profile>`
+
+    :type message_profile: ``dict``
+    :param message_profile: the message profile (see :func:`load_message_profile <hl7apy.load_message_profile>`)
+    :type path: ``str``
+    :param path: the path of the snapshot file
+    """
+    write_snapshot(path, {MESSAGE_PROFILE_SECTION: message_profile})
+
+
+def is_snapshot(path):
+    """
+    Return ``True`` if the file is a snapshot
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot
+
+    :type path: ``str``
+    :param path: the path of the snapshot file
+    :rtype: :class:`Snapshot`
+    """
+    return Snapshot(path)
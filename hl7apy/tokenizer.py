@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Offsets of the pieces of ER7-encoded messages.
+
+An :class:`ER7Index` scans a message once to find its segments and keeps their offsets in ``array('I')``
+instances. Only the segments are indexed: a value is located in its segment by a single regular expression
+match, which skips the pieces before it at every level, and a string is created only for the values that
+are actually read. The index is meant for the consumers that read only some values of a message (e.g.
+:class:`PathExtractor <hl7apy.extract.PathExtractor>` and
+:class:`ColumnarExporter <hl7apy.columnar.ColumnarExporter>`): the parser, also in lazy mode, builds the
+elements from the pieces returned by ``str.split``, since it creates a string for every piece anyway.
+
+>>> from hl7apy.tokenizer import ER7Index
+>>> msg = 'MSH|^~\\\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|0123456789|P|2.5\\r' \\
+... 'PID|1||566-554-3423^^^GHH^MR~123^^^HOSP||EVERYMAN^ADAM^A\\r'
+>>> index = ER7Index(msg)
+>>> len(index)
+2
+>>> pid = index.find_segments('PID')[0]
+>>> print(index.field(pid, 5))
+EVERYMAN^ADAM^A
+>>> print(index.value(pid, 3, repetition=1, component=0))
+123
+>>> print(index.value(pid, 3, repetition=2))
+None
+"""
+
+from __future__ import absolute_import
+import re
+from array import array
+
+from hl7apy.parser import _split_msh
+
+
+class ER7Index(object):
+    """
+    The offsets of the segments of an ER7-encoded message, used to locate its values. Segments and fields are
+    numbered as the items of the lists returned by ``str.split``: the segments are the non-empty pieces of the
+    message, stripped, and the field ``0`` of a segment is its name (so the field ``1`` of a MSH segment
+    is MSH-2).
+
+    :type message: ``str``
+    :param message: the ER7-encoded message
+
+    :type encoding_chars: ``dict``
+    :param encoding_chars: the encoding chars of the message or ``None`` to read them from the MSH segment
+
+    :raise: :exc:`ParserError <hl7apy.exceptions.ParserError>` if ``encoding_chars`` is ``None`` and the message
+        doesn't start with a valid MSH segment
+    """
+
+    __slots__ = ('message', 'encoding_chars', 'segment_starts', 'segment_ends', '_separators', '_patterns',
+                 '_fields', '_segments_by_name')
+
+    def __init__(self, message, encoding_chars=None):
+        if encoding_chars is None:
+            _, encoding_chars = _split_msh(message.lstrip())
+        self.message = message
+        self.encoding_chars = encoding_chars
+        self.segment_starts, self.segment_ends = _scan_segments(message, encoding_chars['SEGMENT'])
+        self._separators = separators = (encoding_chars['FIELD'], encoding_chars['REPETITION'],
+                                         encoding_chars['COMPONENT'], encoding_chars['SUBCOMPONENT'])
+        try:
+            self._patterns = _piece_patterns[separators]
+        except KeyError:
+            self._patterns = _piece_patterns.setdefault(separators, {})
+        # segment index -> offsets of the fields of the segment (see split_offsets)
+        self._fields = {}
+        # segment name -> indexes of the segments with that name
+        self._segments_by_name = None
+
+    def __len__(self):
+        return len(self.segment_starts)
+
+    def segment(self, segment):
+        """
+        Return the text of the given segment
+
+        :type segment: ``int``
+        :param segment: the index of the segment
+        """
+        return self.message[self.segment_starts[segment]:self.segment_ends[segment]]
+
+    def find_segments(self, name):
+        """
+        Return the indexes of the segments with the given name, i.e. whose first three chars are ``name``
+
+        :type name: ``str``
+        :param name: the segment name (e.g. ``PID``)
+        :rtype: ``list``
+        """
+        segments_by_name = self._segments_by_name
+        if segments_by_name is None:
+            # the table of all the names is built with a single pass over the segments
+            segments_by_name = self._segments_by_name = {}
+            message = self.message
+            for i, start in enumerate(self.segment_starts):
+                segments_by_name.setdefault(message[start:start + 3], []).append(i)
+        return segments_by_name.get(name, [])
+
+    def fields(self, segment):
+        """
+        Return the offsets of all the fields of the given segment (see :func:`split_offsets`)
+
+        :type segment: ``int``
+        :param segment: the index of the segment
+        :rtype: ``array``
+        """
+        try:
+            return self._fields[segment]
+        except KeyError:
+            offsets = self._fields[segment] = split_offsets(self.message, self._separators[0],
+                                                            self.segment_starts[segment],
+                                                            self.segment_ends[segment])
+            return offsets
+
+    def field(self, segment, field):
+        """
+        Return the text of the given field, or ``None`` if the segment doesn't have it
+
+        :type segment: ``int``
+        :param segment: the index of the segment
+
+        :type field: ``int``
+        :param field: the index of the field in the segment
+        """
+        return self.value(segment, field, None)
+
+    def repetitions(self, segment, field):
+        """
+        Return the number of repetitions of the given field, ``0`` if the segment doesn't have it
+
+        :type segment: ``int``
+        :param segment: the index of the segment
+
+        :type field: ``int``
+        :param field: the index of the field in the segment
+        """
+        bounds = self.value_bounds(segment, field, None)
+        if bounds is None:
+            return 0
+        return self.message.count(self._separators[1], bounds[0], bounds[1]) + 1
+
+    def value(self, segment, field, repetition=0, component=None, subcomponent=None):
+        """
+        Return the text of a field, of one of its repetitions or of a component or subcomponent of a repetition,
+        or ``None`` if it is not in the message. Only the text of the value is copied from the message
+
+        :type segment: ``int``
+        :param segment: the index of the segment
+
+        :type field: ``int``
+        :param field: the index of the field in the segment
+
+        :type repetition: ``int``
+        :param repetition: the 0-based index of the repetition of the field or ``None`` for the whole field
+
+        :type component: ``int``
+        :param component: the 0-based index of the component or ``None`` for the whole repetition
+
+        :type subcomponent: ``int``
+        :param subcomponent: the 0-based index of the subcomponent or ``None`` for the whole component
+        """
+        bounds = self.value_bounds(segment, field, repetition, component, subcomponent)
+        if bounds is None:
+            return None
+        return self.message[bounds[0]:bounds[1]]
+
+    def value_bounds(self, segment, field, repetition=0, component=None, subcomponent=None):
+        """
+        Return the start and the end offsets of a value (see :meth:`value`), or ``None`` if it is not
+        in the message. The segment is scanned only up to the value
+        """
+        if repetition is None:
+            indexes = (field,)
+        elif component is None:
+            indexes = (field, repetition)
+        elif subcomponent is None:
+            indexes = (field, repetition, component)
+        else:
+            indexes = (field, repetition, component, subcomponent)
+        return self.locate(segment, indexes)
+
+    def locate(self, segment, indexes):
+        """
+        Return the start and the end offsets of a value given the indexes of its field, repetition, component
+        and subcomponent, or ``None`` if it is not in the message
+
+        :type segment: ``int``
+        :param segment: the index of the segment
+
+        :type indexes: ``tuple``
+        :param indexes: the indexes of the value: ``(field,)``, ``(field, repetition)``,
+            ``(field, repetition, component)`` or ``(field, repetition, component, subcomponent)``
+        """
+        try:
+            pattern = self._patterns[indexes]
+        except KeyError:
+            pattern = self._patterns[indexes] = _compile_piece_pattern(self._separators, indexes)
+        m = pattern.match(self.message, self.segment_starts[segment], self.segment_ends[segment])
+        if m is None:
+            return None
+        return m.span(1)
+
+
+def split_offsets(text, sep, start=0, end=None):
+    """
+    Return the offsets of the pieces of ``text[start:end].split(sep)`` without creating them: the piece ``i``
+    is ``text[offsets[i]:offsets[i + 1] - 1]``
+
+    :type text: ``str``
+    :param text: the text to split
+
+    :type sep: ``str``
+    :param sep: the separator of the pieces
+
+    :rtype: ``array``
+
+    >>> offsets = split_offsets('PID|1||SMITH', '|')
+    >>> list(offsets)
+    [0, 4, 6, 7, 13]
+    >>> print('PID|1||SMITH'[offsets[3]:offsets[4] - 1])
+    SMITH
+    """
+    if end is None:
+        end = len(text)
+    offsets = array('I', (start,))
+    find = text.find
+    pos = find(sep, start, end)
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = find(sep, pos + 1, end)
+    offsets.append(end + 1)
+    return offsets
+
+
+def _compile_piece_pattern(separators, indexes):
+    # the regular expression skips the pieces before the wanted one at every level (field, repetition,
+    # component, subcomponent), so that the value is located by a single match
+    regex, excluded = [], ''
+    for sep, index in zip(separators, indexes):
+        sep = re.escape(sep)
+        excluded += sep
+        if index:
+            regex.append('(?:[^{0}]*{1}){{{2}}}'.format(excluded, sep, index))
+    regex.append('([^{0}]*)'.format(excluded))
+    return re.compile(''.join(regex))
+
+
+def _scan_segments(text, sep):
+    # the separators are found with str.find, so no string is created for the segments. The segments are
+    # stripped, as the parser does
+    starts, ends = array('I'), array('I')
+    find = text.find
+    length = len(text)
+    start = 0
+    while start <= length:
+        end = find(sep, start)
+        if end == -1:
+            end = length
+        segment_start, segment_end = start, end
+        while segment_start < segment_end and text[segment_start].isspace():
+            segment_start += 1
+        while segment_end > segment_start and text[segment_end - 1].isspace():
+            segment_end -= 1
+        if segment_start < segment_end:
+            starts.append(segment_start)
+            ends.append(segment_end)
+        start = end + 1
+    return starts, ends
+
+
+# separators -> {indexes of a value: compiled regular expression} (see ER7Index.locate)
+_piece_patterns = {}
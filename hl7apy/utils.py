@@ -20,9 +20,17 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from __future__ import absolute_import
+import collections
+import importlib
 import re
+import threading
 from datetime import datetime
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 
 def check_date(value):
     """
@@ -73,9 +81,7 @@ def get_date_info(value):
 
     :type value: `str`
     """
-    fmt = _get_date_format(value)
-    dt_value = _datetime_obj_factory(value, fmt)
-    return dt_value, fmt
+    return _decode('DT', value, _fast_date_info, _get_date_info)
 
 
 def get_timestamp_info(value):
@@ -84,10 +90,7 @@ def get_timestamp_info(value):
 
     :type value: `str`
     """
-    value, offset = _split_offset(value)
-    fmt, microsec = _get_timestamp_format(value)
-    dt_value = _datetime_obj_factory(value, fmt)
-    return dt_value, fmt, offset, microsec
+    return _decode('TM', value, _fast_timestamp_info, _get_timestamp_info)
 
 
 def get_datetime_info(value):
@@ -96,6 +99,151 @@ def get_datetime_info(value):
 
     :type value: `str`
     """
+    return _decode('DTM', value, _fast_datetime_info, _get_datetime_info)
+
+
+def set_datetime_cache_size(maxsize):
+    """
+    Set the maximum number of decoded date and time values (see :func:`get_date_info`,
+    :func:`get_timestamp_info` and :func:`get_datetime_info`) kept in cache. The least recently used
+    values are discarded first. The default size is 1024
+
+    :type maxsize: ``int``
+    :param maxsize: the size of the cache. ``0`` disables the cache
+    """
+    global _datetime_cache_maxsize
+    with _datetime_cache_lock:
+        _datetime_cache.clear()
+        _datetime_cache_maxsize = maxsize
+
+
+# (datatype, value) -> decoded value
+_datetime_cache = collections.OrderedDict()
+_datetime_cache_lock = threading.Lock()
+_datetime_cache_maxsize = 1024
+
+
+def _decode(datatype, value, fast_decoder, decoder):
+    key = (datatype, value)
+    with _datetime_cache_lock:
+        try:
+            # the value is moved to the end of the cache, as the most recently used
+            info = _datetime_cache[key] = _datetime_cache.pop(key)
+            return info
+        except KeyError:
+            pass
+    # the values that are not made only of digits (and offset) are left to the slower decoder,
+    # which also raises the errors
+    info = fast_decoder(value) or decoder(value)
+    with _datetime_cache_lock:
+        if _datetime_cache_maxsize > 0:
+            _datetime_cache[key] = info
+            if len(_datetime_cache) > _datetime_cache_maxsize:
+                _datetime_cache.popitem(last=False)
+    return info
+
+
+_DATE_FORMATS = {4: '%Y', 6: '%Y%m', 8: '%Y%m%d'}
+_TIME_FORMATS = {2: '%H', 4: '%H%M', 6: '%H%M%S'}
+
+
+def _fast_split_offset(value):
+    """
+    Split the offset (+/-HHMM) from the value. Return ``None`` if the value ends with an invalid offset
+    """
+    if len(value) < 5 or value[-5] not in '+-':
+        return value, ''
+    offset = value[-5:]
+    if not offset[1:].isdigit():
+        return None
+    if int(offset[1:3]) > (14 if offset[0] == '+' else 12) or int(offset[3:]) > 59:
+        return None
+    return value[:-5], offset
+
+
+def _fast_time(value):
+    """
+    Return hour, minute, second, microsecond, format and microseconds precision of a time made only
+    of digits, ``None`` if the value has some other format
+    """
+    length = len(value)
+    if length in _TIME_FORMATS:
+        if not value.isdigit():
+            return None
+        return (int(value[:2]), int(value[2:4] or 0), int(value[4:6] or 0), 0,
+                _TIME_FORMATS[length], 4)
+    if 8 <= length <= 11 and value[6] == '.':
+        digits, fraction = value[:6], value[7:]
+        if not (digits.isdigit() and fraction.isdigit()):
+            return None
+        return (int(digits[:2]), int(digits[2:4]), int(digits[4:6]), int(fraction.ljust(6, '0')),
+                '%H%M%S.%f', length - 7)
+    return None
+
+
+def _fast_date_info(value):
+    fmt = _DATE_FORMATS.get(len(value))
+    if fmt is None or not value.isdigit():
+        return None
+    try:
+        return datetime(int(value[:4]), int(value[4:6] or 1), int(value[6:8] or 1)), fmt
+    except ValueError:
+        return None
+
+
+def _fast_timestamp_info(value):
+    split = _fast_split_offset(value)
+    if split is None:
+        return None
+    value, offset = split
+    time = _fast_time(value)
+    if time is None:
+        return None
+    hour, minute, second, microsecond, fmt, microsec = time
+    try:
+        return datetime(1900, 1, 1, hour, minute, second, microsecond), fmt, offset, microsec
+    except ValueError:
+        return None
+
+
+def _fast_datetime_info(value):
+    split = _fast_split_offset(value)
+    if split is None:
+        return None
+    value, offset = split
+    date_value, time_value = value[:8], value[8:]
+    date_format = _DATE_FORMATS.get(len(date_value))
+    if date_format is None or not date_value.isdigit():
+        return None
+    if time_value:
+        time = _fast_time(time_value)
+        if time is None:
+            return None
+    else:
+        time = (0, 0, 0, 0, '', 4)
+    hour, minute, second, microsecond, time_format, microsec = time
+    try:
+        dt_value = datetime(int(date_value[:4]), int(date_value[4:6] or 1), int(date_value[6:8] or 1),
+                            hour, minute, second, microsecond)
+    except ValueError:
+        return None
+    return dt_value, date_format + time_format, offset, microsec
+
+
+def _get_date_info(value):
+    fmt = _get_date_format(value)
+    dt_value = _datetime_obj_factory(value, fmt)
+    return dt_value, fmt
+
+
+def _get_timestamp_info(value):
+    value, offset = _split_offset(value)
+    fmt, microsec = _get_timestamp_format(value)
+    dt_value = _datetime_obj_factory(value, fmt)
+    return dt_value, fmt, offset, microsec
+
+
+def _get_datetime_info(value):
     date_value, offset = _split_offset(value)
     date_format = _get_date_format(date_value[:8])
 
@@ -163,3 +311,76 @@ def iteritems(d):
         return d.iteritems()
     else:
         return d.items()
+
+
+class LazyElements(Mapping):
+    """
+    The ``ELEMENTS`` dictionary of a library version (element type -> reference dictionary). The module
+    containing the references of an element type is imported only when that element type is accessed the
+    first time
+
+    :type package: ``str``
+    :param package: the name of the package of the library (e.g. ``hl7apy.v2_5``)
+    :type modules: ``dict``
+    :param modules: element type -> (module name, dictionary name). If the value is ``None`` the library has
+        no references for that element type
+    """
+
+    def __init__(self, package, modules):
+        self._package = package
+        self._modules = modules
+        self._attributes = {v[1]: k for k, v in iteritems(modules) if v is not None}
+        self._elements = {}
+        self._snapshot = None
+
+    def __getitem__(self, element_type):
+        try:
+            return self._elements[element_type]
+        except KeyError:
+            module = self._modules[element_type]
+        if self._snapshot is not None:
+            elements = self._snapshot[element_type]
+        elif module is None:
+            elements = {}
+        else:
+            module_name, attribute = module
+            elements = getattr(importlib.import_module('.' + module_name, self._package), attribute)
+        self._elements[element_type] = elements
+        return elements
+
+    def __iter__(self):
+        return iter(self._modules)
+
+    def __len__(self):
+        return len(self._modules)
+
+    def use_snapshot(self, snapshot):
+        """
+        Take the references from a :class:`Snapshot <hl7apy.snapshot.Snapshot>` instead of importing the
+        modules of the library
+
+        :raise: ``ValueError`` if the snapshot doesn't contain all the element types
+        """
+        missing = set(self._modules) - set(snapshot)
+        if missing:
+            raise ValueError('Missing element types in the snapshot: {}'.format(', '.join(sorted(missing))))
+        self._snapshot = snapshot
+        self._elements = {}
+
+    def get_attribute(self, name):
+        """
+        Return the reference dictionary with the given name (e.g. ``SEGMENTS``), loading it if needed
+
+        :raise: ``AttributeError`` if the library has no dictionary with the given name
+        """
+        try:
+            element_type = self._attributes[name]
+        except KeyError:
+            raise AttributeError("module '{}' has no attribute '{}'".format(self._package, name))
+        return self[element_type]
+
+    def get_attributes(self):
+        """
+        Return all the reference dictionaries by name, loading them
+        """
+        return {name: self[element_type] for name, element_type in iteritems(self._attributes)}
@@ -21,20 +21,27 @@
 
 from __future__ import absolute_import
 import importlib
-
-from .messages import MESSAGES
-from .segments import SEGMENTS
-from .fields import FIELDS
-from .datatypes import DATATYPES, DATATYPES_STRUCTS
-from .groups import GROUPS
-from .tables import TABLES
+import sys
 
 from hl7apy.v2_6.base_datatypes import ST as _ST26
 from hl7apy.exceptions import ChildNotFound
+from hl7apy.utils import LazyElements
+
+# the modules with the references of every element type are imported on first access
+ELEMENTS = LazyElements(__name__, {
+    'Message': ('messages', 'MESSAGES'), 'Group': ('groups', 'GROUPS'), 'Segment': ('segments', 'SEGMENTS'),
+    'Field': ('fields', 'FIELDS'), 'Component': ('datatypes', 'DATATYPES'),
+    'SubComponent': ('datatypes', 'DATATYPES'), 'Datatypes_Structs': ('datatypes', 'DATATYPES_STRUCTS'),
+    'Table': ('tables', 'TABLES')})
+
+
+def __getattr__(name):
+    # MESSAGES, SEGMENTS, etc. are loaded when they are accessed (Python 3.7+)
+    return ELEMENTS.get_attribute(name)
+
 
-ELEMENTS = {'Message': MESSAGES, 'Group': GROUPS, 'Segment': SEGMENTS,
-            'Field': FIELDS, 'Component': DATATYPES, 'SubComponent': DATATYPES,
-            'Datatypes_Structs': DATATYPES_STRUCTS, 'Table': TABLES}
+if sys.version_info < (3, 7):  # no module __getattr__: the references are loaded eagerly
+    globals().update(ELEMENTS.get_attributes())
 
 
 def get(name, element_type):
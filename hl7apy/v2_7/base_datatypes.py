@@ -20,30 +20,13 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 from __future__ import absolute_import
 
-import re
-
 from hl7apy import get_default_encoding_chars
 from hl7apy.base_datatypes import TextualDataType as BaseTextualDataType
 
 
 class TextualDataType(BaseTextualDataType):
 
-    def _get_translations(self, encoding_chars):
-        escape_char = encoding_chars['ESCAPE']
-        try:
-            return ((encoding_chars['FIELD'], '{esc}F{esc}'.format(esc=escape_char)),
-                    (encoding_chars['COMPONENT'], '{esc}S{esc}'.format(esc=escape_char)),
-                    (encoding_chars['SUBCOMPONENT'], '{esc}T{esc}'.format(esc=escape_char)),
-                    (encoding_chars['REPETITION'], '{esc}R{esc}'.format(esc=escape_char)),
-                    (encoding_chars['TRUNCATION'], '{esc}L{esc}'.format(esc=escape_char)),)
-        except KeyError:
-            return ((encoding_chars['FIELD'], '{esc}F{esc}'.format(esc=escape_char)),
-                    (encoding_chars['COMPONENT'], '{esc}S{esc}'.format(esc=escape_char)),
-                    (encoding_chars['SUBCOMPONENT'], '{esc}T{esc}'.format(esc=escape_char)),
-                    (encoding_chars['REPETITION'], '{esc}R{esc}'.format(esc=escape_char)),)
-
-    def _get_escape_char_regex(self, escape_char):
-        return r'(?<!%s[HNFSTREL])%s(?![HNFSTREL]%s)' % tuple(3 * [re.escape(escape_char)])
+    escape_truncation = True
 
     def to_er7(self, encoding_chars=None):
         if encoding_chars is None:
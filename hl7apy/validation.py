@@ -20,11 +20,12 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from __future__ import absolute_import
+import threading
 import traceback
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 
-from hl7apy import load_reference
+from hl7apy import load_reference, lookup_table, instrumentation, get_version_context
 from hl7apy.consts import VALIDATION_LEVEL
 from hl7apy.exceptions import ChildNotFound, ValidationError, ValidationWarning
 
@@ -34,6 +35,91 @@ ErrorsAndWarnings = namedtuple(
     ("is_valid", "errors", "warnings"))
 
 
+_ValidationPlan = namedtuple(
+    "_ValidationPlan",
+    ("reference", "is_leaf", "valid_children", "children", "datatype", "table", "table_values", "max_length"))
+
+# maximum number of validation plans kept
+_VALIDATION_PLANS_MAXSIZE = 16384
+# (id of the reference, version) -> _ValidationPlan
+_validation_plans = OrderedDict()
+_validation_plans_lock = threading.Lock()
+# (datatype, version) -> reference of the datatype structure
+_datatype_references = {}
+# (datatype, version) -> reference used to validate the z fields of that datatype
+_z_datatype_references = {}
+
+
+def _get_validation_plan(ref, version):
+    """
+    Return the checks to perform on the elements with the given reference. They are computed only once for
+    every reference (of the HL7 libraries or of a message profile) and version, and kept in a bounded cache
+    emptied by :meth:`ElementFinder.cache_clear <hl7apy.core.ElementFinder.cache_clear>`
+    """
+    key = (id(ref), version)
+    try:
+        plan = _validation_plans[key]
+    except KeyError:
+        pass
+    else:
+        # the plan keeps the reference alive, so its id can't be reused by another object
+        if plan.reference is ref:
+            return plan
+
+    if ref[0] in ('sequence', 'choice'):
+        plan = _ValidationPlan(ref, False, frozenset(c[0] for c in ref[1]),
+                               tuple((c[0], c[1], c[2][0], c[2][1]) for c in ref[1]),
+                               None, None, None, -1)
+    else:
+        table, table_values = ref[4], None
+        if table is not None:
+            try:
+                table_values = lookup_table(version, table)
+            except ChildNotFound:
+                pass
+        plan = _ValidationPlan(ref, True, None, None, ref[2], table, table_values, ref[5])
+    with _validation_plans_lock:
+        while len(_validation_plans) >= _VALIDATION_PLANS_MAXSIZE:
+            _validation_plans.popitem(last=False)
+        _validation_plans[key] = plan
+    return plan
+
+
+def _clear_validation_caches():
+    with _validation_plans_lock:
+        _validation_plans.clear()
+    _datatype_references.clear()
+    _z_datatype_references.clear()
+
+
+def _get_datatype_reference(datatype, version):
+    try:
+        return _datatype_references[(datatype, version)]
+    except KeyError:
+        ref = _datatype_references[(datatype, version)] = load_reference(datatype, 'Datatypes_Structs', version)
+        return ref
+
+
+def _get_z_datatype_reference(datatype, version):
+    try:
+        return _z_datatype_references[(datatype, version)]
+    except KeyError:
+        # Component just to search in the datatypes....
+        dt_struct = load_reference(datatype, 'Datatypes_Structs', version)
+        ref = _z_datatype_references[(datatype, version)] = ('sequence', dt_struct, datatype, None, None, -1)
+        return ref
+
+
+def _check_child_name(el, child_name):
+    """
+    Raise an exception if the element can't have a child with the given name, as
+    :meth:`ElementList.get <hl7apy.core.ElementList.get>` does
+    """
+    if child_name not in el.children.traversal_indexes and \
+            not (el.structure_by_name is not None and child_name in el.structure_by_name):
+        el.find_child_reference(child_name)
+
+
 class Validator(object):
     """
     Class that handles validation. It defines validation levels and validate
@@ -75,27 +161,21 @@ class Validator(object):
         :raises: :exc:`ValidationWarning <hl7apy.exceptions.ValidationWarning>`: errors concerning the values
         """
 
-        from hl7apy.core import is_base_datatype
-
         def _check_z_element(el, errs, warns):
             if el.classname == 'Field':
-                if is_base_datatype(el.datatype, el.version) or \
+                if get_version_context(el.version).is_base_datatype(el.datatype) or \
                         el.datatype == 'varies':
                     return True
                 elif el.datatype is not None:
                     # if the datatype the is a complex datatype, the z element must follow the correct
                     # structure of that datatype
-                    # Component just to search in the datatypes....
-                    dt_struct = load_reference(el.datatype, 'Datatypes_Structs', el.version)
-                    ref = ('sequence', dt_struct, el.datatype, None, None, -1)
+                    ref = _get_z_datatype_reference(el.datatype, el.version)
                     _check_known_element(el, ref, errs, warns)
             for c in el.children:
                 _is_valid(c, None, errs, warns)
             return True
 
-        def _check_repetitions(el, children, cardinality, child_name, errs):
-            children_num = len(children)
-            min_repetitions, max_repetitions = cardinality
+        def _check_repetitions(el, children_num, min_repetitions, max_repetitions, child_name, errs):
             if max_repetitions != -1:
                 if children_num < min_repetitions:
                     errs.append(ValidationError("Missing required child {}.{}".format(el.name, child_name)))
@@ -106,40 +186,20 @@ class Validator(object):
                     errs.append(ValidationError("Missing required child {}.{}".format(el.name,
                                                                                       child_name)))
 
-        def _check_table_compliance(el, ref, warns):
-            table = ref[4]
-            if table is not None:
-                try:
-                    table_ref = load_reference(table, 'Table', el.version)
-                except ChildNotFound:
-                    pass
-                else:
-                    table_children = table_ref[1]
-                    if el.to_er7() not in table_children:
-                        warns.append(ValidationWarning("Value {} not in table {} in element {}.{}".
-                                                       format(el.to_er7(), table, el.parent.name,
-                                                              el.name)))
-
-        def _check_length(el, ref, warns):
-            max_length = ref[5]
-            if -1 < max_length < len(el.to_er7()):
-                warns.append(ValidationWarning("Exceeded max length ({}) of {}.{}".
-                                               format(max_length, el.parent.name, el.name)))
-
-        def _check_datatype(el, ref, errs):
-            ref_datatype = ref[2]
-            if el.datatype != ref_datatype:
+        def _check_leaf(el, plan, warns):
+            if plan.table_values is not None or plan.max_length > -1:
+                value = el.to_er7()
+                if plan.table_values is not None and value not in plan.table_values:
+                    warns.append(ValidationWarning("Value {} not in table {} in element {}.{}".
+                                                   format(value, plan.table, el.parent.name, el.name)))
+                if -1 < plan.max_length < len(value):
+                    warns.append(ValidationWarning("Exceeded max length ({}) of {}.{}".
+                                                   format(plan.max_length, el.parent.name, el.name)))
+
+        def _check_datatype(el, plan, errs):
+            if el.datatype != plan.datatype:
                 errs.append(ValidationError("Datatype {} is not correct for {}.{} (it must be {})".
-                                            format(el.datatype, el.parent.name, el.name, ref[1])))
-
-        def _get_valid_children_info(ref):
-            valid_children = {c[0] for c in ref[1]}
-            children_refs = ref[1]
-            return valid_children, children_refs
-
-        def _get_child_reference_info(ref):
-            child_name, cardinality = ref[0], ref[2]
-            return child_name, cardinality
+                                            format(el.datatype, el.parent.name, el.name, plan.reference[1])))
 
         def _check_known_element(el, ref, errs, warns):
             if ref is None:
@@ -148,49 +208,56 @@ class Validator(object):
                 except ChildNotFound:
                     errs.append(ValidationError("Invalid element found: {}".format(el)))
 
-            if ref[0] in ('sequence', 'choice'):
-                element_children = {c.name for c in el.children if not c.is_z_element()}
-                valid_children, valid_children_refs = _get_valid_children_info(ref)
+            plan = _get_validation_plan(ref, el.version)
+            if not plan.is_leaf:
+                element_children = set()
+                z_children = []
+                for c in el.children:
+                    if c.is_z_element():
+                        z_children.append(c)
+                    else:
+                        element_children.add(c.name)
 
                 # check that the children are all allowed children
-                if not element_children <= valid_children:
+                if not element_children <= plan.valid_children:
                     errs.append(ValidationError("Invalid children detected for {}: {}".
-                                                format(el, list(element_children - valid_children))))
+                                                format(el, list(element_children - plan.valid_children))))
 
                 # iterates the valid children
-                for child_ref in valid_children_refs:
-                    # it gets the structure of the children to check
-                    child_name, cardinality = _get_child_reference_info(child_ref)
-                    try:
-                        # it gets all the occurrences of the children of a type
-                        children = el.children.get(child_name)
-                    except Exception:
-                        # TODO: it is due to the lack of element in the official reference files...  should
-                        # we raise an exception here?
-                        pass
-                    else:
-                        _check_repetitions(el, children, cardinality, child_name, errs)
-                        # calls validation for every children
-                        for c in children:
-                            _is_valid(c, child_ref[1], errs, warns)
+                indexes = el.children.indexes
+                for child_name, child_ref, min_repetitions, max_repetitions in plan.children:
+                    # it gets all the occurrences of the children of a type
+                    children = indexes.get(child_name)
+                    if children is None:
+                        if min_repetitions == 0:
+                            # nothing to report for a missing optional child
+                            continue
+                        try:
+                            _check_child_name(el, child_name)
+                        except Exception:
+                            # TODO: it is due to the lack of element in the official reference files...  should
+                            # we raise an exception here?
+                            continue
+                        children = ()
+                    _check_repetitions(el, len(children), min_repetitions, max_repetitions, child_name, errs)
+                    # calls validation for every children
+                    for c in children:
+                        _is_valid(c, child_ref, errs, warns)
 
                 # finally calls validation for z_elements
-                z_children = [c for c in el.children if c.is_z_element()]
                 for c in z_children:
                     _is_valid(c, None, errs, warns)
             else:
-                _check_table_compliance(el, ref, warns)
-
-                _check_length(el, ref, warns)
+                _check_leaf(el, plan, warns)
 
                 if el.datatype == 'varies':  # TODO: it should check the real rule
                     return True
-                _check_datatype(el, ref, errs)
+                _check_datatype(el, plan, errs)
 
                 # For complex datatypes element, the reference is the one of the datatype
-                if not is_base_datatype(el.datatype, el.version) and el.datatype is not None:
+                if el.datatype is not None and not get_version_context(el.version).is_base_datatype(el.datatype):
                     # Component just to search in the datatypes....
-                    ref = load_reference(el.datatype, 'Datatypes_Structs', el.version)
+                    ref = _get_datatype_reference(el.datatype, el.version)
                     _is_valid(el, ref, errs, warns)
 
         def _is_valid(el, ref, errs, warns):
@@ -206,7 +273,13 @@ class Validator(object):
         errors = []
         warnings = []
 
-        _is_valid(element, reference, errors, warnings)
+        sink = instrumentation._sink
+        if sink is None:
+            _is_valid(element, reference, errors, warnings)
+        else:
+            start = instrumentation._timer()
+            _is_valid(element, reference, errors, warnings)
+            sink.record('validate', element.name, instrumentation._timer() - start)
 
         if report_file is not None:
             try:
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import absolute_import
+import unittest
+
+from hl7apy import columnar
+from hl7apy.columnar import ColumnarExporter, StringPool, MESSAGE_TABLE
+from hl7apy.exceptions import InvalidPath
+
+MSG = 'MSH|^~\\&|GHH_LAB||||20080115153000||ORU^R01^ORU_R01|{0}|P|2.5\r' \
+      'PID|1||{1}^^^GHH^MR~123^^^HOSP||EVERYMAN^ADAM\r' \
+      'OBR|1\r' \
+      'OBX|1|NM|GLU^GLUCOSE||182|mg/dl\r' \
+      'OBX|2|ST|NOTE^NOTE||A\\T\\B'
+
+
+class TestColumnarExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [MSG.format('M1', 'P1'), MSG.format('M2', 'P2').encode('ascii'),
+                         MSG.format('M3', 'P1').split('\rOBX')[0]]
+
+    def test_message_table(self):
+        exporter = ColumnarExporter(['MSH_10', 'PID_3', 'PID_3_1', 'PID-3(2).4', 'PID_5_2', 'PV1_2'],
+                                    use_numpy=False)
+        tables = exporter.export(self.messages)
+        self.assertEqual(list(tables), [MESSAGE_TABLE])
+        table = tables[MESSAGE_TABLE]
+        self.assertEqual(len(table), 3)
+        self.assertEqual(list(table.index), [0, 1, 2])
+        self.assertEqual(table.values('MSH_10'), ['M1', 'M2', 'M3'])
+        self.assertEqual(table.values('PID_3'), ['P1^^^GHH^MR', 'P2^^^GHH^MR', 'P1^^^GHH^MR'])
+        self.assertEqual(table.values('PID_3_1'), ['P1', 'P2', 'P1'])
+        self.assertEqual(table.values('PID-3(2).4'), ['HOSP'] * 3)
+        self.assertEqual(table.values('PID_5_2'), ['ADAM'] * 3)
+        self.assertEqual(table.values('PV1_2'), [None] * 3)
+        self.assertEqual(list(table.columns['PV1_2']), [-1] * 3)
+        # the values are dictionary-encoded
+        self.assertEqual(table.columns['PID_3_1'][0], table.columns['PID_3_1'][2])
+        self.assertEqual(len(table.pool), len(set(table.pool.values)))
+
+    def test_segment_tables(self):
+        exporter = ColumnarExporter(['MSH_10', 'OBX_3_1', 'OBX_5', 'OBX_6', 'OBR-1'],
+                                    repeating=['obx', 'OBR'], use_numpy=False)
+        self.assertEqual(exporter.repeating, ('OBX', 'OBR'))
+        tables = exporter.export(self.messages)
+        self.assertEqual(list(tables), [MESSAGE_TABLE, 'OBX', 'OBR'])
+        self.assertEqual(list(tables[MESSAGE_TABLE].columns), ['MSH_10'])
+        obx = tables['OBX']
+        self.assertEqual(len(obx), 4)
+        self.assertEqual(list(obx.index), [0, 0, 1, 1])
+        self.assertEqual(obx.values('OBX_3_1'), ['GLU', 'NOTE', 'GLU', 'NOTE'])
+        self.assertEqual(obx.values('OBX_5'), ['182', 'A&B', '182', 'A&B'])
+        self.assertEqual(obx.values('OBX_6'), ['mg/dl', None, 'mg/dl', None])
+        self.assertEqual(list(tables['OBR'].index), [0, 1, 2])
+        self.assertIs(obx.pool, tables[MESSAGE_TABLE].pool)
+
+        tables = ColumnarExporter(['OBX[*]-5'], unescape=False, use_numpy=False).export(self.messages)
+        self.assertEqual(tables['OBX'].values('OBX[*]-5'), ['182', 'A\\T\\B', '182', 'A\\T\\B'])
+
+    def test_invalid_columns(self):
+        for column in ('PID_3_1_1_1', 'PID-3(*)', 'PID', 'PID_X'):
+            self.assertRaises(InvalidPath, ColumnarExporter, [column])
+        # a repetition of a repeating segment
+        self.assertRaises(InvalidPath, ColumnarExporter, ['OBX[2]-5'], repeating=['OBX'])
+        self.assertRaises(InvalidPath, ColumnarExporter, ['OBX[*]-3', 'OBX[1]-5'])
+        tables = ColumnarExporter(['OBX[2]-5', 'OBX-3.1'], use_numpy=False).export(self.messages)
+        self.assertEqual(tables[MESSAGE_TABLE].values('OBX[2]-5'), ['A&B', 'A&B', None])
+        self.assertEqual(tables[MESSAGE_TABLE].values('OBX-3.1'), ['GLU', 'GLU', None])
+
+    def test_string_pool(self):
+        pool = StringPool()
+        self.assertEqual(pool.encode('a'), 0)
+        self.assertEqual(pool.encode(''), 1)
+        self.assertEqual(pool.encode('a'), 0)
+        self.assertEqual(pool.encode(None), -1)
+        self.assertEqual([pool.decode(c) for c in (1, 0, -1)], ['', 'a', None])
+        self.assertEqual(len(pool), 2)
+
+    @unittest.skipIf(columnar.numpy is None, 'NumPy is not installed')
+    def test_numpy(self):
+        tables = ColumnarExporter(['MSH_10', 'OBX_5'], repeating=['OBX']).export(self.messages)
+        obx = tables['OBX']
+        self.assertIsInstance(obx.columns['OBX_5'], columnar.numpy.ndarray)
+        self.assertEqual(obx.index.tolist(), [0, 0, 1, 1])
+        self.assertEqual(obx.values('OBX_5'), ['182', 'A&B', '182', 'A&B'])
+
+
+if __name__ == '__main__':
+    unittest.main()
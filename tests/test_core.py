@@ -20,14 +20,16 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from __future__ import absolute_import
+import copy
 import os
+import pickle
 import platform
 import sys
 import unittest
 
 import hl7apy
 from hl7apy import DEFAULT_ENCODING_CHARS
-from hl7apy.core import Message, Segment, Field, Group, Component, SubComponent, ElementProxy
+from hl7apy.core import Message, Segment, Field, Group, Component, SubComponent, ElementProxy, ElementFinder
 from hl7apy.exceptions import ChildNotValid, ChildNotFound, OperationNotAllowed, InvalidName, \
     MaxChildLimitReached, UnsupportedVersion, InvalidEncodingChars, \
     MaxLengthReached, MessageProfileNotFound, LegacyMessageProfile
@@ -394,6 +396,70 @@ class TestMessage(unittest.TestCase):
         self.assertNotIn('TRUNCATION', m.encoding_chars)
         self.assertEqual(m.msh.msh_2.to_er7(), '^~\\&')
 
+    def test_pickle(self):
+        for lazy in (False, True):
+            m = parse_message(_get_test_msg_2(), lazy=lazy)
+            # the proxies created by the traversal are not pickled
+            self.assertEqual(m.oml_o33_patient.pid.pid_5.xpn_2.to_er7(), 'NAME')
+            m2 = pickle.loads(pickle.dumps(m, pickle.HIGHEST_PROTOCOL))
+            self.assertEqual(m2.to_er7(), m.to_er7())
+            self.assertIs(m2.oml_o33_patient[0].pid[0].parent, m2.oml_o33_patient[0])
+            self.assertEqual(m2.oml_o33_patient.pid.pid_5.xpn_2.to_er7(), 'NAME')
+            self.assertEqual(repr(m2.validate(return_errors=True)), repr(m.validate(return_errors=True)))
+            m3 = copy.deepcopy(m)
+            self.assertEqual(m3.to_er7(), m.to_er7())
+
+    def test_compact_elements(self):
+        m = parse_message(_get_test_msg_2())
+        pid_5 = m.oml_o33_patient.pid.pid_5[0]
+        for el in (pid_5, pid_5.xpn_2[0], pid_5.xpn_2[0].children[0]):
+            self.assertFalse(hasattr(el, '__dict__'))
+            self.assertFalse(hasattr(el.children, '__dict__'))
+
+        # the empty indexes are shared until a child is added
+        sc = pid_5.xpn_2[0].children[0]
+        self.assertIs(sc.children.indexes, Field('PID_3').children.indexes)
+        self.assertIs(sc.children.indexes, sc.children.traversal_indexes)
+        f = Field('PID_3')
+        f.cx_1 = '1234'
+        self.assertEqual(list(f.children.indexes), ['CX_1'])
+        self.assertEqual(len(sc.children.indexes), 0)
+        self.assertEqual(Field('PID_3').cx_4.to_er7(), '')
+        self.assertEqual(len(sc.children.traversal_indexes), 0)
+        self.assertEqual(len(sc.children.proxies), 0)
+
+    def test_encoding_chars_cache(self):
+        m = parse_message(_get_test_msg())
+        encoding_chars = m.encoding_chars
+        self.assertEqual(m.encoding_chars, encoding_chars)
+        self.assertEqual(m.oml_o33_patient.pid.pid_3.encoding_chars, encoding_chars)
+
+        # the cached dict is not exposed
+        encoding_chars['COMPONENT'] = '#'
+        self.assertEqual(m.encoding_chars['COMPONENT'], '^')
+        self.assertTrue(m.to_er7().startswith('MSH|^~\\&|SENDING APP|'))
+
+        m.msh.msh_1 = '!'
+        self.assertEqual(m.encoding_chars['FIELD'], '!')
+        self.assertTrue(m.to_er7().startswith('MSH!^~\\&!SENDING APP!'))
+
+        m.msh.msh_2 = '$%@*'
+        self.assertEqual(m.encoding_chars['COMPONENT'], '$')
+        self.assertEqual(m.encoding_chars['SUBCOMPONENT'], '*')
+
+        m.encoding_chars = DEFAULT_ENCODING_CHARS
+        self.assertEqual(m.msh.to_er7()[:9], 'MSH|^~\\&|')
+
+        # changes to the components of MSH_1 and MSH_2
+        m.msh.msh_1.msh_1_1.value = '!'
+        self.assertEqual(m.encoding_chars['FIELD'], '!')
+        m.msh.msh_2.msh_2_1.children[0].value = '#~\\&'
+        self.assertEqual(m.encoding_chars['COMPONENT'], '#')
+        self.assertTrue(m.msh.to_er7().startswith('MSH!#~\\&!'))
+        m.encoding_chars = DEFAULT_ENCODING_CHARS
+        for k in ('FIELD', 'COMPONENT', 'SUBCOMPONENT', 'REPETITION', 'ESCAPE'):
+            self.assertEqual(m.encoding_chars[k], DEFAULT_ENCODING_CHARS[k])
+
     def test_legacy_message_profile(self):
         self.assertRaises(LegacyMessageProfile, Message, 'RAS_O17', reference=self.legacy_mp)
 
@@ -2146,5 +2212,47 @@ class TestSubComponent(unittest.TestCase):
             f.stf_2_10_100 = 'subcomponent'
 
 
+class TestElementFinder(unittest.TestCase):
+
+    def setUp(self):
+        ElementFinder.cache_clear()
+
+    def tearDown(self):
+        ElementFinder.cache_clear()
+
+    def test_structure_is_shared(self):
+        s1 = Segment('PID')
+        s2 = Segment('PID')
+        self.assertIs(s1.structure_by_name, s2.structure_by_name)
+        self.assertIs(s1.ordered_children, s2.ordered_children)
+        info = ElementFinder.cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.currsize, 1)
+
+    def test_structure_is_read_only(self):
+        s = Segment('PID')
+        with self.assertRaises(TypeError):
+            s.structure_by_name['PID_1'] = None
+        with self.assertRaises(TypeError):
+            s.structure_by_name['PID_1']['name'] = 'PID_2'
+        with self.assertRaises(TypeError):
+            s.repetitions.update({'PID_1': (0, 1)})
+
+    def test_structure_depends_on_reference(self):
+        base_path = os.path.abspath(os.path.dirname(__file__))
+        mp = hl7apy.load_message_profile(os.path.join(base_path, 'profiles/iti_21'))
+        m1 = Message('RSP_K21', reference=mp)
+        m2 = Message('RSP_K21')
+        self.assertIsNot(m1.structure_by_name, m2.structure_by_name)
+        self.assertEqual(m1.reference, mp['RSP_K21'])
+
+    def test_cache_clear(self):
+        Segment('PID')
+        self.assertEqual(ElementFinder.cache_info().currsize, 1)
+        ElementFinder.cache_clear()
+        self.assertEqual(ElementFinder.cache_info(), (0, 0, ElementFinder.cache_maxsize, 0))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -23,11 +23,13 @@ from __future__ import absolute_import
 import unittest
 
 from datetime import datetime
-from hl7apy.base_datatypes import DT, TM, DTM, ST, FT, ID, IS, TX, GTS, NM, SI, TN
+from hl7apy import DEFAULT_ENCODING_CHARS, load_library
+from hl7apy.base_datatypes import DT, TM, DTM, ST, FT, ID, IS, TX, GTS, NM, SI, TN, get_escape_codec
 from hl7apy.v2_7 import ST as ST27, FT as FT27, ID as ID27, IS as IS27, TX as TX27, GTS as GTS27, SNM
-from hl7apy.factories import datatype_factory
+from hl7apy.factories import datatype_factory, _get_dispatch_table
 from hl7apy.exceptions import InvalidDateFormat, InvalidDateOffset, MaxLengthReached, \
     InvalidHighlightRange, InvalidDataType, InvalidMicrosecondsPrecision
+from hl7apy.utils import get_date_info, get_datetime_info, get_timestamp_info, set_datetime_cache_size
 from hl7apy.validation import VALIDATION_LEVEL
 from decimal import Decimal
 
@@ -48,6 +50,23 @@ class TestDatatypeFactory(unittest.TestCase):
     def test_datatype_not_allowed_value_creation_strict(self):
         self.assertRaises(ValueError, datatype_factory, 'TM', '999999', validation_level=VALIDATION_LEVEL.STRICT)
 
+    def test_datatype_factory_dispatch_table(self):
+        table = _get_dispatch_table('2.5', VALIDATION_LEVEL.TOLERANT)
+        self.assertIs(_get_dispatch_table('2.5', VALIDATION_LEVEL.TOLERANT), table)
+        self.assertIsNot(_get_dispatch_table('2.5', VALIDATION_LEVEL.STRICT), table)
+        self.assertEqual(sorted(table), sorted(load_library('2.5').get_base_datatypes()))
+
+        nm = datatype_factory('NM', '12.5', '2.5', VALIDATION_LEVEL.TOLERANT)
+        self.assertEqual((nm.classname, nm.value), ('NM', Decimal('12.5')))
+        # in tolerant mode invalid values become ST
+        for datatype, version in (('NM', '2.5'), ('SI', '2.5'), ('DT', '2.5'), ('TN', '2.4')):
+            dt = datatype_factory(datatype, 'invalid', version, VALIDATION_LEVEL.TOLERANT)
+            self.assertEqual((dt.classname, dt.value), ('ST', 'invalid'))
+            self.assertRaises(ValueError, datatype_factory, datatype, 'invalid', version, VALIDATION_LEVEL.STRICT)
+        st = datatype_factory('ST', 'x' * 1000, '2.5', VALIDATION_LEVEL.TOLERANT)
+        self.assertEqual(st.validation_level, VALIDATION_LEVEL.TOLERANT)
+        self.assertRaises(MaxLengthReached, datatype_factory, 'ST', 'x' * 1000, '2.5', VALIDATION_LEVEL.STRICT)
+
     def test_datatype_not_allowed_value_creation(self):
         datatype_factory('TM', '9999')
 
@@ -288,6 +307,28 @@ class TestDTM(unittest.TestCase):
         self.assertRaises(InvalidMicrosecondsPrecision, DTM, datetime.now(), microsec_precision=0)
         self.assertRaises(InvalidMicrosecondsPrecision, DTM, datetime.now(), microsec_precision=5)
 
+    def test_DTM_decoding(self):
+        values = (('2013', '%Y', ''), ('201307', '%Y%m', ''), ('20130715', '%Y%m%d', ''),
+                  ('2013071501', '%Y%m%d%H', ''), ('201307150101', '%Y%m%d%H%M', '-0500'),
+                  ('20130715010111', '%Y%m%d%H%M%S', '+1400'), ('20130715010111.12', '%Y%m%d%H%M%S.%f', ''))
+        for cache_size in (0, 1024):
+            set_datetime_cache_size(cache_size)
+            for value, fmt, offset in values:
+                dtm = datatype_factory('DTM', value + offset, validation_level=VALIDATION_LEVEL.STRICT)
+                self.assertEqual(dtm.value, datetime.strptime(value, fmt))
+                self.assertEqual((dtm.format, dtm.offset), (fmt, offset))
+                self.assertEqual(dtm.to_er7(), value + offset)
+            self.assertEqual(get_datetime_info('20130715010111.12'),
+                             (datetime(2013, 7, 15, 1, 1, 11, 120000), '%Y%m%d%H%M%S.%f', '', 2))
+            self.assertEqual(get_timestamp_info('010111.1+0100'),
+                             (datetime(1900, 1, 1, 1, 1, 11, 100000), '%H%M%S.%f', '+0100', 1))
+            for value in ('20131315', '2013071', '20130715+1500', '201307152401', '2013-07-15', ' 2013',
+                          '20130715010111.12345', '201307150101.12'):
+                self.assertRaises(ValueError, datatype_factory, 'DTM', value,
+                                  validation_level=VALIDATION_LEVEL.STRICT)
+            self.assertRaises(ValueError, get_timestamp_info, '0101.1+0100')
+            self.assertRaises(ValueError, get_date_info, '2013021')
+
 
 class TestST(unittest.TestCase):
 
@@ -715,5 +756,37 @@ class TestTN(unittest.TestCase):
         self.assertEqual(tn.to_er7(), '(111)999-999-222X111B222C\\R\\repetition\\R\\')
 
 
+class TestEscapeCodec(unittest.TestCase):
+
+    def test_codec_cache(self):
+        codec = get_escape_codec(DEFAULT_ENCODING_CHARS)
+        self.assertIs(get_escape_codec(dict(DEFAULT_ENCODING_CHARS)), codec)
+        self.assertIsNot(get_escape_codec(DEFAULT_ENCODING_CHARS, truncation=True), codec)
+        other_chars = dict(DEFAULT_ENCODING_CHARS, ESCAPE='/')
+        self.assertIsNot(get_escape_codec(other_chars), codec)
+        self.assertEqual(get_escape_codec(other_chars).escape('a|b/c/H/'), 'a/F/b/E/c/H/')
+
+    def test_escape(self):
+        codec = get_escape_codec(DEFAULT_ENCODING_CHARS)
+        value = 'plain text'
+        self.assertIs(codec.escape(value), value)
+        self.assertEqual(codec.escape('|^&~#'), '\\F\\\\S\\\\T\\\\R\\#')
+        self.assertEqual(codec.escape('\\H\\a\\b'), '\\H\\a\\E\\b')
+        codec = get_escape_codec(dict(DEFAULT_ENCODING_CHARS, TRUNCATION='#'), truncation=True)
+        self.assertEqual(codec.escape('|#'), '\\F\\\\L\\')
+
+    def test_unescape(self):
+        codec = get_escape_codec(DEFAULT_ENCODING_CHARS)
+        value = 'plain text'
+        self.assertIs(codec.unescape(value), value)
+        self.assertEqual(codec.unescape('\\F\\\\S\\\\T\\\\R\\\\E\\\\L\\'), '|^&~\\\\L\\')
+        self.assertEqual(codec.unescape('\\H\\bold\\N\\ \\X414243\\'), '\\H\\bold\\N\\ ABC')
+        self.assertEqual(codec.unescape('\\XC3A8\\', 'utf-8'), u'\xe8')
+        # invalid hexadecimal data is left untouched
+        self.assertEqual(codec.unescape('\\X4\\'), '\\X4\\')
+        for value in ('a|b^c&d~e\\f', '\\', '||'):
+            self.assertEqual(codec.unescape(codec.escape(value)), value)
+
+
 if __name__ == '__main__':
     unittest.main()
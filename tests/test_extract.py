@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import absolute_import
+import unittest
+
+from hl7apy.exceptions import InvalidPath, ParserError
+from hl7apy.base_datatypes import get_escape_codec
+from hl7apy.extract import PathExtractor, compile_path, extract, get_value
+from hl7apy.parser import parse_message
+from hl7apy.tokenizer import ER7Index
+
+MSG = 'MSH|^~\\&|GHH_ADT||||20080115153000||ORU^R01^ORU_R01|0123456789|P|2.5\r\n' \
+      'PID|1||566-554-3423^^^GHH^MR~123&A^^^HOSP||EVERYMAN^ADAM\\T\\EVE^A\r\n' \
+      'OBR|1|845439^GHH OE\r' \
+      'OBX|1|NM|GLUCOSE||182||||||F\r' \
+      'OBX|2|ST|NOTE||A \\F\\ B~C\\E\\D||||||F\r' \
+      'OBX|3|NM|BUN\r'
+
+
+class TestExtract(unittest.TestCase):
+
+    def test_paths(self):
+        values = extract(MSG, ['MSH-9.3', 'MSH-10', 'PID-3', 'PID-3(1).1', 'PID-3(2).1', 'PID-3(2).1.2',
+                               'PID-3(*).4', 'PID-5.2', 'PID-5', 'OBX-5', 'OBX[2]-5(*)', 'OBX[*]-5',
+                               'OBX[*]-11', 'obx[3]-3', 'OBX[4]-1', 'OBR-2.3', 'PV1-2', 'PV1[*]-2'])
+        self.assertEqual(values, {
+            'MSH-9.3': 'ORU_R01',
+            'MSH-10': '0123456789',
+            'PID-3': '566-554-3423^^^GHH^MR',
+            'PID-3(1).1': '566-554-3423',
+            'PID-3(2).1': '123&A',
+            'PID-3(2).1.2': 'A',
+            'PID-3(*).4': ['GHH', 'HOSP'],
+            'PID-5.2': 'ADAM&EVE',
+            'PID-5': 'EVERYMAN^ADAM\\T\\EVE^A',
+            'OBX-5': '182',
+            'OBX[2]-5(*)': ['A | B', 'C\\D'],
+            'OBX[*]-5': ['182', 'A | B'],
+            'OBX[*]-11': ['F', 'F'],
+            'obx[3]-3': 'BUN',
+            'OBX[4]-1': None,
+            'OBR-2.3': None,
+            'PV1-2': None,
+            'PV1[*]-2': [],
+        })
+
+        msg = MSG.replace('\n', '')
+        pid = parse_message(msg).oru_r01_patient_result.oru_r01_patient.pid
+        self.assertEqual(extract(msg, ['PID-3'])['PID-3'], pid.pid_3.to_er7())
+
+    def test_msh_fields(self):
+        msg = MSG.replace('|', '!').replace('^', '$')
+        values = extract(msg, ['MSH-1', 'MSH-2', 'MSH-3', 'MSH-9.2', 'PID-5.2'])
+        self.assertEqual(values, {'MSH-1': '!', 'MSH-2': '$~\\&', 'MSH-3': 'GHH_ADT', 'MSH-9.2': 'R01',
+                                  'PID-5.2': 'ADAM&EVE'})
+
+    def test_unescape(self):
+        extractor = PathExtractor(['OBX[2]-5', 'PID-5.2'], unescape=False)
+        self.assertEqual(extractor.extract(MSG), {'OBX[2]-5': 'A \\F\\ B', 'PID-5.2': 'ADAM\\T\\EVE'})
+        msg = 'MSH|^~\\&#|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|1|P|2.7\rPID|1||\\L\\1\\X41\\'
+        self.assertEqual(extract(msg, ['PID-3'])['PID-3'], '#1A')
+
+    def test_get_value(self):
+        index = ER7Index(MSG)
+        codec = get_escape_codec(index.encoding_chars)
+        path = compile_path('OBX[3]-5')
+        self.assertTrue(path.explicit_segment_rep)
+        self.assertFalse(compile_path('OBX-5').explicit_segment_rep)
+        self.assertTrue(compile_path('OBX[*]-5').explicit_segment_rep)
+        # the repetition of the segment is ignored
+        self.assertEqual([get_value(path, index, s, codec) for s in index.find_segments('OBX')],
+                         ['182', 'A | B', None])
+        self.assertEqual(get_value(path, index, index.find_segments('OBX')[1]), 'A \\F\\ B')
+        self.assertEqual(get_value(compile_path('MSH-2'), index, 0), '^~\\&')
+        self.assertRaises(InvalidPath, get_value, compile_path('OBX-5(*)'), index, 3)
+
+    def test_invalid(self):
+        for path in ('PID', 'PID.3', 'PID-0', 'PID-3(0)', 'PID[x]-3', 'PID-3.1.2.3', 'PI-3'):
+            self.assertRaises(InvalidPath, compile_path, path)
+            self.assertRaises(InvalidPath, PathExtractor, ['MSH-10', path])
+        self.assertRaises(ParserError, extract, 'PID|1', ['PID-1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import absolute_import
+import logging
+import unittest
+
+from hl7apy.instrumentation import Sink, LoggingSink, PrometheusSink, get_sink, set_sink, instrumented
+from hl7apy.parser import parse_message, parse_segment, set_segment_cache_size
+
+MSG = 'MSH|^~\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|0123456789|P|2.5\r' \
+      'EVN||20080115153000\r' \
+      'PID|1||566-554-3423^^^GHH^MR||EVERYMAN^ADAM^A\r' \
+      'NK1|1|EVERYWOMAN^EVE|SPO\r' \
+      'NK1|2|EVERYMAN^ABEL|SON\r' \
+      'PV1|1|I'
+
+
+class _ListSink(Sink):
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, stage, key, elapsed):
+        self.events.append((stage, key))
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def tearDown(self):
+        set_sink(None)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(get_sink())
+        sink = _ListSink()
+        with instrumented(sink) as s:
+            self.assertIs(s, sink)
+            self.assertIs(get_sink(), sink)
+        self.assertIsNone(get_sink())
+        parse_message(MSG)
+        self.assertEqual(sink.events, [])
+
+    def test_stats(self):
+        with instrumented() as stats:
+            m = parse_message(MSG)
+            m.validate(return_errors=True)
+        calls = dict(((s.stage, s.key), s.calls) for s in stats.stage_stats())
+        self.assertEqual(calls[('parse_message', 'ADT_A01')], 1)
+        self.assertEqual(calls[('parse_segments', None)], 1)
+        self.assertEqual(calls[('parse_segment', 'NK1')], 2)
+        self.assertEqual(calls[('parse_fields', 'NK1')], 2)
+        self.assertEqual(calls[('parse_components', 'XPN')], 3)
+        self.assertEqual(calls[('validate', 'ADT_A01')], 1)
+        self.assertGreater(calls[('datatype_factory', 'ST')], 0)
+        self.assertTrue(all(s.total_time >= 0 for s in stats.stage_stats()))
+
+        elements = stats.elements_stats()
+        self.assertEqual([(e.structure, e.messages) for e in elements], [('ADT_A01', 1)])
+        self.assertEqual(elements[0].elements, sum(1 for _ in _iter_elements(m)))
+
+        stats.reset()
+        self.assertEqual(stats.stage_stats(), [])
+        self.assertEqual(stats.elements_stats(), [])
+
+    def test_lazy_parsing(self):
+        with instrumented() as stats:
+            m = parse_message(MSG, lazy=True)
+        self.assertTrue(all(s.is_lazy() for s in m.children))
+        # the fields of the lazy segments are not parsed just to be counted
+        self.assertEqual(stats.elements_stats()[0].elements, 1 + len(m.children))
+
+        set_segment_cache_size(10)
+        try:
+            parse_message(MSG)
+            with instrumented():
+                m = parse_message(MSG)
+            # the segments taken from the cache still copy their children only when they are accessed
+            self.assertTrue(all(s.is_lazy() for s in m.children))
+        finally:
+            set_segment_cache_size(0)
+
+    def test_logging_sink(self):
+        logger = logging.getLogger('hl7apy.tests.instrumentation')
+        records = []
+        handler = _ListHandler(records)
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        try:
+            with instrumented(LoggingSink(logger, logging.INFO)):
+                parse_segment('PID|1||566-554-3423^^^GHH^MR')
+        finally:
+            logger.removeHandler(handler)
+        self.assertTrue(any(r.startswith('parse_segment PID: ') for r in records))
+        self.assertTrue(any(r.startswith('parse_components CX: ') for r in records))
+
+    def test_prometheus_export(self):
+        sink = PrometheusSink()
+        sink.record('parse_segment', 'PID', 0.25)
+        sink.record('parse_segment', 'PID', 0.25)
+        sink.record('parse_segments', None, 1.0)
+        sink.record_elements('ADT_A01', 10)
+        sink.record_elements('"Z\\01"', 3)
+        lines = sink.export(prefix='hl7').splitlines()
+        self.assertIn('# TYPE hl7_stage_calls_total counter', lines)
+        self.assertIn('hl7_stage_calls_total{stage="parse_segment",key="PID"} 2', lines)
+        self.assertIn('hl7_stage_seconds_total{stage="parse_segment",key="PID"} 0.5', lines)
+        self.assertIn('hl7_stage_seconds_total{stage="parse_segments",key=""} 1.0', lines)
+        self.assertIn('hl7_messages_total{structure="ADT_A01"} 1', lines)
+        self.assertIn('hl7_message_elements_total{structure="ADT_A01"} 10', lines)
+        self.assertIn('hl7_message_elements_total{structure="\\"Z\\\\01\\""} 3', lines)
+
+
+class _ListHandler(logging.Handler):
+
+    def __init__(self, records):
+        super(_ListHandler, self).__init__()
+        self.records = records
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+
+
+def _iter_elements(element):
+    yield element
+    for child in element.children:
+        for e in _iter_elements(child):
+            yield e
+
+
+if __name__ == '__main__':
+    unittest.main()
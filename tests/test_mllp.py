@@ -24,8 +24,11 @@ import socket
 import unittest
 from threading import Thread
 
-from hl7apy.mllp import MLLPServer, AbstractHandler
-from hl7apy.mllp import InvalidHL7Message, UnsupportedMessageType
+from hl7apy.consts import VALIDATION_LEVEL
+from hl7apy.exceptions import ParserError
+from hl7apy.mllp import MLLPServer, AbstractHandler, MLLPFrameReader, build_ack
+from hl7apy.mllp import InvalidHL7Message, UnsupportedMessageType, MLLPFrameError
+from hl7apy.parser import parse_message
 
 
 HOST = 'localhost'
@@ -72,6 +75,18 @@ class ErrorHandler(AbstractHandler):
             return UNSUPPORTED_MESSAGE
 
 
+class EchoPIDHandler(AbstractHandler):
+
+    def reply(self):
+        return self.incoming_message.split('\r')[-1]
+
+
+class ACKHandler(AbstractHandler):
+
+    def reply(self):
+        return self.ack(control_id='ACK1')
+
+
 class CustomArgsPDQHandler(AbstractHandler):
 
     def __init__(self, msg, is_pdqv):
@@ -84,8 +99,8 @@ class CustomArgsPDQHandler(AbstractHandler):
         return PDQ_RES
 
 
-def launch_server(host, port, handlers):
-    server = MLLPServer(host, port, handlers, timeout=3)
+def launch_server(host, port, handlers, **kwargs):
+    server = MLLPServer(host, port, handlers, timeout=3, **kwargs)
     thread = Thread(target=server.serve_forever)
     thread.daemon = True
     thread.start()
@@ -105,6 +120,8 @@ class TestMLLPWithErrorHandler(unittest.TestCase):
         handlers = {
             'QBP^Q22^QBP_Q21': (PDQHandler,),
             'QBP^ZV1^QBP_Q21': (CustomArgsPDQHandler, True),
+            'ADT^A01^ADT_A01': (EchoPIDHandler,),
+            'ADT^A04^ADT_A01': (ACKHandler,),
             'ERR': (ErrorHandler,)
         }
         cls.server, cls.thread = launch_server(HOST, PORT, handlers)
@@ -113,12 +130,15 @@ class TestMLLPWithErrorHandler(unittest.TestCase):
     def tearDownClass(cls):
         stop_server(cls.server, cls.thread)
 
-    def _client(self, msg):
+    def _client(self, msg, close_write=True):
         # establish the connection
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
             sock.connect((HOST, PORT))
-            sock.sendall(msg.encode('utf-8'))
+            sock.sendall(msg if isinstance(msg, bytes) else msg.encode('utf-8'))
+            if close_write:
+                # connections are persistent: tell the server that no more messages will be sent
+                sock.shutdown(socket.SHUT_WR)
             res = []
             while True:
                 received = sock.recv(1)
@@ -150,9 +170,50 @@ class TestMLLPWithErrorHandler(unittest.TestCase):
         res = self._client(msg)
         self.assertEqual(res, UNSUPPORTED_MESSAGE)
 
+    def test_message_charset(self):
+        pid = u'PID|1||||M\xdcLLER^\u0141UKASZ'
+        msg = u'MSH|^~\\&|||||20110708163513||ADT^A01^ADT_A01|1|P|2.5||||||{}\r' + pid
+        for charset, encoding in (('8859/2', 'iso8859_2'), ('UNICODE UTF-8', 'utf-8'), ('', 'utf-8')):
+            frame = b'\x0b' + msg.format(charset).encode(encoding) + b'\x1c\x0d'
+            self.assertEqual(self._client(frame), pid)
+
+    def test_ack(self):
+        msg = '\x0bMSH|^~\\&|SND|SFAC|RCV|RFAC|20110708163513||ADT^A04^ADT_A01|MSG1|P|2.5\rPID|1\x1c\x0d'
+        res = self._client(msg)
+        self.assertTrue(res.startswith('\x0bMSH|^~\\&|RCV|RFAC|SND|SFAC|'))
+        self.assertTrue(res.endswith('||ACK^A04^ACK|ACK1|P|2.5\rMSA|AA|MSG1\r\x1c\x0d'))
+
     def test_timeout(self):
         msg = '\x0b{}\x1c'.format(PDQ_REQ)
-        res = self._client(msg)
+        res = self._client(msg, close_write=False)
+        self.assertEqual(res, '')
+
+    def test_persistent_connection(self):
+        msg = '\x0b{}\x1c\x0d'.format(PDQ_REQ)
+        msg_with_args = '\x0b{}\x1c\x0d'.format(PDQV_REQ)
+        res = self._client(msg * 3 + msg_with_args + msg)
+        self.assertEqual(res, PDQ_RES * 3 + PDQV_RES + PDQ_RES)
+
+    def test_messages_split_across_reads(self):
+        msg = ('\x0b{}\x1c\x0d'.format(PDQ_REQ) * 2).encode('utf-8')
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect((HOST, PORT))
+            for i in range(0, len(msg), 7):
+                sock.sendall(msg[i:i + 7])
+            res = b''
+            while len(res) < len(PDQ_RES) * 2:
+                received = sock.recv(1024)
+                if not received:
+                    break
+                res += received
+        finally:
+            sock.close()
+        self.assertEqual(res.decode('utf-8'), PDQ_RES * 2)
+
+    def test_not_mllp_frame(self):
+        msg = 'MSH|^~\\&|\x1c\x0d'
+        res = self._client(msg, close_write=False)
         self.assertEqual(res, '')
 
 
@@ -169,12 +230,15 @@ class TestMLLPWithoutErrorHandler(unittest.TestCase):
     def tearDownClass(cls):
         stop_server(cls.server, cls.thread)
 
-    def _client(self, msg):
+    def _client(self, msg, close_write=True):
         # establish the connection
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
             sock.connect((HOST, PORT + 1))
             sock.sendall(msg.encode('utf-8'))
+            if close_write:
+                # connections are persistent: tell the server that no more messages will be sent
+                sock.shutdown(socket.SHUT_WR)
             res = []
             while True:
                 received = sock.recv(1)
@@ -203,12 +267,147 @@ class TestMLLPWithoutErrorHandler(unittest.TestCase):
 
     def test_timeout(self):
         msg = '\x0b{}\x1c'.format(PDQ_REQ)
+        res = self._client(msg, close_write=False)
+        self.assertEqual(res, '')
+
+
+class TestMLLPMaxFrameSize(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        handlers = {
+            'QBP^Q22^QBP_Q21': (PDQHandler,)
+        }
+        cls.server, cls.thread = launch_server(HOST, PORT + 2, handlers, max_frame_size=len(PDQ_REQ) + 3)
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_server(cls.server, cls.thread)
+
+    def _client(self, msg):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect((HOST, PORT + 2))
+            sock.sendall(msg.encode('utf-8'))
+            res = []
+            while True:
+                received = sock.recv(1024)
+                if not received:
+                    break
+                res.append(received)
+        finally:
+            sock.close()
+
+        return b''.join(res).decode('utf-8')
+
+    def test_frame_within_limit(self):
+        msg = '\x0b{}\x1c\x0d'.format(PDQ_REQ)
+        # the connection is closed by the server when it receives the too long frame
+        res = self._client(msg + '\x0b{}\x1c\x0d'.format(PDQ_REQ + 'X'))
+        self.assertEqual(res, PDQ_RES)
+
+    def test_frame_too_long(self):
+        msg = '\x0b{}\x1c\x0d'.format(PDQ_REQ + '\r')
         res = self._client(msg)
         self.assertEqual(res, '')
 
 
+class TestBuildACK(unittest.TestCase):
+
+    def test_ack(self):
+        ack = build_ack(PDQ_REQ, mllp=False)
+        msg = parse_message(ack, validation_level=VALIDATION_LEVEL.STRICT)
+        self.assertEqual(msg.name, 'ACK')
+        self.assertTrue(msg.validate())
+        self.assertEqual([msg.msh.children.get(f).to_er7() for f in ('MSH_3', 'MSH_4', 'MSH_5', 'MSH_6')],
+                         ['SENDING APP', 'SENTING FAC', 'REC APP', 'REC FAC'])
+        self.assertEqual(msg.msh.msh_9.to_er7(), 'ACK^Q22^ACK')
+        self.assertEqual(len(msg.msh.msh_7.to_er7()), 14)
+        self.assertNotEqual(msg.msh.msh_10.to_er7(), '')
+        self.assertEqual(msg.msh.msh_11.to_er7(), 'D')
+        self.assertEqual(msg.msh.msh_12.to_er7(), '2.5')
+        self.assertEqual(msg.msa.to_er7(), 'MSA|AA|1')
+
+        mllp_ack = build_ack(PDQ_REQ.encode('utf-8'), control_id='ACK1')
+        self.assertTrue(mllp_ack.startswith('\x0bMSH|'))
+        self.assertTrue(mllp_ack.endswith('|ACK1|D|2.5\rMSA|AA|1\r\x1c\x0d'))
+
+    def test_errors(self):
+        ack = build_ack(PDQ_REQ, 'AR', 'Unknown |field|',
+                        [('', '', '207^Application internal error^HL70357', 'E'),
+                         ('', '', '206^Application record locked^HL70357', 'W')], mllp=False)
+        self.assertEqual(ack.split('\r')[1:], ['MSA|AR|1|Unknown \\F\\field\\F\\',
+                                               'ERR|||207^Application internal error^HL70357|E',
+                                               'ERR|||206^Application record locked^HL70357|W'])
+        self.assertTrue(parse_message(ack).validate())
+
+    def test_message_type(self):
+        msg = 'MSH#$~\\&#A#B#C#D#20110708163513##ADT$A01#MSG1#P#{0}'
+        self.assertEqual(build_ack(msg.format('2.5'), mllp=False).split('#')[8], 'ACK$A01$ACK')
+        self.assertEqual(build_ack(msg.format('2.3'), mllp=False).split('#')[8], 'ACK$A01')
+        self.assertEqual(build_ack(msg.format('2.10'), mllp=False).split('#')[8], 'ACK$A01$ACK')
+        self.assertEqual(build_ack(msg.format('2.3.1$ITA'), mllp=False).split('#')[8], 'ACK$A01$ACK')
+        ack = build_ack('MSH|^~\\&|||||||ACK|1', control_id='2', mllp=False)
+        self.assertEqual([s.split('|')[8:] for s in ack.split('\r')], [['ACK', '2', '', ''], []])
+        self.assertEqual(ack.split('\r')[1], 'MSA|AA|1')
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, build_ack, PDQ_REQ, 'OK')
+        self.assertRaises(ParserError, build_ack, 'PID|1')
+        # the values are escaped or checked, so they can't add fields or segments
+        ack = build_ack(PDQ_REQ, 'AE', 'Line 1\r\nLine 2', control_id='A|1\r', mllp=False)
+        self.assertEqual(ack.split('\r')[0].split('|')[9], 'A\\F\\1\\X0D\\')
+        self.assertEqual(ack.split('\r')[1], 'MSA|AE|1|Line 1\\X0D\\\\X0A\\Line 2')
+        for value in ('A|B', 'A\rB', 'A\nB'):
+            self.assertRaises(ValueError, build_ack, PDQ_REQ, 'AE', errors=[('', '', value)])
+
+
+class TestMLLPFrameReader(unittest.TestCase):
+
+    def test_single_frame(self):
+        reader = MLLPFrameReader()
+        self.assertEqual(list(reader.feed(b'\x0bMSH|1\x1c\x0d')), [b'MSH|1'])
+        self.assertFalse(reader.has_partial_frame())
+
+    def test_multiple_frames(self):
+        reader = MLLPFrameReader()
+        frames = list(reader.feed(b'\x0bMSH|1\x1c\x0d\x0bMSH|2\x1c\x0d\x0bMSH|3'))
+        self.assertEqual(frames, [b'MSH|1', b'MSH|2'])
+        self.assertTrue(reader.has_partial_frame())
+        self.assertEqual(list(reader.feed(b'\x1c\x0d')), [b'MSH|3'])
+        self.assertFalse(reader.has_partial_frame())
+
+    def test_byte_by_byte(self):
+        reader = MLLPFrameReader()
+        data = b'\x0bMSH|1\rPID|\x1c\x0d\x0b\x1cMSH|2\x1c\x0d'
+        frames = []
+        for i in range(len(data)):
+            frames.extend(reader.feed(data[i:i + 1]))
+        self.assertEqual(frames, [b'MSH|1\rPID|', b'\x1cMSH|2'])
+
+    def test_invalid_start_block(self):
+        reader = MLLPFrameReader()
+        self.assertRaises(MLLPFrameError, list, reader.feed(b'MSH|1\x1c\x0d'))
+        reader = MLLPFrameReader()
+        frames = reader.feed(b'\x0bMSH|1\x1c\x0dMSH|2')
+        # the frames preceding the error are returned anyway
+        self.assertEqual(next(frames), b'MSH|1')
+        self.assertRaises(MLLPFrameError, next, frames)
+
+    def test_max_frame_size(self):
+        reader = MLLPFrameReader(max_frame_size=8)
+        self.assertEqual(list(reader.feed(b'\x0bMSH|1\x1c\x0d')), [b'MSH|1'])
+        self.assertRaises(MLLPFrameError, list, reader.feed(b'\x0bMSH|12\x1c\x0d'))
+        reader = MLLPFrameReader(max_frame_size=8)
+        self.assertEqual(list(reader.feed(b'\x0bMSH|')), [])
+        self.assertRaises(MLLPFrameError, list, reader.feed(b'1234'))
+
+
 if __name__ == '__main__':
     suite = unittest.TestSuite()
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestMLLPWithErrorHandler))
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestMLLPWithoutErrorHandler))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestMLLPMaxFrameSize))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestBuildACK))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestMLLPFrameReader))
     unittest.TextTestRunner().run(suite)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import absolute_import
+import asyncio
+import unittest
+
+from hl7apy.mllp import AbstractHandler, AbstractErrorHandler, MLLPFrameReader
+from hl7apy.mllp import InvalidHL7Message, UnsupportedMessageType
+from hl7apy.mllp_aio import AsyncMLLPServer, AsyncMLLPClient
+from hl7apy.parser import parse_message
+
+
+HOST = 'localhost'
+
+ADT_TPL = 'MSH|^~\\&|SND APP|SND FAC|REC APP|REC FAC|20110708163513||ADT^A01^ADT_A01|{}|P|2.5\r' \
+          'PID|1||123^^^HOSP||SMITH^JOHN'
+
+ACK_TPL = 'MSH|^~\\&|REC APP|REC FAC|SND APP|SND FAC|20110708163514||ACK^A01^ACK|ACK{0}|P|2.5\r' \
+          'MSA|{1}|{0}'
+
+INVALID_MESSAGE = 'INVALID MESSAGE'
+UNSUPPORTED_MESSAGE = 'UNSUPPORTED MESSAGE'
+
+
+def _get_control_id(msg):
+    return msg.split('\r')[0].split('|')[9]
+
+
+def _mllp(msg):
+    return '\x0b{}\x1c\x0d'.format(msg)
+
+
+class ACKHandler(AbstractHandler):
+
+    async def reply(self):
+        await asyncio.sleep(0)
+        return _mllp(ACK_TPL.format(_get_control_id(self.incoming_message), 'AA'))
+
+
+class SyncACKHandler(AbstractHandler):
+
+    def __init__(self, msg, ack_code):
+        super(SyncACKHandler, self).__init__(msg)
+        self.ack_code = ack_code
+
+    def reply(self):
+        return _mllp(ACK_TPL.format(_get_control_id(self.incoming_message), self.ack_code))
+
+
+class ErrorHandler(AbstractErrorHandler):
+
+    async def reply(self):
+        if isinstance(self.exc, InvalidHL7Message):
+            return _mllp(INVALID_MESSAGE)
+        elif isinstance(self.exc, UnsupportedMessageType):
+            return _mllp(UNSUPPORTED_MESSAGE)
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class TestAsyncMLLP(unittest.TestCase):
+
+    handlers = {
+        'ADT^A01^ADT_A01': (ACKHandler,),
+        'ADT^A04^ADT_A01': (SyncACKHandler, 'AE'),
+        'ERR': (ErrorHandler,)
+    }
+
+    def _run_with_server(self, test, handlers=None, **kwargs):
+        async def _run():
+            server = AsyncMLLPServer(HOST, 0, handlers or self.handlers, **kwargs)
+            await server.start()
+            try:
+                return await test(server.port)
+            finally:
+                server.close()
+                await server.wait_closed()
+        return run(_run())
+
+    def test_async_handler(self):
+        async def test(port):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                return await client.send_message(ADT_TPL.format('1'))
+        self.assertEqual(self._run_with_server(test), ACK_TPL.format('1', 'AA'))
+
+    def test_sync_handler_with_args(self):
+        async def test(port):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                msg = parse_message(ADT_TPL.format('2').replace('A01^ADT_A01', 'A04^ADT_A01'))
+                return await client.send_message(msg)
+        self.assertEqual(self._run_with_server(test), ACK_TPL.format('2', 'AE'))
+
+    def test_bytes_message(self):
+        async def test(port):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                return await client.send_message(ADT_TPL.format('7').encode('utf-8'))
+        self.assertEqual(self._run_with_server(test), ACK_TPL.format('7', 'AA'))
+
+    def test_invalid_message_type(self):
+        async def test(port):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                await client.send_message(42)
+        self.assertRaises(TypeError, self._run_with_server, test)
+
+    def test_error_handler(self):
+        async def test(port):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                unsupported = await client.send_message(ADT_TPL.format('3').replace('ADT^A01', 'ADT^A08'))
+                good = await client.send_message(ADT_TPL.format('4'))
+                return unsupported, good
+        self.assertEqual(self._run_with_server(test), (UNSUPPORTED_MESSAGE, ACK_TPL.format('4', 'AA')))
+
+    def test_unsupported_message_without_error_handler(self):
+        async def test(port):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                await client.send_message(ADT_TPL.format('5').replace('ADT^A01', 'ADT^A08'))
+        handlers = {'ADT^A01^ADT_A01': (ACKHandler,)}
+        self.assertRaises(ConnectionError, self._run_with_server, test, handlers)
+
+    def test_pipelining(self):
+        async def test(port):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                return await client.send_message_batch(ADT_TPL.format(i) for i in range(100))
+        res = self._run_with_server(test)
+        self.assertEqual(res, [ACK_TPL.format(i, 'AA') for i in range(100)])
+
+    def test_concurrent_connections(self):
+        async def _send(port, i):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                return await client.send_message_batch(ADT_TPL.format('{}-{}'.format(i, j)) for j in range(5))
+
+        async def test(port):
+            return await asyncio.gather(*[_send(port, i) for i in range(50)])
+
+        res = self._run_with_server(test)
+        self.assertEqual(res, [[ACK_TPL.format('{}-{}'.format(i, j), 'AA') for j in range(5)] for i in range(50)])
+
+    def test_idle_timeout(self):
+        async def test(port):
+            async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                await asyncio.sleep(0.5)
+                await client.send_message(ADT_TPL.format('6'))
+        self.assertRaises(ConnectionError, self._run_with_server, test, timeout=0.1)
+
+    def test_responses_matched_by_control_id(self):
+        # a server that answers the messages in reverse order
+        async def handle(reader, writer):
+            frame_reader = MLLPFrameReader()
+            frames = []
+            while len(frames) < 3:
+                frames.extend(frame_reader.feed(await reader.read(1024)))
+            for frame in reversed(frames):
+                control_id = _get_control_id(frame.decode('utf-8'))
+                writer.write(_mllp(ACK_TPL.format(control_id, 'AA')).encode('utf-8'))
+            await writer.drain()
+            writer.close()
+
+        async def test():
+            server = await asyncio.start_server(handle, HOST, 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                async with AsyncMLLPClient(HOST, port, timeout=5) as client:
+                    return await client.send_message_batch(ADT_TPL.format(i) for i in range(3))
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        self.assertEqual(run(test()), [ACK_TPL.format(i, 'AA') for i in range(3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
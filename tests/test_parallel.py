@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import absolute_import
+import threading
+import unittest
+
+from hl7apy import load_reference
+from hl7apy.core import Message
+from hl7apy.exceptions import ParserError, ValidationError
+from hl7apy.parallel import ParallelParser, parse_messages, OUTPUTS
+from hl7apy.parser import parse_message
+
+MSG_TPL = 'MSH|^~\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|{0}|P|2.5\r' \
+          'EVN||20080115153000\r' \
+          'PID|1||566-554-3423^^^GHH^MR||EVERYMAN^ADAM^A|||M|||2222 HOME STREET^^ANN ARBOR^MI^^USA\r' \
+          'PV1|1|I|{0}'
+
+INVALID_MSG = 'MSH|^~\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|1|P|2.5\rEVN||20080115153000'
+
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [MSG_TPL.format(i) for i in range(50)]
+
+    def test_ordered_messages(self):
+        results = list(parse_messages(iter(self.messages), processes=2, chunksize=3, max_pending_chunks=2))
+        self.assertEqual([r.index for r in results], list(range(50)))
+        for r, msg in zip(results, self.messages):
+            self.assertIsInstance(r.message, Message)
+            self.assertEqual(r.message.to_er7(), parse_message(msg).to_er7())
+            self.assertIsNone(r.report)
+            self.assertIsNone(r.error)
+        # the references are the ones of the library, not copies
+        self.assertIs(results[0].message.reference, load_reference('ADT_A01', 'Message', '2.5'))
+        self.assertEqual(results[3].message.pid.pid_5.xpn_2.to_er7(), 'ADAM')
+
+    def test_lazy_messages(self):
+        results = list(parse_messages(self.messages, processes=2, lazy=True))
+        self.assertTrue(results[1].message.pid.is_lazy())
+        self.assertEqual(results[1].message.to_er7(), self.messages[1])
+        self.assertEqual(results[1].message.pv1.pv1_3.to_er7(), '1')
+        self.assertFalse(results[1].message.pv1.is_lazy())
+
+        results = list(parse_messages(self.messages, processes=2, lazy=True, validate=True))
+        self.assertTrue(all(r.report.is_valid for r in results))
+
+    def test_unordered_er7(self):
+        with ParallelParser(processes=2, chunksize=4, output='er7', validate=True) as parser:
+            results = list(parser.parse(self.messages, ordered=False))
+        self.assertEqual(sorted(r.index for r in results), list(range(50)))
+        for r in results:
+            self.assertEqual(r.message, parse_message(self.messages[r.index]).to_er7())
+            self.assertTrue(r.report.is_valid)
+
+    def test_errors(self):
+        messages = [self.messages[0], 'NOT HL7', INVALID_MSG]
+        results = list(parse_messages(messages, processes=2, output='er7', validate=True))
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].message)
+        self.assertIsInstance(results[1].error, ParserError)
+        self.assertFalse(results[2].report.is_valid)
+        self.assertIsInstance(results[2].report.errors[0], ValidationError)
+        self.assertEqual([str(e) for e in results[2].report.errors],
+                         [str(e) for e in parse_message(INVALID_MSG).validate(return_errors=True).errors])
+
+    def test_chunk_errors(self):
+        # a chunk that can't be sent to the workers raises an error instead of blocking the results
+        for ordered in (True, False):
+            results = parse_messages([self.messages[0], threading.Lock()], processes=1, ordered=ordered)
+            self.assertRaises(TypeError, list, results)
+        # a message that is not a string fails alone
+        for output in OUTPUTS:
+            results = list(parse_messages([self.messages[0], 42, self.messages[1]], processes=1, output=output,
+                                          ordered=False))
+            self.assertEqual(sorted(r.index for r in results if r.error is None), [0, 2])
+            self.assertEqual([r.index for r in results if r.error is not None], [1])
+
+    def test_invalid_options(self):
+        self.assertRaises(ValueError, ParallelParser, processes=1, output='xml')
+        self.assertRaises(ValueError, ParallelParser, processes=1, chunksize=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
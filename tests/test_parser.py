@@ -22,15 +22,23 @@
 from __future__ import absolute_import
 
 import importlib
+import io
+import mmap
 import os
+import subprocess
+import sys
+import tempfile
 import unittest
 
 import hl7apy
 from hl7apy.parser import parse_message, parse_segments, parse_segment, parse_fields, parse_field, \
-    parse_components, parse_component, parse_subcomponents, get_message_type
+    parse_components, parse_component, parse_subcomponents, get_message_type, parse_batch, \
+    set_segment_cache_size, segment_cache_info, segment_cache_clear, decode_message, _get_segment_paths
+from hl7apy.core import Message, Segment, Field, ElementFinder
+from hl7apy.consts import CHARSETS
 from hl7apy.validation import VALIDATION_LEVEL
 from hl7apy.exceptions import ParserError, OperationNotAllowed, InvalidEncodingChars, InvalidName, \
-    ValidationError, MaxChildLimitReached
+    ValidationError, MaxChildLimitReached, UnsupportedVersion, ChildNotFound
 
 
 class TestParser(unittest.TestCase):
@@ -174,6 +182,252 @@ class TestParser(unittest.TestCase):
         msg = self._get_multiple_segments_groups_message()
         parse_message(msg)
 
+    def test_parse_message_nested_groups(self):
+        msg = 'MSH|^~\\&|A|B|C|D|20110708163513||ORU^R01^ORU_R01|1|P|2.5\r' \
+              'PID|1\rPV1|1\rORC|1\rOBR|1\rOBX|1\rOBX|2\rNTE|1\rOBR|2\rOBX|3\rDSC|1'
+
+        m = parse_message(msg)
+        self.assertEqual([c.name for c in m.children], ['MSH', 'ORU_R01_PATIENT_RESULT', 'DSC'])
+        result = m.oru_r01_patient_result
+        self.assertEqual(result.oru_r01_patient.pid.to_er7(), 'PID|1')
+        self.assertEqual(result.oru_r01_patient.oru_r01_visit.pv1.to_er7(), 'PV1|1')
+        observations = result.oru_r01_order_observation
+        self.assertEqual(len(observations), 2)
+        self.assertEqual(observations[0].orc.to_er7(), 'ORC|1')
+        self.assertEqual([o.obx.to_er7() for o in observations[0].oru_r01_observation], ['OBX|1', 'OBX|2'])
+        self.assertEqual(observations[0].oru_r01_observation[1].nte.to_er7(), 'NTE|1')
+        self.assertEqual(observations[1].obr.to_er7(), 'OBR|2')
+        self.assertEqual(observations[1].oru_r01_observation.obx.to_er7(), 'OBX|3')
+
+    def test_segment_paths(self):
+        ref = hl7apy.load_reference('ORU_R01', 'Message', '2.5')
+        paths = _get_segment_paths(ref)
+        self.assertIs(_get_segment_paths(ref), paths)
+        groups_path, segment_ref = paths['OBX']
+        self.assertEqual([g[0] for g in groups_path],
+                         ['ORU_R01_PATIENT_RESULT', 'ORU_R01_ORDER_OBSERVATION', 'ORU_R01_OBSERVATION'])
+        self.assertEqual(segment_ref[0], 'sequence')
+        # a segment child of the group wins over the ones inside the children groups
+        self.assertEqual(paths['DSC'][0], ())
+        self.assertEqual([g[0] for g in paths['NTE'][0]], ['ORU_R01_PATIENT_RESULT', 'ORU_R01_PATIENT'])
+        self.assertNotIn('ZZZ', paths)
+        # the paths are computed again after the structures cache is cleared
+        ElementFinder.cache_clear()
+        self.assertIsNot(_get_segment_paths(ref), paths)
+        self.assertEqual(_get_segment_paths(ref), paths)
+
+    def _get_batch(self, batch_count='1', message_count='2', sep='\r'):
+        msg_tpl = 'MSH|^~\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|{}|P|2.5{}PID|1||{}^^^GHH^MR||RÖSSI^MARIO'
+        return sep.join(['FHS|^~\\&|GHH', 'BHS|^~\\&|GHH',
+                         msg_tpl.format('1', sep, '566-554-3423'), msg_tpl.format('2', sep, '123-456-789'),
+                         'BTS|{}'.format(message_count), 'FTS|{}'.format(batch_count)]) + sep
+
+    def test_parse_batch(self):
+        messages = list(parse_batch(self._get_batch()))
+        self.assertEqual(len(messages), 2)
+        self.assertEqual([m.msh.msh_10.to_er7() for m in messages], ['1', '2'])
+        self.assertEqual(messages[1].pid.pid_3.cx_1.to_er7(), '123-456-789')
+        self.assertEqual(messages[0].to_er7().split('\r')[-1], 'PID|1||566-554-3423^^^GHH^MR||RÖSSI^MARIO')
+
+    def test_parse_batch_from_file(self):
+        batch = self._get_batch(sep='\r\n').encode('utf-8')
+        # small chunks split segments, separators and multibyte characters
+        messages = list(parse_batch(io.BytesIO(batch), chunk_size=7))
+        self.assertEqual([m.msh.msh_10.to_er7() for m in messages], ['1', '2'])
+        self.assertEqual(messages[1].to_er7().split('\r')[-1], 'PID|1||123-456-789^^^GHH^MR||RÖSSI^MARIO')
+
+        messages = list(parse_batch(io.StringIO(self._get_batch(sep='\n')), chunk_size=5))
+        self.assertEqual([m.msh.msh_10.to_er7() for m in messages], ['1', '2'])
+
+        # a segment much longer than the chunks
+        value = 'A' * 100000
+        long_batch = self._get_batch().replace('RÖSSI', value)
+        messages = list(parse_batch(io.StringIO(long_batch), chunk_size=16))
+        self.assertEqual([m.pid.pid_5.xpn_1.to_er7() for m in messages], [value, value])
+
+        with tempfile.TemporaryFile() as f:
+            f.write(batch)
+            f.flush()
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                messages = list(parse_batch(mm, lazy=True))
+            finally:
+                mm.close()
+        self.assertEqual([m.msh.msh_10.to_er7() for m in messages], ['1', '2'])
+
+    def test_parse_batch_with_blank_segments(self):
+        batch = self._get_batch().replace('\rPID', '\r \rPID') + '  \r'
+        messages = list(parse_batch(batch))
+        self.assertEqual([m.msh.msh_10.to_er7() for m in messages], ['1', '2'])
+        self.assertEqual([s.name for s in messages[0].children], ['MSH', 'PID'])
+
+        messages = list(parse_batch(io.BytesIO(batch.encode('utf-8')), chunk_size=3))
+        self.assertEqual([m.msh.msh_10.to_er7() for m in messages], ['1', '2'])
+
+        messages = list(parse_batch(bytearray(batch.encode('utf-8'))))
+        self.assertEqual([m.msh.msh_10.to_er7() for m in messages], ['1', '2'])
+
+    def test_parse_batch_without_envelope(self):
+        msg = self._get_multiple_segments_groups_message()
+        messages = list(parse_batch(msg + msg))
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0].to_er7(), parse_message(msg).to_er7())
+
+    def test_parse_batch_invalid_counts(self):
+        messages = parse_batch(self._get_batch(message_count='3'))
+        self.assertEqual(next(messages).msh.msh_10.to_er7(), '1')
+        self.assertEqual(next(messages).msh.msh_10.to_er7(), '2')
+        self.assertRaises(ParserError, next, messages)
+        self.assertRaises(ParserError, list, parse_batch(self._get_batch(batch_count='2')))
+        # empty counts are not checked
+        self.assertEqual(len(list(parse_batch(self._get_batch(batch_count='', message_count='')))), 2)
+        # the counts are compared as numbers and the values that are not numbers are not checked
+        for batch_count, message_count in (('01', '2 '), ('1^B', '002'), ('N/A', 'X2')):
+            self.assertEqual(len(list(parse_batch(self._get_batch(batch_count, message_count)))), 2)
+        self.assertRaises(ParserError, list, parse_batch(self._get_batch(message_count='03')))
+
+    def test_parse_batch_invalid_envelope(self):
+        self.assertRaises(ParserError, list, parse_batch('BHS|^~\\&|\rBHS|^~\\&|\r'))
+        self.assertRaises(ParserError, list, parse_batch('BTS|0\r'))
+        self.assertRaises(ParserError, list, parse_batch('FHS|^~\\&|\rBHS|^~\\&|\rFTS|1\r'))
+        self.assertRaises(ParserError, list, parse_batch('PID|1\r'))
+
+    def test_parse_message_lazy(self):
+        msg = self._get_multiple_segments_groups_message()
+        eager = parse_message(msg)
+        lazy = parse_message(msg, lazy=True)
+        self.assertEqual([c.name for c in lazy.children], [c.name for c in eager.children])
+
+        pid = lazy.oml_o33_patient.pid
+        self.assertTrue(pid.is_lazy())
+        # untouched segments are encoded back to the original text
+        self.assertEqual(lazy.to_er7(), msg.rstrip('\r'))
+
+        self.assertEqual(pid.pid_3.cx_4.hd_1.to_er7(), 'GATEWAY_IL')
+        self.assertFalse(pid.is_lazy())
+        self.assertTrue(pid.pid_5.is_lazy())
+        self.assertEqual(pid.pid_5.xpn_1.to_er7(), 'PIPPO')
+        self.assertFalse(pid.pid_5.is_lazy())
+
+        pid.pid_5.xpn_2 = 'PAPERINO'
+        self.assertEqual(pid.pid_5.to_er7(), 'PIPPO^PAPERINO^^^^^L')
+        self.assertEqual(lazy.oml_o33_specimen[1].oml_o33_order.oml_o33_observation_request.
+                         oml_o33_prior_result.oml_o33_order_prior[1].obr.obr_4.obr_4_1.to_er7(), 'LDL')
+        self.assertEqual(lazy.oml_o33_specimen[0].spm.spm_27.cwe_1.to_er7(), 'CONTAINER')
+
+    def test_parse_message_lazy_same_result(self):
+        def _parse_all(element):
+            for c in element.children:
+                _parse_all(c)
+
+        for msg in (self.rsp_k21, self.invalid_rsp_k21, self.rsp_k21_27,
+                    self._get_multiple_segments_groups_message()):
+            eager = parse_message(msg)
+            lazy = parse_message(msg, lazy=True)
+            _parse_all(lazy)
+            self.assertEqual(lazy.to_er7(), eager.to_er7())
+            self.assertEqual(repr(lazy.validate(return_errors=True)), repr(eager.validate(return_errors=True)))
+
+    def test_parse_message_bytes(self):
+        pid = u'PID|1||566-554-3423^^^GHH^MR||M\xdcLLER^\u0141UKASZ'
+        msg = u'MSH|^~\\&|GHH_ADT||||20080115153000||ADT^A01^ADT_A01|1|P|2.5||||||{}\r' + pid
+        for charset, encoding in (('8859/2', 'iso8859_2'), ('8859/2~8859/1', 'iso8859_2'),
+                                  ('UNICODE UTF-8', 'utf-8'), ('', 'utf-8')):
+            data = msg.format(charset).encode(encoding)
+            for message in (data, bytearray(data), memoryview(data)):
+                m = parse_message(message)
+                self.assertEqual(m.pid.to_er7(), pid)
+                self.assertEqual(m.msh.to_er7().split('|')[17:], [charset] if charset else [])
+        self.assertEqual(decode_message(b'PID|1||M\xdcLLER', 'latin-1'), u'PID|1||M\xdcLLER')
+        # unknown character sets are decoded with the default encoding
+        self.assertEqual(decode_message(msg.format('UNKNOWN').encode('utf-8')), msg.format('UNKNOWN'))
+        self.assertRaises(UnicodeDecodeError, decode_message, msg.format('UNICODE UTF-8').encode('iso8859_2'))
+        # the decoders are cached by codec, whatever the MSH-18 values received
+        for i in range(10):
+            decode_message(msg.format('UNKNOWN {0}'.format(i)).encode('utf-8'))
+            decode_message(msg.format(' unicode utf-8' + ' ' * i).encode('utf-8'))
+        self.assertLessEqual(set(hl7apy.parser._charset_decoders), set(CHARSETS.values()))
+
+    def test_parse_message_keep_er7(self):
+        original = self.rsp_k21.rstrip('\r').split('\r')
+        for lazy in (False, True):
+            m = parse_message(self.rsp_k21, keep_er7=True, lazy=lazy)
+            # the trailing separators are kept, since nothing has been changed
+            self.assertEqual(m.to_er7(), '\r'.join(original))
+            pid = m.rsp_k21_query_response.pid
+            # reading the children doesn't discard the original text
+            self.assertEqual(pid.pid_5.xpn_1.to_er7(), 'JOHN')
+            self.assertEqual(pid.pid_20.to_er7(), '')
+            self.assertTrue(pid.has_original_er7())
+            self.assertEqual(m.to_er7(), '\r'.join(original))
+
+            m.msh.msh_5 = 'OTHER APP'
+            pid.pid_3.cx_1 = '20202'
+            self.assertFalse(m.msh.has_original_er7())
+            self.assertFalse(pid.has_original_er7())
+            self.assertFalse(pid.pid_3.has_original_er7())
+            self.assertTrue(pid.pid_5.has_original_er7())
+            self.assertTrue(m.msa.has_original_er7())
+            expected = original[:]
+            expected[0] = expected[0].replace('REC APP', 'OTHER APP')
+            expected[4] = 'PID|1||20202^^^GATEWAY&1.3.6.1.4.1.21367.2011.2.5.17&ISO||JOHN^SMITH^^^^^A||19690113|M|||' \
+                          'VIA DELLE VIE^^CAGLIARI^^^100^H^^092009||||||||||||CAGLIARI'
+            self.assertEqual(m.to_er7(), '\r'.join(expected))
+
+            m.qpd.qpd_3[0].children[0].children[0].value = '@PID.3.2'
+            del m.msa.msa_2
+            expected[1] = 'MSA|AA'
+            expected[3] = 'QPD|IHE PDQ Query|111069|@PID.3.2^1010110909194822~@PID.5.1^SMITH'
+            self.assertEqual(m.to_er7(), '\r'.join(expected))
+            self.assertTrue(m.qpd.qpd_3[1].has_original_er7())
+            # the original text is not used with different encoding chars
+            self.assertEqual(m.qak.to_er7(encoding_chars=self._get_custom_encoding_chars()), 'QAK@111069@OK@@1@1@0')
+
+    def test_segment_cache(self):
+        set_segment_cache_size(2)
+        try:
+            nte = 'NTE|1||SPECIMEN RECEIVED||'
+            s1, s2 = parse_segment(nte), parse_segment(nte)
+            self.assertEqual(segment_cache_info()[:5], (1, 1, 0, 2, 1))
+            self.assertIsNot(s1, s2)
+            self.assertEqual(s2.to_er7(), 'NTE|1||SPECIMEN RECEIVED')
+            # the copies don't share their children and values
+            s1.nte_1 = '2'
+            s2.nte_3.children[0].children[0].value.value = 'SPECIMEN REJECTED'
+            self.assertEqual(s1.to_er7(), 'NTE|2||SPECIMEN RECEIVED')
+            self.assertEqual(s2.to_er7(), 'NTE|1||SPECIMEN REJECTED')
+            self.assertEqual(parse_segment(nte).to_er7(), 'NTE|1||SPECIMEN RECEIVED')
+            self.assertEqual(parse_segment(nte, keep_er7=True).to_er7(), nte)
+            self.assertEqual(parse_segment(nte.replace('|', '@'), encoding_chars=self._get_custom_encoding_chars())
+                             .nte_3.to_er7(), 'SPECIMEN RECEIVED')
+            info = segment_cache_info()
+            self.assertEqual((info.hits, info.misses, info.evictions, info.currsize), (2, 3, 1, 2))
+            # segment, field, component and subcomponent for NTE-1 and NTE-3 of the two cached segments
+            self.assertEqual(info.elements, 14)
+
+            for msg in (self.rsp_k21, self._get_multiple_segments_groups_message()):
+                set_segment_cache_size(0)
+                expected = parse_message(msg)
+                set_segment_cache_size(100)
+                for _ in range(2):
+                    m = parse_message(msg)
+                    self.assertEqual(m.to_er7(), expected.to_er7())
+                    self.assertEqual(repr(m.validate(return_errors=True)),
+                                     repr(expected.validate(return_errors=True)))
+            self.assertGreater(segment_cache_info().hits, 0)
+            segment_cache_clear()
+            self.assertEqual(segment_cache_info(), (0, 0, 0, 100, 0, 0))
+        finally:
+            set_segment_cache_size(0)
+
+    def test_parse_segment_lazy_custom_encoding_chars(self):
+        encoding_chars = self._get_custom_encoding_chars()
+        segment = 'PID@1@@10101$$$GATEWAY%1.2.3%ISO@@JOHN$SMITH'
+        s = parse_segment(segment, encoding_chars=encoding_chars, lazy=True)
+        self.assertEqual(s.to_er7(encoding_chars=encoding_chars), segment)
+        self.assertEqual(s.to_er7(), 'PID|1||10101^^^GATEWAY&1.2.3&ISO||JOHN^SMITH')
+        self.assertEqual(s.pid_3.cx_4.hd_2.to_er7(), '1.2.3')
+
     def test_parse_invalid_message(self):
         msh = 'PID|^~\\&|SEND APP|SEND FAC|REC APP|REC FAC|20080115153000||ADT^A01^ADT_A01|0123456789|P|2.6||||AL\r'
         pid = 'PID|1||123-456-789^^^HOSPITAL^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE^^SOMEWHERE^^^USA||555~444|||M'
@@ -489,6 +743,48 @@ class TestParser(unittest.TestCase):
                             sub_cmp_type = sub_cmp[1][0]
                             self.assertEqual(sub_cmp_type, 'leaf')
 
+    def test_lazy_library_loading(self):
+        """
+        Tests that the modules of the references of a version are loaded only when they are needed
+        """
+        script = 'import sys\n' \
+                 'from hl7apy.parser import parse_segment\n' \
+                 'parse_segment("PID|1||566-554-3423^^^GHH^MR", version="2.6")\n' \
+                 'print(",".join(sorted(m for m in sys.modules if m.startswith("hl7apy.v2_"))))'
+        out = subprocess.check_output([sys.executable, '-c', script],
+                                      cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        loaded = out.decode('ascii').strip().split(',')
+        for module in ('datatypes', 'fields', 'segments'):
+            self.assertIn('hl7apy.v2_6.{}'.format(module), loaded)
+        for module in ('groups', 'messages', 'tables'):
+            self.assertNotIn('hl7apy.v2_6.{}'.format(module), loaded)
+
+        lib = hl7apy.load_library('2.6')
+        self.assertIs(lib.TABLES, lib.ELEMENTS['Table'])
+        self.assertIs(lib.DATATYPES, lib.ELEMENTS['SubComponent'])
+        self.assertEqual(set(lib.ELEMENTS), {'Message', 'Group', 'Segment', 'Field', 'Component',
+                                             'SubComponent', 'Datatypes_Structs', 'Table'})
+        self.assertEqual(hl7apy.load_library('2.1').ELEMENTS['Table'], {})
+        self.assertRaises(AttributeError, getattr, lib, 'UNKNOWN')
+
+    def test_version_context(self):
+        context = hl7apy.get_version_context('2.6')
+        self.assertIs(hl7apy.get_version_context('2.6'), context)
+        self.assertIs(context.library, hl7apy.load_library('2.6'))
+        self.assertIs(context.elements, context.library.ELEMENTS)
+        self.assertEqual(context.version, '2.6')
+        self.assertIs(hl7apy.get_version_context(), hl7apy.get_version_context(hl7apy.get_default_version()))
+        self.assertRaises(UnsupportedVersion, hl7apy.get_version_context, '2.0')
+        self.assertRaises(AttributeError, setattr, context, 'version', '2.5')
+
+        self.assertTrue(context.is_base_datatype('ST'))
+        self.assertFalse(context.is_base_datatype('CE'))
+        self.assertIs(context.get('PID', 'Segment'), hl7apy.load_reference('PID', 'Segment', '2.6'))
+        self.assertRaises(ChildNotFound, context.get, 'UNKNOWN', 'Segment')
+        ref = context.find('ADT_A01', (Segment, Message))
+        self.assertEqual((ref['name'], ref['cls']), ('ADT_A01', Message))
+        self.assertRaises(ChildNotFound, context.find, 'ADT_A01', (Segment, Field))
+
 
 if __name__ == '__main__':
     unittest.main()
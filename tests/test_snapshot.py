@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import absolute_import
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import hl7apy
+from hl7apy import load_library
+from hl7apy.parser import parse_message
+from hl7apy.snapshot import Snapshot, SnapshotWriter, load_snapshot, write_library_snapshot, \
+    write_message_profile_snapshot
+from hl7apy.utils import LazyElements
+
+RSP_K21 = 'MSH|^~\\&|SENDING APP|SENDING FAC|RECEIVING APP|RECEIVING FAC|20140410170011||RSP^K22^RSP_K21|1|P|2.5\r' \
+          'MSA|AA|20140410170015\r' \
+          'QAK|222222222|OK\r' \
+          'QPD|IHE PDQ Query|222222222|@PID.3.1.1^3333333|||||^^^IHEFACILITY&1.3.6.1.4.1.21367.3000.1.6&ISO^|\r' \
+          'PID|1||10101109091948^^^GATEWAY&1.3.6.1.4.1.21367.2011.2.5.17&ISO||JOHN^SMITH^^^^^A||19690113|M|||' \
+          'VIA DELLE VIE^^CAGLIARI^^^ITA^H^^092009||||||||||||CAGLIARI|||\r'
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        base_path = os.path.abspath(os.path.dirname(__file__))
+        self.mp_path = os.path.join(base_path, 'profiles/iti_21')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def test_library_snapshot(self):
+        path = self._path('v2_6')
+        write_library_snapshot('2.6', path)
+        lib = load_library('2.6')
+        snapshot = load_snapshot(path)
+        self.assertEqual(set(snapshot), set(lib.ELEMENTS))
+        for element_type in ('Segment', 'Field', 'Datatypes_Structs', 'Component', 'Table'):
+            self.assertEqual(dict(snapshot[element_type]), dict(lib.ELEMENTS[element_type]))
+        # references shared in the library are shared in the snapshot too
+        pid = snapshot['Segment']['PID']
+        self.assertIs(pid[1][4][1], snapshot['Field']['PID_5'])
+        self.assertIs(snapshot['Segment']['PID'], pid)
+        # names are interned
+        self.assertEqual(snapshot['Field']['PID_5'][2], 'XPN')
+        self.assertIs(snapshot['Field']['PID_5'][2], snapshot['Field']['NK1_2'][2])
+        self.assertRaises(KeyError, snapshot['Segment'].__getitem__, 'UNKNOWN')
+        snapshot.close()
+
+    def test_use_snapshot(self):
+        path = self._path('v2_5')
+        write_library_snapshot('2.5', path)
+        elements = LazyElements('hl7apy.v2_5', {'Segment': ('segments', 'SEGMENTS'), 'Table': None})
+        snapshot = load_snapshot(path)
+        elements.use_snapshot(snapshot)
+        self.assertIs(elements['Segment'], snapshot['Segment'])
+        self.assertEqual(elements.get_attribute('SEGMENTS')['EVN'], load_library('2.5').SEGMENTS['EVN'])
+
+        elements = LazyElements('hl7apy.v2_5', {'Unknown': ('segments', 'SEGMENTS')})
+        self.assertRaises(ValueError, elements.use_snapshot, snapshot)
+
+    def test_message_profile_snapshot(self):
+        pickled = hl7apy.load_message_profile(self.mp_path)
+        path = self._path('iti_21')
+        write_message_profile_snapshot(pickled, path)
+        self.assertLess(os.path.getsize(path), os.path.getsize(self.mp_path))
+
+        mp = hl7apy.load_message_profile(path)
+        self.assertEqual(dict(mp), pickled)
+        msg = parse_message(RSP_K21, message_profile=mp)
+        self.assertEqual(msg.to_er7(), parse_message(RSP_K21, message_profile=pickled).to_er7())
+        self.assertEqual([str(e) for e in msg.validate(return_errors=True).errors],
+                         [str(e) for e in parse_message(RSP_K21, message_profile=pickled)
+                          .validate(return_errors=True).errors])
+
+        # pickling the profile sends just the path of the snapshot
+        data = pickle.dumps(mp)
+        self.assertLess(len(data), 1024)
+        self.assertEqual(dict(pickle.loads(data)), pickled)
+
+    def test_invalid_snapshot(self):
+        path = self._path('invalid')
+        with open(path, 'wb') as f:
+            f.write(b'not a snapshot')
+        self.assertRaises(ValueError, Snapshot, path)
+
+        writer = SnapshotWriter()
+        self.assertRaises(ValueError, writer.add_section, 'Section', {'A': 1.5})
+        self.assertRaises(ValueError, writer.add_section, 'Section', {'A': 2 ** 40})
+
+    def test_values(self):
+        values = {'none': None, 'int': -1, 'str': 'àèì', 'list': ['a', ('b', 1)], 'tuple': ('a', ['b', 1]),
+                  'empty': ()}
+        path = self._path('values')
+        writer = SnapshotWriter()
+        writer.add_section('Values', values)
+        with open(path, 'wb') as f:
+            writer.write(f)
+        snapshot = load_snapshot(path)
+        self.assertEqual(dict(snapshot['Values']), values)
+        self.assertIsInstance(snapshot['Values']['list'], list)
+        self.assertIsInstance(snapshot['Values']['tuple'][1], list)
+
+
+if __name__ == '__main__':
+    unittest.main()
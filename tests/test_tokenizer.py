@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import absolute_import
+import unittest
+
+from hl7apy.exceptions import ParserError
+from hl7apy.extract import PathExtractor
+from hl7apy.tokenizer import ER7Index, split_offsets
+
+MSG = '\nMSH|^~\\&|GHH_ADT||||20080115153000||ORU^R01^ORU_R01|0123456789|P|2.5\r\n' \
+      'PID|1||566-554-3423^^^GHH^MR~123&A^^^HOSP||EVERYMAN^ADAM^A\r\n' \
+      '\r' \
+      'OBX|1|NM|GLUCOSE||182||||||F  \r' \
+      'OBX|2|ST|NOTE'
+
+
+class TestER7Index(unittest.TestCase):
+
+    def test_segments(self):
+        index = ER7Index(MSG)
+        self.assertEqual(len(index), 4)
+        self.assertEqual([index.segment(i) for i in range(len(index))],
+                         [s.strip() for s in MSG.split('\r') if s.strip()])
+        self.assertEqual(index.find_segments('OBX'), [2, 3])
+        self.assertEqual(index.find_segments('PV1'), [])
+        self.assertRaises(ParserError, ER7Index, 'PID|1')
+
+    def test_segment_offsets(self):
+        for message in ('MSH|^~\\&|A\r\r', '  MSH|^~\\&|A \r \t\r\nPID|1\n', 'MSH|^~\\&|A\rPID|1\r\x1c'):
+            index = ER7Index(message)
+            self.assertEqual([index.segment(i) for i in range(len(index))],
+                             [s.strip() for s in message.split('\r') if s.strip()])
+
+    def test_values(self):
+        index = ER7Index(MSG)
+        msh, pid, obx = index.find_segments('MSH')[0], index.find_segments('PID')[0], index.find_segments('OBX')[0]
+        self.assertEqual(index.field(msh, 1), '^~\\&')
+        self.assertEqual(index.value(msh, 8, 0, 2), 'ORU_R01')
+        self.assertEqual(index.field(pid, 3), '566-554-3423^^^GHH^MR~123&A^^^HOSP')
+        self.assertEqual(index.repetitions(pid, 3), 2)
+        self.assertEqual(index.value(pid, 3), '566-554-3423^^^GHH^MR')
+        self.assertEqual(index.value(pid, 3, 1, 0), '123&A')
+        self.assertEqual(index.value(pid, 3, 1, 0, 1), 'A')
+        self.assertEqual(index.value(pid, 3, 1, 3), 'HOSP')
+        self.assertEqual(index.value(pid, 4), '')
+        self.assertIsNone(index.value(pid, 3, 2))
+        self.assertIsNone(index.value(pid, 3, 0, 5))
+        self.assertIsNone(index.value(pid, 3, 0, 0, 1))
+        self.assertIsNone(index.field(pid, 6))
+        self.assertEqual(index.repetitions(pid, 6), 0)
+        self.assertEqual(index.field(obx, 11), 'F')
+        self.assertEqual(index.locate(pid, (5, 0, 1)), index.value_bounds(pid, 5, 0, 1))
+
+        offsets = index.fields(obx)
+        segment = index.segment(obx)
+        self.assertEqual([MSG[offsets[i]:offsets[i + 1] - 1] for i in range(len(offsets) - 1)], segment.split('|'))
+
+    def test_custom_encoding_chars(self):
+        msg = 'MSH#$*@%#GHH_ADT####20080115153000##ADT$A01$ADT_A01#0123456789#P#2.5\r' \
+              'PID#1##566-554-3423$$$GHH$MR*123%A$$$HOSP'
+        index = ER7Index(msg)
+        self.assertEqual(index.value(1, 3, 1, 0, 1), 'A')
+        self.assertEqual(index.value(0, 8, 0, 1), 'A01')
+
+    def test_split_offsets(self):
+        for text in ('', '|', 'A', 'A||B|', '|A|B'):
+            offsets = split_offsets(text, '|')
+            self.assertEqual([text[offsets[i]:offsets[i + 1] - 1] for i in range(len(offsets) - 1)],
+                             text.split('|'))
+
+    def test_shared_index(self):
+        index = ER7Index(MSG)
+        self.assertEqual(PathExtractor(['PID-3(2).4']).extract(index), {'PID-3(2).4': 'HOSP'})
+        self.assertEqual(PathExtractor(['OBX[*]-3']).extract(index), {'OBX[*]-3': ['GLUCOSE', 'NOTE']})
+        self.assertEqual(PathExtractor(['OBX[*]-3']).extract(MSG), {'OBX[*]-3': ['GLUCOSE', 'NOTE']})
+
+
+if __name__ == '__main__':
+    unittest.main()
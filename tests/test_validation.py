@@ -29,10 +29,10 @@ import tempfile
 import unittest
 
 import hl7apy
-from hl7apy.core import Group, Field, Component, SubComponent
-from hl7apy.exceptions import ValidationError
+from hl7apy.core import Group, Field, Component, SubComponent, ElementFinder
+from hl7apy.exceptions import ChildNotFound, UnsupportedVersion, ValidationError
 from hl7apy.parser import parse_message, parse_segments, parse_segment, parse_field
-from hl7apy.validation import VALIDATION_LEVEL
+from hl7apy.validation import VALIDATION_LEVEL, _get_validation_plan
 
 
 class TestValidation(unittest.TestCase):
@@ -417,6 +417,49 @@ class TestValidation(unittest.TestCase):
         self.assertEqual(len(errors_and_warnings.errors), 0)
         self.assertEqual(len(errors_and_warnings.warnings), 0)
 
+    def test_validation_plan(self):
+        """
+        Tests that the validation plan of a reference is computed once and that it doesn't change the results
+        """
+        msg = self._create_message(self.oml_o33)
+        msg.add_segment('EVN')
+        first = msg.validate(return_errors=True)
+        second = msg.validate(return_errors=True)
+        self.assertEqual([str(e) for e in first.errors], [str(e) for e in second.errors])
+        self.assertEqual([str(w) for w in first.warnings], [str(w) for w in second.warnings])
+        self.assertTrue(first.errors)
+        self.assertIn('Value PK not in table HL70203 in element PID_3.CX_5', [str(w) for w in first.warnings])
+
+        plan = _get_validation_plan(msg.reference, msg.version)
+        self.assertIs(_get_validation_plan(msg.reference, msg.version), plan)
+        self.assertIn('OML_O33_PATIENT', plan.valid_children)
+        self.assertEqual(plan.children[0][2:], (1, 1))
+
+        table_plan = _get_validation_plan(msg.pid.pid_3.cx_5.reference, msg.version)
+        self.assertTrue(table_plan.is_leaf)
+        self.assertIn('MR', table_plan.table_values)
+
+        # the plans are computed again after the structures cache is cleared
+        ElementFinder.cache_clear()
+        self.assertIsNot(_get_validation_plan(msg.reference, msg.version), plan)
+        third = msg.validate(return_errors=True)
+        self.assertEqual([str(e) for e in first.errors], [str(e) for e in third.errors])
+
+    def test_lookup_table(self):
+        """
+        Tests the lookup of the tables values used to check the coded elements
+        """
+        values = hl7apy.lookup_table('2.5', 'HL70203')
+        self.assertIsInstance(values, frozenset)
+        self.assertIn('MR', values)
+        self.assertNotIn('PK', values)
+        self.assertIs(hl7apy.lookup_table('2.5', 'HL70203'), values)
+        self.assertEqual(values, frozenset(hl7apy.load_reference('HL70203', 'Table', '2.5')[1]))
+        self.assertRaises(ChildNotFound, hl7apy.lookup_table, '2.5', 'HL79999')
+        self.assertRaises(ChildNotFound, hl7apy.lookup_table, '2.3', 'HL70203')
+        self.assertRaises(UnsupportedVersion, hl7apy.lookup_table, '2.99', 'HL70203')
+
+
 class TestMessageProfile(unittest.TestCase):
 
     def setUp(self):
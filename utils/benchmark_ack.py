@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compare the time needed to create the acknowledgment of an ORU_R01 message with
+:func:`hl7apy.mllp.build_ack` and with the :class:`Message <hl7apy.core.Message>` API after parsing the message.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import timeit
+from optparse import OptionParser
+
+from hl7apy.core import Message
+from hl7apy.mllp import build_ack
+from hl7apy.parser import parse_message
+
+ORU_HEADER = 'MSH|^~\\&|LAB|HOSPITAL|EHR|HOSPITAL|20110708162817||ORU^R01^ORU_R01|{0}|P|2.5\r' \
+             'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r' \
+             'PV1||O|||||||||||||||||1107080001^^^LIS\r' \
+             'OBR|1|845439^GHH OE|1045813^GHH LAB|15545^GLUCOSE|||200202150730|||||||||' \
+             '555-55-5555^PRIMARY^PATRICIA P^^^^MD^^|||||||||F||||||444-44-4444^HIPPOCRATES^HOWARD H^^^^MD\r'
+OBX = 'OBX|{0}|NM|1554-5^GLUCOSE^POST 12H CFST:MCNC:PT:SER/PLAS:QN^LN||{1}|mg/dl|70_105|H|||F|||20110708162817\r'
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-s", "--segments", type="int", dest="segments", action="append",
+                 help="number of OBX segments of the ORU message (can be repeated, default 1, 10 and 100)")
+    return p
+
+
+def message_ack(text):
+    m = parse_message(text)
+    ack = Message('ACK', version=m.version)
+    ack.msh.msh_3 = m.msh.msh_5.to_er7()
+    ack.msh.msh_4 = m.msh.msh_6.to_er7()
+    ack.msh.msh_5 = m.msh.msh_3.to_er7()
+    ack.msh.msh_6 = m.msh.msh_4.to_er7()
+    ack.msh.msh_9 = 'ACK^R01^ACK'
+    ack.msh.msh_10 = 'ACK1'
+    ack.msh.msh_11 = m.msh.msh_11.to_er7()
+    ack.msa.msa_1 = 'AA'
+    ack.msa.msa_2 = m.msh.msh_10.to_er7()
+    return ack.to_mllp()
+
+
+def best_time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+
+    print("{0:<16}{1:>16}{2:>16}{3:>10}".format("message", "Message (ms)", "build_ack (ms)", "speedup"))
+    for n in options.segments or (1, 10, 100):
+        text = ORU_HEADER.format(1) + ''.join(OBX.format(i, 100 + i) for i in range(n))
+        assert message_ack(text).split('\r')[1:] == build_ack(text, control_id='ACK1').split('\r')[1:]
+        message_time = best_time(lambda: message_ack(text), 3)
+        build_time = best_time(lambda: build_ack(text, control_id='ACK1'), 1000)
+        print("{0:<16}{1:>16.3f}{2:>16.4f}{3:>10.0f}".format(
+            'ORU {0} OBX'.format(n), message_time * 1e3, build_time * 1e3, message_time / build_time))
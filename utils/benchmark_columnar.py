@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compare the time needed to export some columns of a batch of ORU_R01 messages with
+:class:`hl7apy.columnar.ColumnarExporter` and by reading the same values from the parsed (lazy) messages.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import time
+from optparse import OptionParser
+
+from hl7apy.columnar import ColumnarExporter
+from hl7apy.parser import parse_message
+
+ORU_HEADER = 'MSH|^~\\&|LAB|HOSPITAL|EHR|HOSPITAL|20110708162817||ORU^R01^ORU_R01|{0}|P|2.5\r' \
+             'PID|1||{0}^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r' \
+             'PV1||O|||||||||||||||||1107080001^^^LIS\r' \
+             'OBR|1|845439^GHH OE|1045813^GHH LAB|15545^GLUCOSE|||200202150730|||||||||' \
+             '555-55-5555^PRIMARY^PATRICIA P^^^^MD^^|||||||||F||||||444-44-4444^HIPPOCRATES^HOWARD H^^^^MD\r'
+OBX = 'OBX|{0}|NM|1554-5^GLUCOSE^POST 12H CFST:MCNC:PT:SER/PLAS:QN^LN||{1}|mg/dl|70_105|H|||F|||20110708162817\r'
+
+COLUMNS = ['MSH_10', 'PID_3_1', 'PID_5_1', 'OBX_3_1', 'OBX_5', 'OBX_6']
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-m", "--messages", type="int", dest="messages", default=1000,
+                 help="number of messages of the batch (default 1000)")
+    p.add_option("-s", "--segments", type="int", dest="segments", default=10,
+                 help="number of OBX segments of every message (default 10)")
+    return p
+
+
+def read_rows(messages):
+    rows, obx_rows = [], []
+    for message_index, text in enumerate(messages):
+        m = parse_message(text, lazy=True)
+        oru = m.oru_r01_patient_result
+        pid = oru.oru_r01_patient.pid
+        rows.append((m.msh.msh_10.to_er7(), pid.pid_3.cx_1.to_er7(), pid.pid_5.xpn_1.to_er7()))
+        for obs in oru.oru_r01_order_observation.oru_r01_observation:
+            obx = obs.obx
+            obx_rows.append((message_index, obx.obx_3.ce_1.to_er7(), obx.obx_5.to_er7(), obx.obx_6.to_er7()))
+    return rows, obx_rows
+
+
+def best_time(func):
+    times = []
+    for _ in range(3):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+    messages = [ORU_HEADER.format(m) + ''.join(OBX.format(i, 100 + i) for i in range(options.segments))
+                for m in range(options.messages)]
+    exporter = ColumnarExporter(COLUMNS, repeating=['OBX'], use_numpy=False)
+
+    tables = exporter.export(messages)
+    rows, obx_rows = read_rows(messages)
+    assert rows == list(zip(*[tables['MESSAGE'].values(c) for c in COLUMNS[:3]]))
+    assert obx_rows == list(zip(tables['OBX'].index, *[tables['OBX'].values(c) for c in COLUMNS[3:]]))
+
+    parse_time = best_time(lambda: read_rows(messages))
+    export_time = best_time(lambda: exporter.export(messages))
+    print("{0:<24}{1:>14}{2:>14}{3:>10}".format("batch", "parse (ms)", "export (ms)", "speedup"))
+    print("{0:<24}{1:>14.1f}{2:>14.1f}{3:>10.1f}".format(
+        '{0} ORU, {1} OBX'.format(options.messages, options.segments), parse_time * 1e3, export_time * 1e3,
+        parse_time / export_time))
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Measure the cost of creating the base datatypes: the time of a :func:`datatype_factory` call for some
+datatypes and the time spent to parse an ORU_R01 message, divided by the number of its subcomponents.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import timeit
+from optparse import OptionParser
+
+from hl7apy.consts import VALIDATION_LEVEL
+from hl7apy.core import SubComponent
+from hl7apy.factories import datatype_factory
+from hl7apy.parser import parse_message
+
+ORU_HEADER = 'MSH|^~\\&|LAB|HOSPITAL|EHR|HOSPITAL|20110708162817||ORU^R01^ORU_R01|{0}|P|2.5\r' \
+             'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r' \
+             'PV1||O|||||||||||||||||1107080001^^^LIS\r' \
+             'OBR|1|845439^GHH OE|1045813^GHH LAB|15545^GLUCOSE|||200202150730|||||||||' \
+             '555-55-5555^PRIMARY^PATRICIA P^^^^MD^^|||||||||F||||||444-44-4444^HIPPOCRATES^HOWARD H^^^^MD\r'
+OBX = 'OBX|{0}|NM|1554-5^GLUCOSE^POST 12H CFST:MCNC:PT:SER/PLAS:QN^LN||{1}|mg/dl|70_105|H|||F|||20110708162817\r'
+
+VALUES = (('ST', 'SOMEWHERE STREET'), ('ID', 'F'), ('NM', '182'), ('NM', 'not a number'),
+          ('SI', '1'), ('DT', '20110708'), ('DTM', '20110708162817'))
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-n", "--number", type="int", dest="number", default=20000,
+                 help="number of datatype_factory calls for every datatype (default 20000)")
+    p.add_option("-s", "--segments", type="int", dest="segments", default=100,
+                 help="number of OBX segments of the ORU message (default 100)")
+    return p
+
+
+def count_subcomponents(element):
+    if isinstance(element, SubComponent):
+        return 1
+    return sum(count_subcomponents(c) for c in element.children)
+
+
+def best_time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+
+    print("{0:<40}{1:>12}".format("datatype_factory", "us/call"))
+    for level_name, level in (('tolerant', VALIDATION_LEVEL.TOLERANT), ('strict', VALIDATION_LEVEL.STRICT)):
+        for datatype, value in VALUES:
+            if level == VALIDATION_LEVEL.STRICT and value == 'not a number':
+                continue
+            t = best_time(lambda: datatype_factory(datatype, value, '2.5', level), options.number)
+            print("{0:<40}{1:>12.2f}".format("{0} {1} {2!r}".format(level_name, datatype, value), t * 1e6))
+
+    text = ORU_HEADER.format(1) + ''.join(OBX.format(i, 100 + i) for i in range(options.segments))
+    subcomponents = count_subcomponents(parse_message(text))
+    t = best_time(lambda: parse_message(text), 5)
+    print()
+    print("ORU with {0} OBX: {1} subcomponents, {2:.1f} ms per message, {3:.2f} us per subcomponent".format(
+        options.segments, subcomponents, t * 1e3, t * 1e6 / subcomponents))
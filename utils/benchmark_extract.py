@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compare the time needed to read some values from an ORU_R01 message with :func:`hl7apy.extract.extract`
+and with the full (or lazy) parsing of the message. The speedup is computed against the lazy parsing.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import timeit
+from optparse import OptionParser
+
+from hl7apy.extract import PathExtractor
+from hl7apy.parser import parse_message
+
+ORU_HEADER = 'MSH|^~\\&|LAB|HOSPITAL|EHR|HOSPITAL|20110708162817||ORU^R01^ORU_R01|{0}|P|2.5\r' \
+             'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r' \
+             'PV1||O|||||||||||||||||1107080001^^^LIS\r' \
+             'OBR|1|845439^GHH OE|1045813^GHH LAB|15545^GLUCOSE|||200202150730|||||||||' \
+             '555-55-5555^PRIMARY^PATRICIA P^^^^MD^^|||||||||F||||||444-44-4444^HIPPOCRATES^HOWARD H^^^^MD\r'
+OBX = 'OBX|{0}|NM|1554-5^GLUCOSE^POST 12H CFST:MCNC:PT:SER/PLAS:QN^LN||{1}|mg/dl|70_105|H|||F|||20110708162817\r'
+
+PATHS = ['MSH-10', 'PID-3(1).1', 'OBX[*]-5']
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-s", "--segments", type="int", dest="segments", action="append",
+                 help="number of OBX segments of the ORU message (can be repeated, default 1, 10 and 100)")
+    return p
+
+
+def read_values(text, lazy):
+    m = parse_message(text, lazy=lazy)
+    oru = m.oru_r01_patient_result
+    return (m.msh.msh_10.to_er7(), oru.oru_r01_patient.pid.pid_3.cx_1.to_er7(),
+            [obs.obx.obx_5.to_er7() for obs in oru.oru_r01_order_observation.oru_r01_observation])
+
+
+def best_time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+    extractor = PathExtractor(PATHS)
+
+    print("{0:<16}{1:>14}{2:>14}{3:>14}{4:>10}".format("message", "parse (ms)", "lazy (ms)", "extract (ms)",
+                                                       "speedup"))
+    for n in options.segments or (1, 10, 100):
+        text = ORU_HEADER.format(1) + ''.join(OBX.format(i, 100 + i) for i in range(n))
+        values = extractor.extract(text)
+        assert read_values(text, False) == (values['MSH-10'], values['PID-3(1).1'], values['OBX[*]-5'])
+        parse_time = best_time(lambda: read_values(text, False), 3)
+        lazy_time = best_time(lambda: read_values(text, True), 3)
+        extract_time = best_time(lambda: extractor.extract(text), 200)
+        print("{0:<16}{1:>14.3f}{2:>14.3f}{3:>14.3f}{4:>10.0f}".format(
+            'ORU {0} OBX'.format(n), parse_time * 1e3, lazy_time * 1e3, extract_time * 1e3,
+            lazy_time / extract_time))
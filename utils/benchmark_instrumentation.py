@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Parse an ORU_R01 message with and without the instrumentation (see :mod:`hl7apy.instrumentation`) and print
+the overhead of the instrumentation and the statistics of the parsing stages.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import timeit
+from optparse import OptionParser
+
+from hl7apy.instrumentation import StatsSink, instrumented
+from hl7apy.parser import parse_message
+
+ORU_HEADER = 'MSH|^~\\&|LAB|HOSPITAL|EHR|HOSPITAL|20110708162817||ORU^R01^ORU_R01|1|P|2.5\r' \
+             'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r' \
+             'PV1||O|||||||||||||||||1107080001^^^LIS\r' \
+             'OBR|1|845439^GHH OE|1045813^GHH LAB|15545^GLUCOSE|||200202150730|||||||||' \
+             '555-55-5555^PRIMARY^PATRICIA P^^^^MD^^|||||||||F||||||444-44-4444^HIPPOCRATES^HOWARD H^^^^MD\r'
+OBX = 'OBX|{0}|NM|1554-5^GLUCOSE^POST 12H CFST:MCNC:PT:SER/PLAS:QN^LN||{1}|mg/dl|70_105|H|||F|||20110708162817\r'
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-s", "--segments", type="int", dest="segments", default=100,
+                 help="number of OBX segments of the ORU message (default 100)")
+    p.add_option("-n", "--number", type="int", dest="number", default=5,
+                 help="number of messages parsed for every measure (default 5)")
+    return p
+
+
+def best_time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+    text = ORU_HEADER + ''.join(OBX.format(i, 100 + i) for i in range(options.segments))
+
+    def parse():
+        parse_message(text).validate(return_errors=True)
+
+    off_time = best_time(parse, options.number)
+    with instrumented(StatsSink()):
+        on_time = best_time(parse, options.number)
+    print("parse and validate: {0:.1f} ms, instrumented {1:.1f} ms ({2:+.1f}%)".format(
+        off_time * 1e3, on_time * 1e3, (on_time / off_time - 1) * 100))
+
+    with instrumented() as stats:
+        parse()
+    print("\n{0:<20}{1:<10}{2:>10}{3:>12}".format("stage", "key", "calls", "time (ms)"))
+    for s in sorted(stats.stage_stats(), key=lambda s: -s.total_time):
+        print("{0:<20}{1:<10}{2:>10}{3:>12.2f}".format(s.stage, s.key or '', s.calls, s.total_time * 1e3))
+    for e in stats.elements_stats():
+        print("\n{0}: {1} elements".format(e.structure, e.elements))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Measure the memory used by the tree of elements of parsed messages: an ORU_R01 with an increasing number of
+OBX segments and the ORM_O01 of the other benchmarks. The references of the library are loaded before
+the measures, so only the elements are counted.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import gc
+import tracemalloc
+from optparse import OptionParser
+
+from hl7apy.parser import parse_message
+
+ORU_HEADER = 'MSH|^~\\&|LAB|HOSPITAL|EHR|HOSPITAL|20110708162817||ORU^R01^ORU_R01|{0}|P|2.5\r' \
+             'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r' \
+             'PV1||O|||||||||||||||||1107080001^^^LIS\r' \
+             'OBR|1|845439^GHH OE|1045813^GHH LAB|15545^GLUCOSE|||200202150730|||||||||' \
+             '555-55-5555^PRIMARY^PATRICIA P^^^^MD^^|||||||||F||||||444-44-4444^HIPPOCRATES^HOWARD H^^^^MD\r'
+OBX = 'OBX|{0}|NM|1554-5^GLUCOSE^POST 12H CFST:MCNC:PT:SER/PLAS:QN^LN||{1}|mg/dl|70_105|H|||F|||20110708162817\r'
+
+ORM = 'MSH|^~\\&|SENDING APP|SENDING FAC|REC APP|REC FAC|20110708162817||ORM^O01^ORM_O01|1|P|2.5\r' \
+      'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA||' \
+      '555-555-2004~444-333-222|||M\r' \
+      'PV1||O|||||||||||||||||1107080001^^^LIS\r' + \
+      ''.join('ORC|NW|{0}|{0}|18740|SC||||20110708162817\r'
+              'OBR||{0}|{0}|TPO^ANTI THYROPEROXIDASE ANTIBODIES(TPO)^^TPO||||||||||||ND^UNKNOWN^UNKNOWN\r'
+              'NTE|1||COMMENT\r'.format(8340 + i) for i in range(20))
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-s", "--segments", type="int", dest="segments", action="append",
+                 help="number of OBX segments of the ORU message (can be repeated, default 10, 100 and 500)")
+    return p
+
+
+def get_oru(segments):
+    return ORU_HEADER.format(1) + ''.join(OBX.format(i, 100 + i) for i in range(segments))
+
+
+def count_elements(element):
+    n = 1
+    for c in element.children:
+        n += count_elements(c)
+    return n
+
+
+def measure(text):
+    gc.collect()
+    tracemalloc.start()
+    msg = parse_message(text)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, count_elements(msg)
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+    # load the references and fill the caches of the structures
+    parse_message(get_oru(1)).validate(return_errors=True)
+    parse_message(ORM).validate(return_errors=True)
+
+    print("{0:<16}{1:>10}{2:>12}{3:>16}".format("message", "elements", "size (KB)", "bytes/element"))
+    messages = [('ORU {0} OBX'.format(n), get_oru(n)) for n in (options.segments or (10, 100, 500))]
+    messages.append(('ORM', ORM))
+    for name, text in messages:
+        size, elements = measure(text)
+        print("{0:<16}{1:>10}{2:>12.0f}{3:>16.0f}".format(name, elements, size / 1024.0, float(size) / elements))
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compare the throughput of the threaded :class:`MLLPServer <hl7apy.mllp.MLLPServer>` and of the
+:class:`AsyncMLLPServer <hl7apy.mllp_aio.AsyncMLLPServer>`. Every client connection pipelines its messages
+using :class:`AsyncMLLPClient <hl7apy.mllp_aio.AsyncMLLPClient>`.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import asyncio
+import time
+from optparse import OptionParser
+from threading import Thread
+
+from hl7apy.mllp import MLLPServer, AbstractHandler
+from hl7apy.mllp_aio import AsyncMLLPServer, AsyncMLLPClient
+
+HOST = 'localhost'
+
+MSG_TPL = 'MSH|^~\\&|SND APP|SND FAC|REC APP|REC FAC|20110708163513||ORU^R01^ORU_R01|{}|P|2.5\r' \
+          'PID|1||123^^^HOSP||SMITH^JOHN\r' \
+          'OBR|1||1234|88304\r' \
+          'OBX|1|NM|GLU^Glucose||182|mg/dl|70_105|H|||F'
+
+ACK_TPL = '\x0bMSH|^~\\&|REC APP|REC FAC|SND APP|SND FAC|20110708163514||ACK^R01^ACK|ACK{0}|P|2.5\r' \
+          'MSA|AA|{0}\x1c\x0d'
+
+
+class BenchmarkMLLPServer(MLLPServer):
+    request_queue_size = 1024
+
+
+class ACKHandler(AbstractHandler):
+
+    def reply(self):
+        control_id = self.incoming_message.split('\r', 1)[0].split('|')[9]
+        return ACK_TPL.format(control_id)
+
+
+HANDLERS = {'ORU^R01^ORU_R01': (ACKHandler,)}
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-c", "--connections", type="int", dest="connections", default=200,
+                 help="number of concurrent connections")
+    p.add_option("-n", "--number_of_message", type="int", dest="n_msg", default=50,
+                 help="number of messages sent on every connection")
+    p.add_option("-s", "--server", dest="server", default="both", choices=["threaded", "async", "both"],
+                 help="server to benchmark")
+    return p
+
+
+async def _send(port, connection, n_msg):
+    async with AsyncMLLPClient(HOST, port, timeout=60) as client:
+        await client.send_message_batch(MSG_TPL.format('{}-{}'.format(connection, i)) for i in range(n_msg))
+
+
+async def _run_clients(port, connections, n_msg):
+    start = time.time()
+    results = await asyncio.gather(*[_send(port, c, n_msg) for c in range(connections)], return_exceptions=True)
+    failed = len([r for r in results if r is not None])
+    return time.time() - start, failed
+
+
+def benchmark_threaded(connections, n_msg):
+    server = BenchmarkMLLPServer(HOST, 0, HANDLERS)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        return asyncio.run(_run_clients(server.server_address[1], connections, n_msg))
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def benchmark_async(connections, n_msg):
+    # the server runs in its own thread and event loop, as the threaded one
+    loop = asyncio.new_event_loop()
+    server = AsyncMLLPServer(HOST, 0, HANDLERS, backlog=1024)
+    loop.run_until_complete(server.start())
+    thread = Thread(target=loop.run_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        return asyncio.run(_run_clients(server.port, connections, n_msg))
+    finally:
+        asyncio.run_coroutine_threadsafe(_stop_async_server(server), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+async def _stop_async_server(server):
+    server.close()
+    await server.wait_closed()
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+    benchmarks = [('threaded', benchmark_threaded), ('async', benchmark_async)]
+    total = options.connections * options.n_msg
+    for name, benchmark in benchmarks:
+        if options.server in (name, 'both'):
+            elapsed, failed = benchmark(options.connections, options.n_msg)
+            print("{0}: {1} messages on {2} connections in {3:.3f}s ({4:.0f} msg/s), {5} connections failed".format(
+                name, total, options.connections, elapsed, total / elapsed, failed))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Measure the throughput of :class:`ParallelParser <hl7apy.parallel.ParallelParser>` with an increasing number
+of processes, parsing and validating the same ORM message.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import multiprocessing
+import time
+from optparse import OptionParser
+
+from hl7apy.parallel import parse_messages
+from hl7apy.parser import parse_message
+
+MSG_TPL = 'MSH|^~\\&|SENDING APP|SENDING FAC|REC APP|REC FAC|20110708162817||ORM^O01^ORM_O01|{0}|P|2.5\r' \
+          'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA||' \
+          '555-555-2004~444-333-222|||M\r' \
+          'PV1||O|||||||||||||||||1107080001^^^LIS\r' + \
+          ''.join('ORC|NW|{0}|{0}|18740|SC||||20110708162817\r'
+                  'OBR||{0}|{0}|TPO^ANTI THYROPEROXIDASE ANTIBODIES(TPO)^^TPO||||||||||||ND^UNKNOWN^UNKNOWN\r'
+                  'NTE|1||COMMENT\r'.format(8340 + i) for i in range(20))
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-n", "--number_of_message", type="int", dest="n_msg", default=400,
+                 help="number of messages to parse")
+    p.add_option("-p", "--processes", type="int", dest="processes", default=multiprocessing.cpu_count(),
+                 help="maximum number of processes")
+    p.add_option("-c", "--chunksize", type="int", dest="chunksize", default=16, help="messages per chunk")
+    p.add_option("-o", "--output", dest="output", default="er7", choices=["er7", "message"],
+                 help="output of the workers")
+    return p
+
+
+def run(messages, processes, chunksize, output):
+    start = time.time()
+    for res in parse_messages(messages, processes=processes, chunksize=chunksize, output=output, validate=True):
+        if res.error is not None:
+            raise res.error
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+    messages = [MSG_TPL.format(i) for i in range(options.n_msg)]
+
+    start = time.time()
+    for m in messages:
+        parse_message(m).validate(return_errors=True)
+    sequential = time.time() - start
+    print("sequential: {0:.0f} msg/s".format(options.n_msg / sequential))
+
+    processes = 1
+    while processes <= options.processes:
+        elapsed = run(messages, processes, options.chunksize, options.output)
+        print("{0} processes: {1:.0f} msg/s (speedup {2:.2f})".format(
+            processes, options.n_msg / elapsed, sequential / elapsed))
+        processes *= 2
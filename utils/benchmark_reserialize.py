@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compare the time needed to encode again an ORU_R01 message after changing MSH-5 and PID-3, when the
+message is parsed with and without keeping the original ER7 text of its segments and fields.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import timeit
+from optparse import OptionParser
+
+from hl7apy.parser import parse_message
+
+ORU_HEADER = 'MSH|^~\\&|LAB|HOSPITAL|EHR|HOSPITAL|20110708162817||ORU^R01^ORU_R01|1|P|2.5\r' \
+             'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r' \
+             'PV1||O|||||||||||||||||1107080001^^^LIS\r' \
+             'OBR|1|845439^GHH OE|1045813^GHH LAB|15545^GLUCOSE|||200202150730|||||||||' \
+             '555-55-5555^PRIMARY^PATRICIA P^^^^MD^^|||||||||F||||||444-44-4444^HIPPOCRATES^HOWARD H^^^^MD\r'
+OBX = 'OBX|{0}|NM|1554-5^GLUCOSE^POST 12H CFST:MCNC:PT:SER/PLAS:QN^LN||{1}|mg/dl|70_105|H|||F|||20110708162817\r'
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-s", "--segments", type="int", dest="segments", action="append",
+                 help="number of OBX segments of the ORU message (can be repeated, default 10, 100 and 300)")
+    return p
+
+
+def enrich(text, keep_er7):
+    m = parse_message(text, keep_er7=keep_er7)
+    m.msh.msh_5 = 'ENRICHED'
+    m.oru_r01_patient_result.oru_r01_patient.pid.pid_3.cx_1 = '123-456-7890'
+    return m
+
+
+def best_time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+
+    print("{0:<16}{1:>18}{2:>18}{3:>18}{4:>18}{5:>10}".format(
+        "message", "parse (ms)", "parse kept (ms)", "to_er7 (ms)", "to_er7 kept (ms)", "speedup"))
+    for n in options.segments or (10, 100, 300):
+        text = ORU_HEADER + ''.join(OBX.format(i, 100 + i) for i in range(n))
+        m, kept = enrich(text, False), enrich(text, True)
+        # the untouched segments and fields are encoded back to exactly their original text
+        assert kept.to_er7() == text.replace('|EHR|', '|ENRICHED|').replace('566-554-3423', '123-456-7890').rstrip()
+        parse_time = best_time(lambda: enrich(text, False), 3)
+        parse_kept_time = best_time(lambda: enrich(text, True), 3)
+        er7_time = best_time(m.to_er7, 10)
+        er7_kept_time = best_time(kept.to_er7, 10)
+        print("{0:<16}{1:>18.3f}{2:>18.3f}{3:>18.3f}{4:>18.3f}{5:>10.1f}".format(
+            'ORU {0} OBX'.format(n), parse_time * 1e3, parse_kept_time * 1e3, er7_time * 1e3,
+            er7_kept_time * 1e3, er7_time / er7_kept_time))
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compare the time needed to parse (and encode again) a feed of OML_O21 messages that repeat the same EVN, NTE,
+ORC and OBR segments, with and without the segments cache (see :func:`hl7apy.parser.set_segment_cache_size`).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import timeit
+from optparse import OptionParser
+
+from hl7apy.parser import parse_message, set_segment_cache_size, segment_cache_info
+
+MSH = 'MSH|^~\\&|LIS|HOSPITAL|LAB|HOSPITAL|20110708162817||OML^O21^OML_O21|{0}|P|2.5\r'
+PID = 'PID|1||{0}^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r'
+NTE = 'NTE|1||SPECIMEN COLLECTED BY THE WARD NURSE^ACCORDING TO THE STANDARD PROCEDURE\r'
+ORDER = 'ORC|NW|{0}|{0}|18740|SC||||20110708162817\r' \
+        'OBR||{0}|{0}|TPO^ANTI THYROPEROXIDASE ANTIBODIES(TPO)^^TPO||||||||||||ND^UNKNOWN^UNKNOWN\r'
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-m", "--messages", type="int", dest="messages", default=100,
+                 help="number of messages of the feed (default 100)")
+    p.add_option("-o", "--orders", type="int", dest="orders", default=5,
+                 help="number of orders of every message (default 5)")
+    p.add_option("-d", "--distinct", type="int", dest="distinct", default=20,
+                 help="number of distinct patients and orders of the feed (default 20)")
+    p.add_option("-s", "--size", type="int", dest="size", default=256,
+                 help="maximum number of segments in cache (default 256)")
+    return p
+
+
+def get_feed(messages, orders, distinct):
+    feed = []
+    for i in range(messages):
+        orders_text = ''.join(ORDER.format(1000 + (i + j) % distinct) for j in range(orders))
+        feed.append(''.join((MSH.format(i), PID.format(i % distinct), NTE, orders_text)))
+    return feed
+
+
+def parse_feed(feed, to_er7):
+    for text in feed:
+        m = parse_message(text)
+        if to_er7:
+            m.to_er7()
+
+
+def best_time(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+    feed = get_feed(options.messages, options.orders, options.distinct)
+
+    print("{0:<20}{1:>16}{2:>16}{3:>10}".format("", "no cache (ms)", "cache (ms)", "speedup"))
+    for to_er7 in (False, True):
+        set_segment_cache_size(0)
+        no_cache_time = best_time(lambda: parse_feed(feed, to_er7))
+        set_segment_cache_size(options.size)
+        cache_time = best_time(lambda: parse_feed(feed, to_er7))
+        print("{0:<20}{1:>16.1f}{2:>16.1f}{3:>10.1f}".format(
+            "parse + to_er7" if to_er7 else "parse", no_cache_time * 1e3, cache_time * 1e3,
+            no_cache_time / cache_time))
+    print(segment_cache_info())
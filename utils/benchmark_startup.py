@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Measure the startup costs of a new process for every supported version: ``import hl7apy``, the first
+:func:`parse_message <hl7apy.parser.parse_message>` and the first validation. Every measure is taken in a
+fresh interpreter, so the libraries of the versions are loaded from scratch.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import subprocess
+import sys
+from optparse import OptionParser
+
+MSG_TPL = 'MSH|^~\\&|SENDING APP|SENDING FAC|REC APP|REC FAC|20110708162817||ADT^A01|1|P|{0}\r' \
+          'EVN|A01|20110708162817\r' \
+          'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M\r' \
+          'PV1|1|I'
+
+SCRIPT = """
+import json, sys, time
+start = time.time()
+import hl7apy
+imported = time.time()
+from hl7apy.parser import parse_message
+msg = parse_message(sys.argv[1])
+parsed = time.time()
+msg.validate(return_errors=True)
+validated = time.time()
+print(json.dumps([imported - start, parsed - imported, validated - parsed]))
+"""
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-r", "--repeat", type="int", dest="repeat", default=5,
+                 help="number of processes started for every version (the best time is reported)")
+    p.add_option("-v", "--version", dest="versions", action="append",
+                 help="version to measure (can be repeated, default all the supported versions)")
+    return p
+
+
+def measure(version, repeat):
+    times = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', SCRIPT, MSG_TPL.format(version)])
+        times.append(json.loads(out.decode('ascii')))
+    return [min(t[i] for t in times) * 1000 for i in range(3)]
+
+
+if __name__ == '__main__':
+    from hl7apy import SUPPORTED_LIBRARIES
+
+    options, args = get_parser().parse_args()
+    versions = options.versions or sorted(SUPPORTED_LIBRARIES)
+    print("{0:<8}{1:>12}{2:>14}{3:>16}".format("version", "import (ms)", "parse (ms)", "validate (ms)"))
+    for version in versions:
+        print("{0:<8}{1:>12.1f}{2:>14.1f}{3:>16.1f}".format(version, *measure(version, options.repeat)))
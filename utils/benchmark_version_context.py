@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012-2018, CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Measure the lookups of references and base datatypes, that go through the :class:`VersionContext
+<hl7apy.VersionContext>` of the version, and the parsing of a message that performs them
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import timeit
+from optparse import OptionParser
+
+from hl7apy import load_reference, find_reference
+from hl7apy.core import Segment, Field, is_base_datatype
+from hl7apy.parser import parse_message
+
+ORU_HEADER = 'MSH|^~\\&|LAB|HOSPITAL|EHR|HOSPITAL|20110708162817||ORU^R01^ORU_R01|1|P|2.5\r' \
+             'PID|1||566-554-3423^^^GHH^MR||SURNAME^NAME^A|||M|||1111 SOMEWHERE STREET^^SOMEWHERE^^^USA\r'
+OBX = 'OBX|{0}|NM|1554-5^GLUCOSE^POST 12H CFST:MCNC:PT:SER/PLAS:QN^LN||{1}|mg/dl|70_105|H|||F|||20110708162817\r'
+
+
+def get_parser():
+    p = OptionParser()
+    p.add_option("-s", "--segments", type="int", dest="segments", default=100,
+                 help="number of OBX segments of the ORU message (default 100)")
+    p.add_option("-n", "--number", type="int", dest="number", default=100000,
+                 help="number of lookups for every measure (default 100000)")
+    return p
+
+
+def best_time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+if __name__ == '__main__':
+    options, args = get_parser().parse_args()
+    text = ORU_HEADER + ''.join(OBX.format(i, 100 + i) for i in range(options.segments))
+
+    lookups = (
+        ('is_base_datatype', lambda: is_base_datatype('ST', '2.5')),
+        ('load_reference', lambda: load_reference('PID', 'Segment', '2.5')),
+        ('find_reference', lambda: find_reference('PID_3', (Segment, Field), '2.5')),
+    )
+    for name, func in lookups:
+        print("{0:<20}{1:>10.0f} ns".format(name, best_time(func, options.number) * 1e9))
+    print("{0:<20}{1:>10.2f} ms".format("parse_message", best_time(lambda: parse_message(text).to_er7(), 5) * 1e3))